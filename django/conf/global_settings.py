@@ -160,6 +160,27 @@ DATABASES = {
 # Classes used to implement DB routing behavior.
 DATABASE_ROUTERS = []
 
+# The aliases of the read replicas of the databases, by alias of their
+# primary, used by django.db.backends.pg_django.router.ReplicaRouter.
+DATABASE_REPLICAS = {}
+
+# How many seconds a replica may lag behind its primary and still be read
+# from by ReplicaRouter.
+REPLICA_MAX_LAG = 10
+
+# How many seconds the replication lag of a replica is cached by
+# ReplicaRouter.
+REPLICA_LAG_CACHE_TIMEOUT = 1
+
+# How many compiled SQL statements are kept for the querysets using
+# QuerySet.cached_sql(). 0 disables the cache.
+SQL_CACHE_SIZE = 1000
+
+# Whether the foreign keys using on_delete=CASCADE are created with ON DELETE
+# CASCADE (on the backends supporting it), in which case deletions leave these
+# cascades to the database when no delete signal receivers need the objects.
+DB_CASCADE = False
+
 # The email backend to use. For possible shortcuts see django.core.mail.
 # The default is to use the SMTP backend.
 # Third-party backends can be specified by providing a Python path
@@ -137,6 +137,10 @@ def get_deleted_objects(objs, opts, user, admin_site, using):
 
 
 class NestedObjects(Collector):
+    # every object deleted is listed, and its delete permission checked, even
+    # when the database would cascade the deletion on its own
+    use_db_cascade = False
+
     def __init__(self, *args, **kwargs):
         super(NestedObjects, self).__init__(*args, **kwargs)
         self.edges = {} # {from_instance: [to_instances]}
@@ -0,0 +1,83 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, models, DEFAULT_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = ("Applies the changes queued by the leaves of materialized views "
+            "using deferred maintenance (pg_django only).")
+    args = "[appname.ModelName ...]"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--database', action='store', dest='database',
+            default=DEFAULT_DB_ALIAS, help='Nominates a database on which '
+                'the changes are applied. Defaults to the "default" database.'),
+        make_option('--batch-size', action='store', dest='batch_size',
+            type='int', default=1000,
+            help='How many changes are applied per transaction.'),
+        make_option('--loop', action='store_true', dest='loop',
+            default=False, help='Keep running and apply the changes as they '
+                'are queued.'),
+        make_option('--interval', action='store', dest='interval',
+            type='float', default=None, help='With --loop, how many seconds '
+                'to wait between two runs. Defaults to half the smallest '
+                'Meta.max_staleness of the materialized views.'),
+    )
+
+    def handle(self, *labels, **options):
+        from django.db.backends.pg_django.maintenance import (
+            apply_view_changes, get_deferred_bases, get_view_staleness,
+            ViewMaintenanceWorker)
+
+        db = options.get('database')
+        verbosity = int(options.get('verbosity'))
+        batch_size = options.get('batch_size')
+        if not connections[db].features.support_materialized_view_base:
+            raise CommandError("Database '%s' does not support materialized "
+                               "views." % db)
+
+        deferred_bases = get_deferred_bases()
+        if labels:
+            bases = []
+            for label in labels:
+                try:
+                    app_label, model_name = label.split('.')
+                except ValueError:
+                    raise CommandError("Expected appname.ModelName, got %r."
+                                       % label)
+                model = models.get_model(app_label, model_name)
+                if model is None or model not in deferred_bases:
+                    raise CommandError("%r is not a materialized view base "
+                                       "with deferred leaves." % label)
+                bases.append(model)
+        else:
+            bases = deferred_bases
+
+        if options.get('loop'):
+            worker = ViewMaintenanceWorker(bases, using=db,
+                                           interval=options.get('interval'),
+                                           batch_size=batch_size)
+            worker.start()
+            try:
+                while worker.is_alive():
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                worker.stop()
+                worker.join()
+                return
+            raise CommandError("The view maintenance worker died.")
+
+        for model in bases:
+            staleness = get_view_staleness(model, using=db)
+            max_staleness = model._meta.max_staleness
+            if max_staleness and staleness > max_staleness:
+                self.stderr.write(self.style.NOTICE(
+                    "%s is %.1fs stale, more than its max_staleness (%ss)\n"
+                    % (model._meta.object_name, staleness, max_staleness)))
+            applied = apply_view_changes(model, using=db,
+                                         batch_size=batch_size)
+            if verbosity >= 1:
+                self.stdout.write("Applied %d change(s) to %s.%s\n" % (
+                    applied, model._meta.app_label, model._meta.object_name))
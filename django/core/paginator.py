@@ -1,5 +1,7 @@
 from math import ceil
 
+from django.core.exceptions import ValidationError
+
 class InvalidPage(Exception):
     pass
 
@@ -156,3 +158,104 @@ class Page(object):
         if self.number == self.paginator.num_pages:
             return self.paginator.count
         return self.number * self.paginator.per_page
+
+
+class KeysetPaginator(object):
+    """
+    Paginates a QuerySet by `key`, the name of a unique field (prefixed with
+    '-' for the descending order). A page is read by selecting the objects
+    after the key of the last object of the previous page (or before the key
+    of the first object of the next page) rather than with an OFFSET, so the
+    cost of a page does not depend on its depth. Pages are designated by
+    these keys instead of numbers.
+    """
+    def __init__(self, object_list, per_page, key='pk',
+                 allow_empty_first_page=True):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.key = key
+        self.allow_empty_first_page = allow_empty_first_page
+        self.name = key.lstrip('-')
+        self.descending = key.startswith('-')
+        opts = object_list.model._meta
+        if self.name == 'pk':
+            self.field = opts.pk
+        else:
+            self.field = opts.get_field(self.name)
+
+    def validate_key(self, value):
+        "Validates the key of an object, as given in a request."
+        try:
+            return self.field.to_python(value)
+        except ValidationError:
+            raise InvalidPage('That page key is not valid')
+
+    def page(self, after=None, before=None):
+        """
+        Returns a KeysetPage of the objects following the key `after`, or
+        preceding the key `before`. Returns the first page if both are None.
+        """
+        if before is None:
+            key, lookup, value = self.key, 'gt', after
+        else:
+            key, lookup, value = '-' + self.key, 'lt', before
+            if self.descending:
+                key = self.name
+        if self.descending:
+            lookup = lookup == 'gt' and 'lt' or 'gt'
+        object_list = self.object_list.order_by(key)
+        if value is not None:
+            object_list = object_list.filter(**{
+                '%s__%s' % (self.name, lookup): self.validate_key(value)})
+        object_list = list(object_list[:self.per_page + 1])
+        more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if before is None:
+            has_next, has_previous = more, after is not None
+        else:
+            object_list.reverse()
+            has_next, has_previous = True, more
+        if not object_list and (value is not None or
+                                not self.allow_empty_first_page):
+            raise EmptyPage('That page contains no results')
+        return KeysetPage(object_list, self, has_next, has_previous)
+
+
+class KeysetPage(object):
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<KeysetPage of %s objects>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    def _get_key(self, obj):
+        return getattr(obj, self.paginator.field.attname)
+
+    def next_page_key(self):
+        "Returns the key after which the next page starts."
+        return self._get_key(self.object_list[-1])
+
+    def previous_page_key(self):
+        "Returns the key before which the previous page ends."
+        return self._get_key(self.object_list[0])
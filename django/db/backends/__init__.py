@@ -328,6 +328,30 @@ class BaseDatabaseFeatures(object):
 
     can_use_chunked_reads = True
     can_return_id_from_insert = False
+    # Can a multi-row INSERT return the ids of all its rows?
+    can_return_ids_from_bulk_insert = False
+    # Can the rows of a query be fetched from a server-side cursor (see
+    # QuerySet.stream())?
+    supports_server_side_cursors = False
+    # Can rows be streamed in and out with COPY (see QuerySet.copy_from())?
+    supports_copy = False
+    # Can INSERT statements update the rows they conflict with (see
+    # QuerySet.bulk_upsert())?
+    supports_upsert = False
+    # Can an UPDATE statement join a VALUES list (see QuerySet.bulk_update())?
+    supports_update_from_values = False
+    # Can the statements executed often be prepared on the server (see the
+    # prepare_threshold key of OPTIONS)?
+    supports_prepared_statements = False
+    # Can closed connections be kept in a pool and reused (see the max_age
+    # key of OPTIONS)?
+    supports_connection_pool = False
+    # Are the foreign keys using on_delete=CASCADE created with ON DELETE
+    # CASCADE when settings.DB_CASCADE is True?
+    supports_db_cascade = False
+    # Can the replication lag of a read replica be queried (see
+    # DatabaseOperations.replication_lag_sql())?
+    supports_replication_lag = False
     has_bulk_insert = False
     uses_autocommit = False
     uses_savepoints = False
@@ -412,7 +436,8 @@ class BaseDatabaseFeatures(object):
     support_arrays = False
 
     # Does the database support shared sequences. Note: it must implement
-    # get_unique_name and sequence_exists in its DatabaseIntrospection
+    # get_unique_name, sequence_exists and set_sequence_exists in its
+    # DatabaseIntrospection
     support_shared_sequence = False
 
     # Features that need to be confirmed at runtime
@@ -544,6 +569,65 @@ class BaseDatabaseOperations(object):
         """
         return cursor.fetchone()[0]
 
+    def allocate_ids(self, field, count):
+        """
+        Reserves `count` values of the sequence behind the AutoField `field`
+        and returns them as a list, so that objects get their primary key
+        before being inserted.
+        """
+        raise NotImplementedError('This backend cannot allocate ids.')
+
+    def copy_from(self, table, columns, rows):
+        """
+        Loads `rows` in the `columns` of `table` with a COPY statement and
+        returns the number of rows loaded. `rows` is either an iterable of
+        sequences of values prepared for saving, or a file in the text format
+        of COPY.
+        """
+        raise NotImplementedError('This backend does not support COPY.')
+
+    def copy_to(self, sql, params, file):
+        """
+        Writes the rows of the query `sql` to `file`, in the text format of
+        COPY, and returns the number of rows written.
+        """
+        raise NotImplementedError('This backend does not support COPY.')
+
+    def replication_lag_sql(self):
+        """
+        Returns the SQL of a query selecting how many seconds the database, a
+        read replica, lags behind its primary: 0 if it is not a replica, NULL
+        if the lag is unknown.
+        """
+        raise NotImplementedError('This backend does not report the '
+                                  'replication lag.')
+
+    def on_conflict_sql(self, table, conflict_columns, update_columns):
+        """
+        Returns the clause appended to an INSERT statement into `table` so
+        that the rows conflicting with existing rows on `conflict_columns`
+        (covered by a unique constraint) update the `update_columns` of these
+        rows instead. The conflicting rows must be returned by a RETURNING
+        clause even if `update_columns` is empty.
+        """
+        raise NotImplementedError('This backend does not support upserts.')
+
+    def return_upsert_id(self):
+        """
+        Returns the SQL and params of the RETURNING clause of an upsert. The
+        fragment holds a format string for the returned columns, followed by
+        a boolean telling whether each row was inserted (or updated).
+        """
+        raise NotImplementedError('This backend does not support upserts.')
+
+    def fetch_returned_insert_ids(self, cursor):
+        """
+        Given a cursor object that has just performed a multi-row
+        INSERT...RETURNING statement into a table that has an
+        auto-incrementing ID, returns the list of the newly created IDs.
+        """
+        return [row[0] for row in cursor.fetchall()]
+
     def field_cast_sql(self, db_type):
         """
         Given a column type (e.g. 'BLOB', 'VARCHAR'), returns the SQL necessary
@@ -635,6 +719,34 @@ class BaseDatabaseOperations(object):
         """
         return None
 
+    def in_array_threshold(self):
+        """
+        Returns the number of items from which an 'IN' list condition is
+        compiled to a comparison with a single array parameter (see
+        in_array_sql()), or None if the backend does not support it.
+        """
+        return None
+
+    def in_array_sql(self, field_sql, db_type):
+        """
+        Returns the SQL comparing `field_sql`, of the database type `db_type`
+        (None if unknown), with the items of the array passed as its only
+        parameter.
+        """
+        raise NotImplementedError('This backend does not support array '
+                                  'parameters.')
+
+    def values_cast_type(self, db_type):
+        """
+        Returns the type the values stored in a column of the database type
+        `db_type` are cast to in a VALUES list (see
+        DatabaseFeatures.supports_update_from_values). The modifiers which
+        would truncate or round the values before they are stored should be
+        left out.
+        """
+        # drop the constraints of the column definition (e.g. CHECK)
+        return db_type.split(' CHECK ')[0]
+
     def max_name_length(self):
         """
         Returns the maximum length of table and column names, or None if there
@@ -901,6 +1013,11 @@ class BaseDatabaseIntrospection(object):
         only if the database supports shared sequences"""
         raise NotImplementedError
 
+    def set_sequence_exists(self,seq_name):
+        """record that the sequence exists in the db, without check.
+        Required only if the database supports shared sequences"""
+        raise NotImplementedError
+
     def get_field_type(self, data_type, description):
         """Hook for a database backend to use the cursor description to
         match a Django field type to a database column.
@@ -942,6 +1059,9 @@ class BaseDatabaseIntrospection(object):
                 if not router.allow_syncdb(self.connection.alias, model):
                     continue
                 tables.add(model._meta.db_table)
+                if model._meta.intermediate and model._meta.concrete:
+                    # pg_django: the table behind a concrete intermediate view
+                    tables.add(model._meta.concrete_table_name)
                 tables.update([f.m2m_db_table() for f in model._meta.local_many_to_many])
         tables = list(tables)
         if only_existing:
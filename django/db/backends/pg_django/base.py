@@ -1,30 +1,216 @@
+import itertools
+import re
+import sys
+
+from django.conf import settings
+from django.db import utils
+from django.db.backends import util
 from django.db.backends.postgresql_psycopg2.base import *
 from django.db.backends.postgresql_psycopg2.base import DatabaseWrapper as _DatabaseWrapper
 from django.db.backends.postgresql_psycopg2.base import DatabaseFeatures as _DatabaseFeatures
+from django.db.backends.postgresql_psycopg2.base import CursorWrapper, utc_tzinfo_factory
 from django.db.backends.postgresql_psycopg2.introspection import DatabaseIntrospection as _DatabaseIntrospection
 from django.db.backends.postgresql_psycopg2.operations import DatabaseOperations as _DatabaseOperations
+from django.db.backends.pg_django.bulkcopy import CopyReader
 from django.db.backends.pg_django.creation import DatabaseCreation
+from django.db.backends.pg_django.pool import (get_pool, PooledConnection,
+    DEFAULT_POOL_SIZE)
+from django.db.backends.pg_django.prepared import (PreparedStatements,
+    DEFAULT_MAX_PREPARED_STATEMENTS, PLAN_INVALIDATED, is_ddl,
+    is_transaction_control)
+
+# decode the elements of text arrays into unicode, as the text columns, so
+# the array fields can use them without conversion
+Database.extensions.register_type(Database.extensions.UNICODEARRAY)
+
+
+# how many ids are reserved at once by DatabaseOperations.allocate_ids
+ID_BLOCK_SIZE = 100
+
+# the number of items from which the IN lists are passed as a single array
+# parameter, by default
+DEFAULT_IN_ARRAY_THRESHOLD = 100
+
+# the type of a column, its modifiers and constraints, e.g. "varchar" and
+# "(100)" for "varchar(100)" or "integer" for 'integer CHECK ("x" >= 0)'.
+# Casting to the type with its modifiers would truncate or round the compared
+# values.
+_column_type_re = re.compile(
+    r'([a-z][a-z0-9_ ]*?)\s*(\(\d+(,\s*\d+)?\))?(\s+CHECK\b.*)?$', re.I)
+
+# the types of the items of the arrays compared to columns of these types, and
+# of the values cast for them ("char" alone is char(1), "bit" alone bit(1))
+ARRAY_ITEM_TYPES = {'serial': 'integer', 'bigserial': 'bigint',
+                    'char': 'bpchar', 'character': 'bpchar', 'bit': 'varbit'}
+
+# the types of array items which don't need the modifiers of the column
+UNBOUNDED_ITEM_TYPES = set(['varchar', 'character varying', 'bpchar',
+                            'varbit', 'bit varying', 'numeric', 'decimal'])
+
+
+def _unbounded_type(db_type):
+    """
+    Returns the column type `db_type` without the modifiers which would
+    truncate or round the values cast to it, or None if they can't be dropped.
+    """
+    match = _column_type_re.match(db_type)
+    if match:
+        item_type = match.group(1)
+        item_type = ARRAY_ITEM_TYPES.get(item_type.lower(), item_type)
+        if (not match.group(2) or
+                item_type.lower() in UNBOUNDED_ITEM_TYPES):
+            return item_type
+    return None
+
+# numbers the server-side cursors, which need a name
+_cursor_numbers = itertools.count(1)
 
+# resets the session of a pooled connection, as DISCARD ALL but keeping the
+# prepared statements
+RESET_SESSION_SQL = ('SET SESSION AUTHORIZATION DEFAULT; RESET ALL; '
+                     'CLOSE ALL; UNLISTEN *; SELECT pg_advisory_unlock_all(); '
+                     'DISCARD TEMP; DISCARD SEQUENCES; '
+                     "SET client_encoding TO 'UTF8'")
 
 
 class DatabaseIntrospection(_DatabaseIntrospection):
+    def __init__(self, *args, **kwargs):
+        super(DatabaseIntrospection, self).__init__(*args, **kwargs)
+        # the names of the sequences existing in each database (by unique
+        # name), loaded once
+        self._sequences = {}
+
     def get_unique_name(self):
+        # make sure we are connected
+        self.connection.cursor()
         return self.connection.connection.dsn
 
+    def get_sequences(self):
+        """return the set of the sequences of the database"""
+        uid = self.get_unique_name()
+        if uid not in self._sequences:
+            cur = self.connection.cursor()
+            cur.execute("""SELECT relname FROM pg_catalog.pg_class
+                       WHERE relkind = 'S'""")
+            self._sequences[uid] = set([row[0] for row in cur.fetchall()])
+        return self._sequences[uid]
+
     def sequence_exists(self, sequence):
         """return True if the given sequence exists in database"""
-        cur = self.connection.cursor()
-        cur.execute("""SELECT * FROM pg_catalog.pg_class
-                   WHERE relname = %s AND relkind = 'S'""",[sequence])
-        if len(cur.fetchall()):
-            return True
-        return False
+        return sequence in self.get_sequences()
+
+    def set_sequence_exists(self, sequence):
+        self.get_sequences().add(sequence)
 
 
 class DatabaseOperations(_DatabaseOperations):
+    id_block_size = ID_BLOCK_SIZE
+
+    def __init__(self, *args, **kwargs):
+        super(DatabaseOperations, self).__init__(*args, **kwargs)
+        # ids reserved but not handed out yet, by (database, sequence)
+        self._id_pools = {}
+
     def get_sql_for_shared_sequence(self,field):
         return "INTEGER DEFAULT nextval('%s')" % field.sequence
 
+    def allocate_ids(self, field, count):
+        """
+        Reserves `count` values of the sequence of the AutoField `field`.
+
+        Values are drawn from the sequence by blocks of at least
+        id_block_size in a single query, and kept in a pool of this
+        connection, so that most calls do not hit the database. Reserved
+        values are never handed out twice, but may be lost (the sequence
+        gets gaps, as with rolled back inserts).
+        """
+        from django.db.models.fields import SharedAutoField
+        if isinstance(field, SharedAutoField):
+            seq_sql, params = '%s', [field.sequence]
+        else:
+            seq_sql = 'pg_get_serial_sequence(%s, %s)'
+            params = [self.quote_name(field.model._meta.concrete_table_name),
+                      field.column]
+        key = (self.connection.introspection.get_unique_name(),
+               seq_sql, tuple(params))
+        pool = self._id_pools.setdefault(key, [])
+        if len(pool) < count:
+            cursor = self.connection.cursor()
+            cursor.execute('SELECT nextval(%s) FROM generate_series(1, %%s)'
+                           % seq_sql,
+                           params + [max(count - len(pool), self.id_block_size)])
+            pool.extend([row[0] for row in cursor.fetchall()])
+        ids = pool[:count]
+        del pool[:count]
+        return ids
+
+    def copy_from(self, table, columns, rows):
+        if not hasattr(rows, 'read'):
+            rows = CopyReader(rows)
+        cursor = self.connection.cursor()
+        try:
+            cursor.copy_expert('COPY %s (%s) FROM STDIN' % (
+                self.quote_name(table),
+                ', '.join([self.quote_name(c) for c in columns])), rows)
+        except Database.IntegrityError, e:
+            raise utils.IntegrityError, utils.IntegrityError(*tuple(e)), sys.exc_info()[2]
+        except Database.DatabaseError, e:
+            raise utils.DatabaseError, utils.DatabaseError(*tuple(e)), sys.exc_info()[2]
+        return cursor.rowcount
+
+    def copy_to(self, sql, params, file):
+        cursor = self.connection.cursor()
+        try:
+            cursor.copy_expert('COPY (%s) TO STDOUT'
+                               % cursor.mogrify(sql, params), file)
+        except Database.DatabaseError, e:
+            raise utils.DatabaseError, utils.DatabaseError(*tuple(e)), sys.exc_info()[2]
+        return cursor.rowcount
+
+    def in_array_threshold(self):
+        return self.connection.in_array_threshold
+
+    def in_array_sql(self, field_sql, db_type):
+        item_type = db_type and _unbounded_type(db_type)
+        if item_type:
+            # the array is cast, as psycopg2 passes the strings as text
+            return '%s = ANY(%%s::%s[])' % (field_sql, item_type)
+        return '%s = ANY(%%s)' % field_sql
+
+    def values_cast_type(self, db_type):
+        return (_unbounded_type(db_type) or
+                super(DatabaseOperations, self).values_cast_type(db_type))
+
+    def replication_lag_sql(self):
+        # a replica which replayed all it received is caught up, however old
+        # its last transaction (the primary may be idle); otherwise the time
+        # of the last replayed transaction is compared to the clock rather
+        # than to the start of the current transaction
+        return ("SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+                "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+                "THEN 0 ELSE "
+                "EXTRACT(EPOCH FROM clock_timestamp() - "
+                "pg_last_xact_replay_timestamp()) END")
+
+    def on_conflict_sql(self, table, conflict_columns, update_columns):
+        qn = self.quote_name
+        if update_columns:
+            updates = ['%s = EXCLUDED.%s' % (qn(c), qn(c))
+                       for c in update_columns]
+        else:
+            # DO NOTHING would not return the conflicting rows, a no-op
+            # update does
+            updates = ['%s = %s.%s' % (qn(c), qn(table), qn(c))
+                       for c in conflict_columns[:1]]
+        return 'ON CONFLICT (%s) DO UPDATE SET %s' % (
+            ', '.join([qn(c) for c in conflict_columns]), ', '.join(updates))
+
+    def return_upsert_id(self):
+        # xmax is 0 on the rows inserted by the statement, and the id of the
+        # updating transaction on the updated ones
+        return "RETURNING %s, (xmax = 0)", ()
+
+
 
 class DatabaseFeatures(_DatabaseFeatures):
     support_arrays = True
@@ -32,15 +218,207 @@ class DatabaseFeatures(_DatabaseFeatures):
     support_rewrite = True
     support_materialized_view_base = True
     support_shared_sequence = True
+    can_return_ids_from_bulk_insert = True
+    supports_server_side_cursors = True
+    supports_copy = True
+    supports_upsert = True
+    supports_update_from_values = True
+    supports_prepared_statements = True
+    supports_connection_pool = True
+    supports_db_cascade = True
+    supports_replication_lag = True
+
+
+class ServerSideCursorWrapper(CursorWrapper):
+    def close(self):
+        try:
+            self.cursor.close()
+        except Database.ProgrammingError:
+            # the cursor ended with its transaction
+            pass
+
+
+class PreparingCursorWrapper(CursorWrapper):
+    """
+    A cursor running the statements executed often enough as prepared
+    statements (see django.db.backends.pg_django.prepared).
+    """
+    def __init__(self, cursor, statements):
+        super(PreparingCursorWrapper, self).__init__(cursor)
+        self.statements = statements
+        # the query and parameters of the last prepared statement executed
+        self.executed = None
+
+    def execute(self, query, args=None):
+        execute = super(PreparingCursorWrapper, self).execute
+        statements = self.statements
+        if statements.stale and self.can_deallocate(query):
+            execute('DEALLOCATE ALL')
+            statements.clear()
+        self.executed = None
+        name, prepare = statements.get(query, args)
+        if prepare is not None and not self.prepare(name, prepare):
+            name = None
+        if name is None:
+            result = execute(query, args)
+            if is_ddl(query):
+                statements.stale = True
+            return result
+        self.executed = (query, args)
+        if args:
+            name = '%s (%s)' % (name, ', '.join(['%s'] * len(args)))
+        try:
+            return self.cursor.execute('EXECUTE %s' % name, args)
+        except Database.IntegrityError, e:
+            raise utils.IntegrityError, utils.IntegrityError(*tuple(e)), sys.exc_info()[2]
+        except Database.DatabaseError, e:
+            if e.pgcode == PLAN_INVALIDATED:
+                # the plan of the statement was invalidated by a schema
+                # change made through another connection: prepare everything
+                # again
+                statements.stale = True
+            raise utils.DatabaseError, utils.DatabaseError(*tuple(e)), sys.exc_info()[2]
+
+    def can_deallocate(self, query):
+        """Return whether the stale prepared statements can be deallocated
+        before running `query`"""
+        status = self.cursor.connection.get_transaction_status()
+        # DEALLOCATE would fail in a failed transaction, and prevent
+        # `query` from ending it
+        return (status != Database.extensions.TRANSACTION_STATUS_INERROR and
+                not is_transaction_control(query))
+
+    def prepare(self, name, prepare):
+        """Run the `prepare` statements, preparing the statement `name`.
+        Returns whether it succeeded."""
+        execute = super(PreparingCursorWrapper, self).execute
+        # an error rolls back the current transaction, unless it is
+        # contained by a savepoint
+        autocommit = self.cursor.connection.autocommit
+        try:
+            if not autocommit:
+                execute('SAVEPOINT _django_prepare')
+            for sql in prepare:
+                execute(sql)
+            if not autocommit:
+                execute('RELEASE SAVEPOINT _django_prepare')
+        except utils.DatabaseError:
+            if not autocommit:
+                execute('ROLLBACK TO SAVEPOINT _django_prepare; '
+                        'RELEASE SAVEPOINT _django_prepare')
+            self.statements.failed(name)
+            return False
+        return True
+
+    @property
+    def query(self):
+        # the query as it would have been sent unprepared, for
+        # DatabaseOperations.last_executed_query()
+        if self.executed is None:
+            return self.cursor.query
+        return self.cursor.mogrify(*self.executed)
 
 
 class DatabaseWrapper(_DatabaseWrapper):
+    django_options = _DatabaseWrapper.django_options + (
+        'prepare_threshold', 'max_prepared_statements', 'max_age',
+        'pool_size', 'in_array_threshold')
+
     # TODO PG: now that we override about anything in it, we should rewrite
     #          the whole method
     def __init__(self, *args, **kwargs):
         super(DatabaseWrapper, self).__init__(*args, **kwargs)
         self.features = DatabaseFeatures(self)
+        # set by _set_isolation_level() on the features replaced above
+        self.features.uses_savepoints = bool(self.isolation_level)
         self.ops = DatabaseOperations(self)
         self.creation = DatabaseCreation(self)
         self.introspection = DatabaseIntrospection(self)
+        options = self.settings_dict['OPTIONS']
+        self.prepare_threshold = options.get('prepare_threshold')
+        self.max_prepared_statements = options.get(
+            'max_prepared_statements', DEFAULT_MAX_PREPARED_STATEMENTS)
+        # the statements prepared on the current connection
+        self.prepared_statements = None
+        # the connections are pooled unless max_age is 0
+        self.max_age = options.get('max_age', 0)
+        self.pool_size = options.get('pool_size', DEFAULT_POOL_SIZE)
+        # the current connection, when it comes from a pool
+        self.pooled = None
+        self.in_array_threshold = options.get('in_array_threshold',
+                                              DEFAULT_IN_ARRAY_THRESHOLD)
+
+    def get_pool(self):
+        """Return the pool of the connections to the database, None if the
+        connections are not pooled"""
+        if self.max_age == 0 or not self.pool_size:
+            return None
+        settings_dict = self.settings_dict
+        key = tuple([settings_dict[name] for name in
+                     ('NAME', 'USER', 'PASSWORD', 'HOST', 'PORT')] +
+                    sorted(settings_dict['OPTIONS'].items()))
+        return get_pool(key, self.pool_size, self.max_age)
+
+    def reset_session(self, connection):
+        """Reset the session of a connection taken from the pool to the state
+        of a new connection"""
+        connection.set_isolation_level(
+            Database.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        sql, params = RESET_SESSION_SQL, ()
+        tz = 'UTC' if settings.USE_TZ else self.settings_dict.get('TIME_ZONE')
+        if tz:
+            sql, params = '%s; %s' % (sql, self.ops.set_time_zone_sql()), [tz]
+        connection.cursor().execute(sql, params)
+
+    def _cursor(self):
+        pool = None
+        new_connection = self.connection is None
+        if new_connection:
+            pool = self.get_pool()
+            if pool is not None:
+                self.pooled = pool.get(self.reset_session)
+            if self.pooled is not None:
+                self.connection = self.pooled.connection
+                self.connection.set_isolation_level(self.isolation_level)
+                self.prepared_statements = self.pooled.prepared_statements
+                new_connection = False
+        cursor = super(DatabaseWrapper, self)._cursor()
+        if new_connection:
+            if self.prepare_threshold and self.max_prepared_statements:
+                self.prepared_statements = PreparedStatements(
+                    self.prepare_threshold, self.max_prepared_statements)
+            if pool is not None:
+                self.pooled = PooledConnection(pool, self.connection,
+                                               self.prepared_statements)
+        if self.prepared_statements is None:
+            return cursor
+        return PreparingCursorWrapper(cursor.cursor, self.prepared_statements)
+
+    def close(self):
+        if self.pooled is None:
+            return super(DatabaseWrapper, self).close()
+        # return the connection to its pool
+        self.validate_thread_sharing()
+        pooled, self.pooled = self.pooled, None
+        self.connection = None
+        self.prepared_statements = None
+        pooled.release()
 
+    def server_side_cursor(self, withhold=False):
+        """
+        Returns a cursor on a new named (server-side) cursor: the rows of its
+        query are kept by the server until fetched. Unless `withhold` is set,
+        the cursor can only be used in the current transaction.
+        """
+        self.validate_thread_sharing()
+        # make sure we are connected
+        self._cursor()
+        cursor = self.connection.cursor(
+            name='_django_stream_%d' % _cursor_numbers.next(),
+            withhold=withhold)
+        cursor.tzinfo_factory = utc_tzinfo_factory if settings.USE_TZ else None
+        cursor = ServerSideCursorWrapper(cursor)
+        if (self.use_debug_cursor or
+            (self.use_debug_cursor is None and settings.DEBUG)):
+            return self.make_debug_cursor(cursor)
+        return util.CursorWrapper(cursor, self)
@@ -0,0 +1,162 @@
+"""
+Encoding and decoding of the text format of COPY.
+
+QuerySet.copy_from() streams rows to ``COPY ... FROM STDIN`` through a
+CopyReader, and QuerySet.copy_to() writes the output of
+``COPY (SELECT ...) TO STDOUT`` to a file, which read_copy_rows() turns back
+into python values.
+"""
+import datetime
+import re
+
+from django.db.models.fields import ArrayFieldBase
+
+# backslash sequences of the text format of COPY
+_ESCAPES = {'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v'}
+_escape_re = re.compile(r'\\(.)')
+
+
+def _to_str(value):
+    """Return the text representation of a value prepared for saving"""
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return value and 't' or 'f'
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def array_literal(values):
+    """Return the array literal of the list `values`"""
+    items = []
+    for value in values:
+        if value is None:
+            items.append('NULL')
+        elif isinstance(value, (list, tuple)):
+            items.append(array_literal(value))
+        else:
+            items.append('"%s"' % _to_str(value).replace(
+                '\\', '\\\\').replace('"', '\\"'))
+    return '{%s}' % ','.join(items)
+
+
+def encode_copy_value(value):
+    """Return `value`, prepared for saving, in the text format of COPY"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, (list, tuple)):
+        value = array_literal(value)
+    else:
+        value = _to_str(value)
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace(
+        '\r', '\\r').replace('\t', '\\t')
+
+
+class CopyReader(object):
+    """
+    A file-like object reading `rows` (an iterable of sequences of values
+    prepared for saving) in the text format of COPY. The rows are encoded as
+    they are read, so that they are never all held in memory.
+    """
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = ''
+
+    def readline(self, size=-1):
+        if self.buffer:
+            line, self.buffer = self.buffer, ''
+            return line
+        try:
+            row = self.rows.next()
+        except StopIteration:
+            return ''
+        return '\t'.join([encode_copy_value(v) for v in row]) + '\n'
+
+    def read(self, size=-1):
+        chunks = [self.buffer]
+        length = len(self.buffer)
+        while size < 0 or length < size:
+            line = self.readline()
+            if not line:
+                break
+            chunks.append(line)
+            length += len(line)
+        data = ''.join(chunks)
+        if size < 0:
+            self.buffer = ''
+            return data
+        self.buffer = data[size:]
+        return data[:size]
+
+
+def _unescape(value):
+    return _escape_re.sub(lambda m: _ESCAPES.get(m.group(1), m.group(1)),
+                          value)
+
+
+def decode_copy_line(line):
+    """Return the list of the values (unicode or None) of a line in the text
+    format of COPY"""
+    return [None if value == '\\N' else _unescape(value).decode('utf-8')
+            for value in line.rstrip('\n').split('\t')]
+
+
+def parse_array_literal(literal):
+    """Return the list of the elements (unicode or None) of an array
+    literal, as written by PostgreSQL"""
+    stack = [[]]
+    pos, end = 0, len(literal)
+    while pos < end:
+        char = literal[pos]
+        if char == '{':
+            stack.append([])
+            pos += 1
+        elif char == '}':
+            values = stack.pop()
+            stack[-1].append(values)
+            pos += 1
+        elif char == ',':
+            pos += 1
+        elif char == '"':
+            chars = []
+            pos += 1
+            while literal[pos] != '"':
+                if literal[pos] == '\\':
+                    pos += 1
+                chars.append(literal[pos])
+                pos += 1
+            stack[-1].append(u''.join(chars))
+            pos += 1
+        else:
+            stop = pos
+            while literal[stop] not in ',}':
+                stop += 1
+            value = literal[pos:stop].strip()
+            stack[-1].append(None if value == 'NULL' else value)
+            pos = stop
+    return stack[0][0]
+
+
+def read_copy_rows(file, model, fields=None):
+    """
+    Yields tuples of the python values of the lines of `file`, written by
+    QuerySet.copy_to(). `fields` are the names of the fields written, by
+    default all the fields of `model`. The lines are read one at a time.
+    """
+    opts = model._meta
+    if fields is None:
+        fields = opts.fields
+    else:
+        fields = [opts.get_field(name) for name in fields]
+    arrays = [isinstance(f, ArrayFieldBase) for f in fields]
+    for line in file:
+        values = decode_copy_line(line)
+        for i, value in enumerate(values):
+            if arrays[i] and value is not None:
+                values[i] = parse_array_literal(value)
+        yield tuple([f.to_python(value) for f, value in zip(fields, values)])
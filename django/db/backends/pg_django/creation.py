@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.db.backends.postgresql_psycopg2.base import DatabaseCreation as _DatabaseCreation
+from django.db.backends.pg_django.pool import clear_pools
 from django.db.models.fields import FieldDoesNotExist
 
 from django.db.models import ArrayFieldBase
@@ -15,8 +16,8 @@ class DatabaseCreation(_DatabaseCreation):
         from django.db.models import CASCADE
         qn = self.connection.ops.quote_name
         if field.rel.to in known_models:
-            cascade = getattr(settings, 'DB_CASCADE', False
-                             ) and field.rel.on_delete == CASCADE
+            cascade = (settings.DB_CASCADE and
+                       field.rel.on_delete == CASCADE)
             output = [style.SQL_KEYWORD('REFERENCES') + ' ' +
                 style.SQL_TABLE(qn(field.rel.to._meta.db_table)) + ' (' +
                 style.SQL_FIELD(qn(field.rel.to._meta.get_field(
@@ -36,7 +37,7 @@ class DatabaseCreation(_DatabaseCreation):
     def sql_for_pending_references(self, model, style, pending_references):
         """
         Returns any ALTER TABLE statements to add constraints after the fact.
-        pg_django adds ON DELETE CASCADE if settings.DELETE_CASCADE is True
+        pg_django adds ON DELETE CASCADE if settings.DB_CASCADE is True
         """
         from django.db.backends.util import truncate_name
         from django.db.models import CASCADE
@@ -48,8 +49,7 @@ class DatabaseCreation(_DatabaseCreation):
         opts = model._meta
         if model in pending_references:
             for rel_class, f in pending_references[model]:
-                if getattr(settings, 'DB_CASCADE', False
-                          )and f.rel.on_delete == CASCADE:
+                if settings.DB_CASCADE and f.rel.on_delete == CASCADE:
                     cascade = ' ON DELETE CASCADE'
                 else:
                     cascade = ''
@@ -69,6 +69,57 @@ class DatabaseCreation(_DatabaseCreation):
             del pending_references[model]
         return final_output
 
+    def sql_leaf_column_predicate(self, model, f, style):
+        """
+        Returns the WHERE clause of the partial indexes on the column of `f`
+        in the materialized view base `model`, or an empty string.
+
+        Columns stored by a few leaves only are NULL in the rows of the other
+        leaves: indexes on such columns skip the NULLs. Any NULL-rejecting
+        lookup on the column (thus any lookup pruned to the storing leaves,
+        see SQLCompiler.get_leaf_pruning) can use them.
+        """
+        opts = model._meta
+        if not opts.materialized_view or f.column == 'pgd_child_type':
+            return ''
+        if opts.get_column_leaf_ids(f.column) == set(opts.leaf_ids):
+            return ''
+        return ' %s %s %s' % (style.SQL_KEYWORD('WHERE'),
+                              style.SQL_FIELD(self.connection.ops.quote_name(f.column)),
+                              style.SQL_KEYWORD('IS NOT NULL'))
+
+    def sql_indexes_for_model(self, model, style):
+        """
+        pg_django adds the composite (pgd_child_type, column) indexes
+        declared in the Meta.child_type_indexes of materialized view bases
+        """
+        output = super(DatabaseCreation, self).sql_indexes_for_model(model,
+                                                                     style)
+        opts = model._meta
+        if not opts.managed or opts.proxy or not opts.materialized_view:
+            return output
+        from django.db.backends.util import truncate_name
+        qn = self.connection.ops.quote_name
+        for field_name in opts.child_type_indexes:
+            f = opts.get_field(field_name)
+            tablespace = f.db_tablespace or opts.db_tablespace
+            tablespace_sql = ''
+            if tablespace:
+                tablespace_sql = self.connection.ops.tablespace_sql(tablespace)
+                if tablespace_sql:
+                    tablespace_sql = ' ' + tablespace_sql
+            index_name = '%s_pgd_child_type_%s' % (opts.db_table, f.column)
+            output.append(style.SQL_KEYWORD('CREATE INDEX') + ' ' +
+                style.SQL_TABLE(qn(truncate_name(index_name,
+                    self.connection.ops.max_name_length()))) + ' ' +
+                style.SQL_KEYWORD('ON') + ' ' +
+                style.SQL_TABLE(qn(opts.db_table)) + ' ' +
+                "(%s, %s)" % (style.SQL_FIELD(qn('pgd_child_type')),
+                              style.SQL_FIELD(qn(f.column))) +
+                "%s%s;" % (tablespace_sql,
+                           self.sql_leaf_column_predicate(model, f, style)))
+        return output
+
     def sql_indexes_for_field(self, model, f, style):
         from django.db.backends.util import truncate_name
         if f.db_index and not f.unique:
@@ -96,6 +147,7 @@ class DatabaseCreation(_DatabaseCreation):
                 using = 'gin'
             else:
                 using = 'btree'
+            where_sql = self.sql_leaf_column_predicate(model, f, style)
 
             def get_index_sql(index_name, opclass=''):
                 return (style.SQL_KEYWORD('CREATE INDEX') + ' ' +
@@ -105,7 +157,7 @@ class DatabaseCreation(_DatabaseCreation):
                         style.SQL_KEYWORD('USING') + ' ' +
                         style.SQL_KEYWORD(using) + ' ' +
                         "(%s%s)" % (style.SQL_FIELD(qn(f.column)), opclass) +
-                        "%s;" % tablespace_sql)
+                        "%s%s;" % (tablespace_sql, where_sql))
 
             output = [get_index_sql('%s_%s' % (db_table, f.column))]
 
@@ -135,20 +187,19 @@ class DatabaseCreation(_DatabaseCreation):
         columns = {}
         for child in model._meta.leaves:
             child_columns = []
+            child_fields = dict([(f.column, f) for f in child._meta.fields])
             it = iter(col_types)
             for col_name in col_names:
                 col_type = it.next()
                 try:
-                    f = child._meta.get_field_by_name(col_name)[0]
-                    if getattr(f, 'child_field', False):
+                    # match on the column, foreign keys are named after the
+                    # field but stored in <name>_id
+                    f = child_fields.get(col_name)
+                    if f is None or getattr(f, 'child_field', False):
                         raise FieldDoesNotExist()
                     child_columns.append((col_name,col_name,col_type))
-                    if f.rel and pending_references is not None:
-                        # TODO PG: think it doesn't work yet, as materialized
-                        # views are created after everything (get_models
-                        # is monkey-patched for this purpose). Test this
-                        pending_references.setdefault(f.rel.to, []).append(
-                                                                (model, f))
+                    # the references of the base table columns are made by
+                    # _sql_create_table_for_model with the acquired fields
                 except FieldDoesNotExist:
                     child_columns.append((None,col_name, col_type))
             columns[child] = child_columns
@@ -326,15 +377,8 @@ class DatabaseCreation(_DatabaseCreation):
 
             if matview:
                 # create the triggers
-                for leaf in model._meta.leaves :
-                    if not leaf._meta.concrete:
-                        continue
-                    final_output.extend(self.make_view_update_statements(
-                        model, leaf, style, columns))
-                    final_output.extend(self.make_view_insert_statements(
-                        model, leaf, style, columns))
-                    final_output.extend(self.make_view_delete_statements(
-                        model, leaf, style, columns))
+                final_output.extend(self.sql_view_triggers(model, style,
+                                                           columns))
 
             if intermediate and concrete:
                 table_name = model._meta.concrete_table_name
@@ -422,6 +466,13 @@ class DatabaseCreation(_DatabaseCreation):
         #+ style.SQL_FIELD(qn(model._meta.pk.column))
         return stmt
 
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # the pooled connections to the test database would prevent dropping
+        # it
+        clear_pools()
+        super(DatabaseCreation, self)._destroy_test_db(test_database_name,
+                                                       verbosity)
+
     def sequence_exists(self, sequence):
         """return True if the given sequence exists in database"""
         cur = self.connection.cursor()
@@ -431,23 +482,130 @@ class DatabaseCreation(_DatabaseCreation):
             return True
         return False
 
+    def sql_view_triggers(self, model, style, columns=None, replace=False):
+        """Return the statements creating the triggers that keep the
+        materialized view base table of `model` up to date with its leaves.
+
+        If `replace` is True, existing triggers are dropped first. This is
+        how an existing database is switched to another Meta.view_maintenance
+        mode.
+        """
+        if columns is None:
+            columns = self.get_columns_for_mat_view(model)
+        output = []
+        leaves = [leaf for leaf in model._meta.leaves if leaf._meta.concrete]
+        if [leaf for leaf in leaves
+                if leaf._meta.get_view_maintenance() == 'deferred']:
+            output.append(self.make_changelog_statement(model, style))
+        for leaf in leaves:
+            if replace:
+                output.extend(self.make_drop_trigger_statements(leaf, style))
+            if leaf._meta.get_view_maintenance() == 'deferred':
+                output.extend(self.make_view_queue_statements(
+                    model, leaf, style))
+                continue
+            output.extend(self.make_view_update_statements(
+                model, leaf, style, columns))
+            output.extend(self.make_view_insert_statements(
+                model, leaf, style, columns))
+            output.extend(self.make_view_delete_statements(
+                model, leaf, style, columns))
+        return output
+
+    def make_changelog_statement(self, model, style):
+        """The table where leaves using deferred maintenance queue the
+        primary keys of the rows they write"""
+        qn = self.connection.ops.quote_name
+        stmt = style.SQL_KEYWORD('CREATE TABLE IF NOT EXISTS') + ' '
+        stmt += style.SQL_TABLE(qn(model._meta.view_changelog_table)) + ' (\n'
+        stmt += '    ' + style.SQL_FIELD(qn('seq')) + ' '
+        stmt += style.SQL_COLTYPE('bigserial') + ' '
+        stmt += style.SQL_KEYWORD('PRIMARY KEY') + ',\n'
+        stmt += '    ' + style.SQL_FIELD(qn(model._meta.pk.column)) + ' '
+        stmt += style.SQL_COLTYPE('integer') + ' '
+        stmt += style.SQL_KEYWORD('NOT NULL') + ',\n'
+        stmt += '    ' + style.SQL_FIELD(qn('pgd_child_type')) + ' '
+        stmt += style.SQL_COLTYPE('integer') + ' '
+        stmt += style.SQL_KEYWORD('NOT NULL') + ',\n'
+        stmt += '    ' + style.SQL_FIELD(qn('queued')) + ' '
+        stmt += style.SQL_COLTYPE('timestamp with time zone') + ' '
+        stmt += style.SQL_KEYWORD('NOT NULL DEFAULT now()') + '\n);'
+        return stmt
+
+    def make_view_queue_statements(self, model, leaf, style):
+        """Triggers queuing the primary keys written on a leaf using deferred
+        maintenance. They run once per statement."""
+        output = []
+        leaf_table = leaf._meta.concrete_table_name
+        qn = self.connection.ops.quote_name
+        changelog = style.SQL_TABLE(qn(model._meta.view_changelog_table))
+        pk_column = style.SQL_FIELD(qn(model._meta.pk.column))
+        queue = style.SQL_KEYWORD('INSERT INTO') + ' ' + changelog + ' ( '
+        queue += pk_column + ', ' + style.SQL_FIELD(qn('pgd_child_type'))
+        queue += ' )\n    '
+        select = style.SQL_KEYWORD('SELECT') + ' ' + pk_column
+        select += ', %s ' % leaf._meta.leaf_id + style.SQL_KEYWORD('FROM')
+
+        for suffix, event, body, referencing in (
+                ('_it', 'AFTER INSERT', select + ' pgd_new',
+                    'NEW TABLE AS pgd_new'),
+                # a primary key may be updated: queue both the old and new ones
+                ('_ut', 'AFTER UPDATE', select + ' pgd_new\n    ' +
+                    style.SQL_KEYWORD('UNION') + ' ' + select + ' pgd_old',
+                    'OLD TABLE AS pgd_old NEW TABLE AS pgd_new'),
+                ('_dt', 'AFTER DELETE', select + ' pgd_old',
+                    'OLD TABLE AS pgd_old')):
+            name = leaf_table + suffix
+            output.append(self.make_proc_statement(style,
+                                    name=name,
+                                    returns='TRIGGER',
+                                    body=queue + body + ';\n' +
+                                        style.SQL_KEYWORD('RETURN NULL') + ';'
+                                    ) + '\n')
+            output.append(self.make_create_trigger_statement(
+                                    style, name, event, leaf_table, name,
+                                    referencing) + '\n')
+        return output
+
+    def make_drop_trigger_statements(self, leaf, style):
+        qn = self.connection.ops.quote_name
+        leaf_table = leaf._meta.concrete_table_name
+        return [style.SQL_KEYWORD('DROP TRIGGER IF EXISTS') + ' ' +
+                style.SQL_TABLE(qn(leaf_table + suffix)) + ' ' +
+                style.SQL_KEYWORD('ON') + ' ' +
+                style.SQL_TABLE(qn(leaf_table)) + ';'
+                for suffix in ('_ut', '_it', '_dt')]
+
     def make_view_update_statements(self, model, leaf, style, columns):
         output = []
         leaf_table = leaf._meta.concrete_table_name
+        base_table = model._meta.db_table
+        pk_column = model._meta.pk.column
         qn = self.connection.ops.quote_name
+        # In statement mode, the updated rows are read from the NEW
+        # transition table and the whole statement is applied at once
+        by_statement = leaf._meta.get_view_maintenance() == 'statement'
+        row = by_statement and 'pgd_new.' or 'new.'
         # update trigger
         ut_name = leaf_table + '_ut'
         ut_body = style.SQL_KEYWORD('UPDATE') + ' '
-        ut_body += style.SQL_TABLE(qn(model._meta.db_table)) + '\n'
+        ut_body += style.SQL_TABLE(qn(base_table)) + '\n'
         ut_body += style.SQL_KEYWORD('SET') + ' '
         ut_body += ', '.join([style.SQL_FIELD(qn(name)
-                        ) + style.SQL_KEYWORD(' = new.'
+                        ) + style.SQL_KEYWORD(' = ' + row
                         ) + style.SQL_FIELD(qn(name)
-        ) for value, name, _ in columns[leaf] if value not in (None, model._meta.pk.column)])
-        ut_body += '\n    ' + style.SQL_KEYWORD('WHERE') + ' '
-        ut_body += style.SQL_FIELD(qn(model._meta.pk.column)) + ' '
-        ut_body += style.SQL_KEYWORD('=') + ' NEW.'
-        ut_body += style.SQL_FIELD(qn(model._meta.pk.column)) + ';\n'
+        ) for value, name, _ in columns[leaf] if value not in (None, pk_column)])
+        if by_statement:
+            ut_body += '\n    ' + style.SQL_KEYWORD('FROM') + ' pgd_new'
+            ut_body += '\n    ' + style.SQL_KEYWORD('WHERE') + ' '
+            ut_body += style.SQL_TABLE(qn(base_table)) + '.'
+            ut_body += style.SQL_FIELD(qn(pk_column)) + ' '
+            ut_body += style.SQL_KEYWORD('=') + ' pgd_new.'
+        else:
+            ut_body += '\n    ' + style.SQL_KEYWORD('WHERE') + ' '
+            ut_body += style.SQL_FIELD(qn(pk_column)) + ' '
+            ut_body += style.SQL_KEYWORD('=') + ' NEW.'
+        ut_body += style.SQL_FIELD(qn(pk_column)) + ';\n'
         ut_body += style.SQL_KEYWORD('RETURN NULL') + ';'
 
         output.append(self.make_proc_statement(style,
@@ -460,21 +618,33 @@ class DatabaseCreation(_DatabaseCreation):
                                     ut_name,
                                     'AFTER UPDATE',
                                     leaf_table,
-                                    ut_name) + '\n')
+                                    ut_name,
+                                    by_statement and 'NEW TABLE AS pgd_new'
+                                    ) + '\n')
         return output
 
     def make_view_delete_statements(self, model, leaf, style, columns):
         output = []
         leaf_table = leaf._meta.concrete_table_name
+        base_table = model._meta.db_table
+        pk_column = model._meta.pk.column
         qn = self.connection.ops.quote_name
-        # update trigger
+        by_statement = leaf._meta.get_view_maintenance() == 'statement'
+        # delete trigger
         dt_name = leaf_table + '_dt'
         dt_body = style.SQL_KEYWORD('DELETE FROM') + ' '
-        dt_body += style.SQL_TABLE(qn(model._meta.db_table)) + '\n'
-        dt_body += '\n    ' + style.SQL_KEYWORD('WHERE') + ' '
-        dt_body += style.SQL_FIELD(qn(model._meta.pk.column)) + ' '
-        dt_body += style.SQL_KEYWORD('=') + ' old.'
-        dt_body += style.SQL_FIELD(qn(model._meta.pk.column)) + ';\n'
+        dt_body += style.SQL_TABLE(qn(base_table)) + '\n'
+        if by_statement:
+            dt_body += '\n    ' + style.SQL_KEYWORD('USING') + ' pgd_old'
+            dt_body += '\n    ' + style.SQL_KEYWORD('WHERE') + ' '
+            dt_body += style.SQL_TABLE(qn(base_table)) + '.'
+            dt_body += style.SQL_FIELD(qn(pk_column)) + ' '
+            dt_body += style.SQL_KEYWORD('=') + ' pgd_old.'
+        else:
+            dt_body += '\n    ' + style.SQL_KEYWORD('WHERE') + ' '
+            dt_body += style.SQL_FIELD(qn(pk_column)) + ' '
+            dt_body += style.SQL_KEYWORD('=') + ' old.'
+        dt_body += style.SQL_FIELD(qn(pk_column)) + ';\n'
         dt_body += style.SQL_KEYWORD('RETURN NULL') + ';'
 
         output.append(self.make_proc_statement(style,
@@ -487,24 +657,33 @@ class DatabaseCreation(_DatabaseCreation):
                                     dt_name,
                                     'AFTER DELETE',
                                     leaf_table,
-                                    dt_name) + '\n')
+                                    dt_name,
+                                    by_statement and 'OLD TABLE AS pgd_old'
+                                    ) + '\n')
         return output
 
     def make_view_insert_statements(self, model, leaf, style, columns):
         output = []
         leaf_table = leaf._meta.concrete_table_name
         qn = self.connection.ops.quote_name
-        # update trigger
+        by_statement = leaf._meta.get_view_maintenance() == 'statement'
+        leaf_columns = [style.SQL_FIELD(qn(name))
+                        for value, name, _ in columns[leaf] if value is not None]
+        # insert trigger
         it_name = leaf_table + '_it'
         it_body = style.SQL_KEYWORD('INSERT INTO') + ' '
         it_body += style.SQL_TABLE(qn(model._meta.db_table)) + ' ( '
-        it_body += ', '.join([style.SQL_FIELD(qn(name)
-            ) for value, name , _ in columns[leaf] if value is not None])
+        it_body += ', '.join(leaf_columns)
         it_body += ', ' + style.SQL_FIELD('"pgd_child_type"') + ')\n    '
-        it_body += style.SQL_KEYWORD('VALUES') + ' ( NEW.'
-        it_body += ', NEW.'.join([style.SQL_FIELD(qn(name)
-            ) for value, name, _ in columns[leaf] if value is not None])
-        it_body += ', %s );\n' % leaf._meta.leaf_id
+        if by_statement:
+            it_body += style.SQL_KEYWORD('SELECT') + ' '
+            it_body += ', '.join(leaf_columns)
+            it_body += ', %s\n    ' % leaf._meta.leaf_id
+            it_body += style.SQL_KEYWORD('FROM') + ' pgd_new;\n'
+        else:
+            it_body += style.SQL_KEYWORD('VALUES') + ' ( NEW.'
+            it_body += ', NEW.'.join(leaf_columns)
+            it_body += ', %s );\n' % leaf._meta.leaf_id
         it_body += style.SQL_KEYWORD('RETURN NULL') + ';'
 
         output.append(self.make_proc_statement(style,
@@ -517,22 +696,33 @@ class DatabaseCreation(_DatabaseCreation):
                                     it_name,
                                     'AFTER INSERT',
                                     leaf_table,
-                                    it_name) + '\n')
+                                    it_name,
+                                    by_statement and 'NEW TABLE AS pgd_new'
+                                    ) + '\n')
         return output
 
-    def make_create_trigger_statement(self, style, name, event, table, proc):
+    def make_create_trigger_statement(self, style, name, event, table, proc,
+                                      referencing=None):
+        """Format a CREATE TRIGGER statement. Triggers are fired for each
+        row, unless `referencing` names a transition table (e.g.
+        'NEW TABLE AS pgd_new'), in which case they are fired once per
+        statement"""
         qn = self.connection.ops.quote_name
         ut = style.SQL_KEYWORD('CREATE TRIGGER') + ' '
         ut += style.SQL_TABLE(qn(name)) + ' '
         ut += style.SQL_KEYWORD('%s ON' % event) + ' '
         ut += style.SQL_TABLE(qn(table)) + '\n'
-        ut += style.SQL_KEYWORD('FOR EACH ROW EXECUTE PROCEDURE')
+        if referencing:
+            ut += style.SQL_KEYWORD('REFERENCING') + ' ' + referencing + '\n'
+            ut += style.SQL_KEYWORD('FOR EACH STATEMENT EXECUTE PROCEDURE')
+        else:
+            ut += style.SQL_KEYWORD('FOR EACH ROW EXECUTE PROCEDURE')
         ut += ' ' + style.SQL_TABLE(qn(proc)) + ' ()\n;'
 
         return ut
 
     def make_proc_statement(self, style, name='', returns='', body='', args='',
-                            language='PLPGSQL'):
+                            language='plpgsql'):
         """Format a sql procedure according to style"""
         qn = self.connection.ops.quote_name
         statement = style.SQL_KEYWORD('CREATE OR REPLACE FUNCTION') + ' '
@@ -0,0 +1,194 @@
+"""
+Deferred maintenance of materialized view bases.
+
+Leaves using ``Meta.view_maintenance = 'deferred'`` do not write to their
+materialized view base table. Their triggers only queue the primary keys of
+the written rows in a change-log table (see
+DatabaseCreation.make_view_queue_statements). The functions here apply the
+queued changes in batches, either on demand (the ``refreshviews`` management
+command) or from a background thread (ViewMaintenanceWorker).
+
+Until the queue is applied, reads on the base table may be stale. Bases state
+how stale they may be with ``Meta.max_staleness`` (in seconds); the worker
+polls the queues often enough to honour it.
+"""
+import sys
+import threading
+import zlib
+
+import psycopg2
+
+from django.db import connections, transaction, DatabaseError, DEFAULT_DB_ALIAS
+from django.db.models.loading import get_models
+from django.utils.log import getLogger
+
+logger = getLogger('django.db.backends')
+
+# how many queued changes are applied per transaction
+DEFAULT_BATCH_SIZE = 1000
+
+# the worker polling interval when no base declares a max_staleness
+DEFAULT_INTERVAL = 1.0
+
+
+def get_deferred_bases():
+    """Return the materialized view bases having at least one leaf using
+    deferred maintenance"""
+    return [model for model in get_models()
+            if model._meta.materialized_view and
+            [leaf for leaf in model._meta.leaves
+             if leaf._meta.concrete and
+             leaf._meta.get_view_maintenance() == 'deferred']]
+
+
+def lock_key(value):
+    """Return the 32-bit key of the advisory lock taken on `value` (a table
+    name or a primary key)"""
+    return zlib.crc32(unicode(value).encode('utf-8'))
+
+
+def apply_view_changes_batch(model, using=DEFAULT_DB_ALIAS,
+                             batch_size=DEFAULT_BATCH_SIZE):
+    """Apply at most `batch_size` queued changes on the materialized view
+    base `model`, in a single transaction. Returns the number of changes
+    applied.
+
+    Changes are applied set-wise: the touched rows are removed from the base
+    table and copied again from their leaf tables, so several changes of the
+    same row cost a single write. Concurrent workers skip each other's
+    batches, and wait for each other on the rows queued in both.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    opts = model._meta
+    base_table = qn(opts.db_table)
+    pk_column = qn(opts.pk.column)
+
+    with transaction.commit_on_success(using=using):
+        cursor = connection.cursor()
+        cursor.execute(
+            'DELETE FROM %(changelog)s WHERE %(seq)s IN ('
+            'SELECT %(seq)s FROM %(changelog)s ORDER BY %(seq)s LIMIT %%s '
+            'FOR UPDATE SKIP LOCKED) RETURNING %(pk)s, %(ctype)s' % {
+                'changelog': qn(opts.view_changelog_table),
+                'seq': qn('seq'),
+                'pk': pk_column,
+                'ctype': qn('pgd_child_type')},
+            [batch_size])
+        changes = cursor.fetchall()
+        if not changes:
+            return 0
+
+        pks_by_leaf = {}
+        for pk, leaf_id in changes:
+            pks_by_leaf.setdefault(leaf_id, set()).add(pk)
+        all_pks = list(set([pk for pk, _ in changes]))
+        # the same row may be queued in the batch of another worker: its
+        # DELETE must see the row inserted by the other, so the rows are
+        # locked until the end of the transaction. The locks are taken in
+        # order, so that the workers don't deadlock.
+        cursor.execute(
+            'SELECT pg_advisory_xact_lock(%s, key) FROM unnest(%s) AS key',
+            [lock_key(opts.db_table), sorted(set(map(lock_key, all_pks)))])
+        cursor.execute('DELETE FROM %s WHERE %s = ANY(%%s)' % (
+            base_table, pk_column), [all_pks])
+
+        columns = connection.creation.get_columns_for_mat_view(model)
+        for leaf_id, pks in pks_by_leaf.iteritems():
+            leaf = opts.leaf_ids.get(leaf_id)
+            if leaf is None:
+                # the leaf has been removed since the change was queued
+                continue
+            names = ', '.join([qn(name)
+                               for value, name, _ in columns[leaf]
+                               if value is not None])
+            cursor.execute(
+                'INSERT INTO %s ( %s, %s ) SELECT %s, %s FROM %s '
+                'WHERE %s = ANY(%%s)' % (
+                    base_table, names, qn('pgd_child_type'), names, leaf_id,
+                    qn(leaf._meta.concrete_table_name), pk_column),
+                [list(pks)])
+    return len(changes)
+
+
+def apply_view_changes(model, using=DEFAULT_DB_ALIAS,
+                       batch_size=DEFAULT_BATCH_SIZE):
+    """Apply all the changes queued on the materialized view base `model`.
+    Returns the number of changes applied."""
+    applied = 0
+    while True:
+        count = apply_view_changes_batch(model, using, batch_size)
+        if not count:
+            return applied
+        applied += count
+
+
+def get_view_staleness(model, using=DEFAULT_DB_ALIAS):
+    """Return the age, in seconds, of the oldest change still queued on the
+    materialized view base `model` (0 if the base table is up to date)"""
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    cursor = connection.cursor()
+    cursor.execute(
+        'SELECT EXTRACT(EPOCH FROM now() - MIN(%s)) FROM %s' % (
+            qn('queued'), qn(model._meta.view_changelog_table)))
+    age = cursor.fetchone()[0]
+    transaction.commit_unless_managed(using=using)
+    return age and float(age) or 0
+
+
+class ViewMaintenanceWorker(threading.Thread):
+    """A daemon thread applying the queued changes of materialized view
+    bases in the background.
+
+    By default, every base with deferred leaves is maintained, and the queues
+    are polled every half of the smallest Meta.max_staleness.
+    """
+    def __init__(self, models=None, using=DEFAULT_DB_ALIAS, interval=None,
+                 batch_size=DEFAULT_BATCH_SIZE):
+        super(ViewMaintenanceWorker, self).__init__(
+            name='pg_django view maintenance')
+        self.daemon = True
+        self.models = models
+        self.using = using
+        self.batch_size = batch_size
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def get_interval(self, models):
+        if self.interval is not None:
+            return self.interval
+        staleness = [m._meta.max_staleness for m in models
+                     if m._meta.max_staleness]
+        if staleness:
+            return min(staleness) / 2.0
+        return DEFAULT_INTERVAL
+
+    def run(self):
+        models = self.models or get_deferred_bases()
+        interval = self.get_interval(models)
+        try:
+            while not self._stopped.is_set():
+                for model in models:
+                    self.apply_view_changes(model)
+                self._stopped.wait(interval)
+        finally:
+            connections[self.using].close()
+
+    def apply_view_changes(self, model):
+        """Apply the changes queued on `model`. The database errors are
+        logged, and the connection closed so that the next run reconnects."""
+        connection = connections[self.using]
+        try:
+            apply_view_changes(model, self.using, self.batch_size)
+        except (DatabaseError, psycopg2.Error):
+            logger.error('Failed to apply the changes queued on %s',
+                         model._meta.db_table, exc_info=sys.exc_info())
+            try:
+                connection.rollback()
+            except (DatabaseError, psycopg2.Error):
+                pass
+            connection.close()
+
+    def stop(self):
+        self._stopped.set()
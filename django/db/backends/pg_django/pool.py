@@ -0,0 +1,130 @@
+"""
+In-process pool of persistent connections.
+
+When the ``max_age`` key of the OPTIONS of a database is set, closing a
+connection (as done at the end of each request) returns it to a pool shared by
+the threads of the process instead of closing it, and the next connection
+needed is taken from the pool. The connections are reused for at most
+``max_age`` seconds (forever if it is None), and at most ``pool_size`` idle
+connections are kept.
+
+The session of a connection taken from the pool is reset, which also checks
+that the connection is still usable.
+"""
+import threading
+import time
+
+import psycopg2.extensions
+
+# how many idle connections are kept by default
+DEFAULT_POOL_SIZE = 10
+
+# the pools, by connection parameters
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, size, max_age):
+    """Return the pool of the connections made with the parameters `key`"""
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(size, max_age)
+        return pool
+
+
+def clear_pools():
+    """Close the idle connections of all the pools"""
+    with _pools_lock:
+        pools = _pools.values()
+    for pool in pools:
+        pool.clear()
+
+
+def _close(connection):
+    try:
+        connection.close()
+    except psycopg2.Error:
+        pass
+
+
+class PooledConnection(object):
+    """A connection of `pool`, and the state it carries from one user to the
+    next"""
+    def __init__(self, pool, connection, prepared_statements=None):
+        self.pool = pool
+        self.connection = connection
+        self.prepared_statements = prepared_statements
+        self.created = time.time()
+
+    def release(self):
+        """Return the connection to its pool"""
+        self.pool.put(self)
+
+
+class ConnectionPool(object):
+    """
+    A thread-safe pool of idle connections (PooledConnection instances), the
+    most recently returned ones being handed out first.
+    """
+    def __init__(self, size=DEFAULT_POOL_SIZE, max_age=None):
+        self.size = size
+        self.max_age = max_age
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._idle)
+
+    def expired(self, pooled):
+        return (self.max_age is not None and
+                time.time() - pooled.created >= self.max_age)
+
+    def get(self, reset):
+        """
+        Return an idle connection, None if there is none. The connection is
+        passed to `reset`, and discarded when that fails.
+        """
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                pooled = self._idle.pop()
+            if pooled.connection.closed or self.expired(pooled):
+                _close(pooled.connection)
+                continue
+            try:
+                reset(pooled.connection)
+            except psycopg2.Error:
+                # the server closed the connection
+                _close(pooled.connection)
+                continue
+            return pooled
+
+    def put(self, pooled):
+        """Return a connection to the pool, rolling back its current
+        transaction. The connection is closed if it has expired or the pool
+        is full."""
+        connection = pooled.connection
+        if connection.closed:
+            return
+        if (connection.get_transaction_status() !=
+                psycopg2.extensions.TRANSACTION_STATUS_IDLE):
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                _close(connection)
+                return
+        if not self.expired(pooled):
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append(pooled)
+                    return
+        _close(connection)
+
+    def clear(self):
+        """Close all the idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            _close(pooled.connection)
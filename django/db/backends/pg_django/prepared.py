@@ -0,0 +1,218 @@
+"""
+Automatic server-side prepared statements.
+
+When the ``prepare_threshold`` key of the OPTIONS of a database is set, the
+statements executed that many times on a connection are prepared (``PREPARE``)
+and then run with ``EXECUTE``, which saves the server from parsing and
+planning them again. At most ``max_prepared_statements`` statements are kept
+prepared on each connection, the least recently used ones are deallocated.
+
+Prepared statements may not survive a change of the schema of the tables
+they use, so they are all deallocated after the DDL statements run through the
+connection, and after an EXECUTE failing because the result type of its plan
+changed. The deallocation waits for the end of a failed transaction, and is not
+done right before the statements ending a transaction or a savepoint.
+"""
+import datetime
+import decimal
+import itertools
+import math
+import re
+
+# how many statements are kept prepared by default
+DEFAULT_MAX_PREPARED_STATEMENTS = 100
+
+# the statements which can be prepared
+_preparable_re = re.compile(r'\s*(SELECT|INSERT|UPDATE|DELETE|WITH|VALUES)\b',
+                            re.IGNORECASE)
+
+# the statements which may invalidate the prepared statements
+_ddl_re = re.compile(r'\s*(CREATE|ALTER|DROP)\b', re.IGNORECASE)
+
+# the statements ending a transaction or a savepoint
+_transaction_control_re = re.compile(
+    r'\s*(COMMIT|END|ROLLBACK|ABORT|RELEASE)\b', re.IGNORECASE)
+
+# the SQLSTATE of the "cached plan must not change result type" error
+PLAN_INVALIDATED = '0A000'
+
+# the psycopg2 placeholders and escaped percent signs
+_placeholder_re = re.compile(r'%[%s]')
+
+# numbers the prepared statements, which need a name
+_statement_numbers = itertools.count(1)
+
+
+def _int_type(value):
+    if -2 ** 31 <= value < 2 ** 31:
+        return 'integer'
+    if -2 ** 63 <= value < 2 ** 63:
+        return 'bigint'
+    return 'numeric'
+
+
+def param_type(value):
+    """
+    Return the type of the parameter `value` as seen by the server when
+    psycopg2 interpolates it in the SQL ('unknown' for the quoted strings
+    typed from their context), None when the statement should not be
+    prepared for such a value.
+    """
+    if value is None or isinstance(value, basestring):
+        return 'unknown'
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, (int, long)):
+        return _int_type(value)
+    if isinstance(value, float):
+        if math.isinf(value) or math.isnan(value):
+            return 'double precision'
+        return 'numeric'
+    if isinstance(value, decimal.Decimal):
+        return 'numeric'
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            return 'timestamp'
+        return 'timestamptz'
+    if isinstance(value, datetime.date):
+        return 'date'
+    if isinstance(value, datetime.time):
+        if value.tzinfo is None:
+            return 'time'
+        return 'timetz'
+    if isinstance(value, datetime.timedelta):
+        return 'interval'
+    if isinstance(value, buffer):
+        return 'bytea'
+    if isinstance(value, list):
+        # the type of an array is the one of its elements
+        types = set([param_type(item) for item in value if item is not None])
+        if not types:
+            # psycopg2 sends the empty arrays as quoted strings
+            return 'unknown'
+        if types <= set(['unknown', 'text[]']):
+            # unlike the quoted strings, arrays of strings are text arrays
+            return 'text[]'
+        if len(types) == 1:
+            item_type = types.pop()
+            if item_type is None or item_type.endswith('[]'):
+                return item_type
+            return item_type + '[]'
+        if types <= set(['integer', 'bigint']):
+            return 'bigint[]'
+        if types <= set(['integer', 'bigint', 'numeric']):
+            return 'numeric[]'
+    return None
+
+
+def is_ddl(sql):
+    """Return whether `sql` may change the schema"""
+    return _ddl_re.match(sql) is not None
+
+
+def is_transaction_control(sql):
+    """Return whether `sql` ends a transaction or a savepoint"""
+    return _transaction_control_re.match(sql) is not None
+
+
+def to_server_placeholders(sql):
+    """Return `sql` with its psycopg2 placeholders replaced by the numbered
+    placeholders of PREPARE, and the number of placeholders"""
+    numbers = itertools.count(1)
+    count = [0]
+
+    def replace(match):
+        if match.group() == '%%':
+            return '%'
+        count[0] = numbers.next()
+        return '$%d' % count[0]
+    return _placeholder_re.sub(replace, sql), count[0]
+
+
+class PreparedStatements(object):
+    """
+    The statements prepared on a connection, by SQL and types of their
+    parameters, and the number of executions of the statements not prepared
+    yet.
+    """
+    def __init__(self, threshold, size=DEFAULT_MAX_PREPARED_STATEMENTS):
+        self.threshold = threshold
+        self.size = size
+        self.clear()
+
+    def clear(self):
+        """Forget all the statements, as done when the connection is opened
+        or after a DEALLOCATE ALL"""
+        # [name, last use] by SQL and types of the parameters
+        self.statements = {}
+        self.executions = {}
+        self.unpreparable = set()
+        self.uses = itertools.count()
+        # set when the prepared statements may not be valid anymore
+        self.stale = False
+
+    def __len__(self):
+        return len(self.statements)
+
+    def get(self, sql, args):
+        """
+        Return the name of the statement prepared for `sql` and the types of
+        `args`, None if it is not prepared. The second item of the result is
+        the list of the statements preparing it when it must be prepared
+        first.
+        """
+        if args is None:
+            types = ()
+        elif isinstance(args, (list, tuple)):
+            types = tuple([param_type(arg) for arg in args])
+            if None in types:
+                return None, None
+        else:
+            return None, None
+        key = (sql, types)
+        statement = self.statements.get(key)
+        if statement is not None:
+            statement[1] = self.uses.next()
+            return statement[0], None
+        if key in self.unpreparable or _preparable_re.match(sql) is None:
+            return None, None
+        executions = self.executions.get(key, 0) + 1
+        if executions < self.threshold:
+            if len(self.executions) >= self.size * 10:
+                # only count the executions of the recent statements
+                self.executions.clear()
+            self.executions[key] = executions
+            return None, None
+        self.executions.pop(key, None)
+        if args is None:
+            # psycopg2 leaves the SQL alone when there are no parameters
+            server_sql = sql
+        else:
+            server_sql, count = to_server_placeholders(sql)
+            if count != len(args):
+                self.set_unpreparable(key)
+                return None, None
+        name = '_django_prepared_%d' % _statement_numbers.next()
+        if types:
+            name_and_types = '%s (%s)' % (name, ', '.join(types))
+        else:
+            name_and_types = name
+        prepare = ['PREPARE %s AS %s' % (name_and_types, server_sql)]
+        if len(self.statements) >= self.size:
+            oldest = min(self.statements, key=lambda k: self.statements[k][1])
+            prepare.insert(0, 'DEALLOCATE %s' % self.statements.pop(oldest)[0])
+        self.statements[key] = [name, self.uses.next()]
+        return name, prepare
+
+    def failed(self, name):
+        """Mark the statement `name` as not preparable after its PREPARE
+        failed"""
+        for key, statement in self.statements.items():
+            if statement[0] == name:
+                del self.statements[key]
+                self.set_unpreparable(key)
+
+    def set_unpreparable(self, key):
+        if len(self.unpreparable) >= self.size * 10:
+            self.unpreparable.clear()
+        self.unpreparable.add(key)
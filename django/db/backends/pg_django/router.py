@@ -0,0 +1,157 @@
+"""
+Routing of the reads to the read replicas of a database.
+
+ReplicaRouter sends the reads of the models of a database to its replicas
+(settings.DATABASE_REPLICAS), and the writes to the database itself, the
+primary. After a write, the reads of the same thread also go to the primary
+until the end of the request, so that they see what was written.
+
+The replication lag of the replicas is checked with
+pg_last_xact_replay_timestamp() and cached for
+settings.REPLICA_LAG_CACHE_TIMEOUT seconds. The replicas lagging more than
+settings.REPLICA_MAX_LAG seconds, or which can't be reached, are not used
+until their next check.
+"""
+import random
+import threading
+import time
+
+import psycopg2
+
+from django.conf import settings
+from django.core import signals
+from django.db import connections, DatabaseError, DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter(object):
+    """
+    A database router sending the reads to the replicas lagging at most
+    `max_lag` seconds behind their primary. `replicas` maps the aliases of
+    the primaries to the lists of the aliases of their replicas. The
+    arguments default to the corresponding settings.
+    """
+    def __init__(self, replicas=None, max_lag=None, cache_timeout=None):
+        if replicas is None:
+            replicas = settings.DATABASE_REPLICAS
+        if max_lag is None:
+            max_lag = settings.REPLICA_MAX_LAG
+        if cache_timeout is None:
+            cache_timeout = settings.REPLICA_LAG_CACHE_TIMEOUT
+        self.replicas = dict([(primary, list(aliases))
+                              for primary, aliases in replicas.items()])
+        self.primaries = {}
+        for primary, aliases in self.replicas.items():
+            self.primaries[primary] = primary
+            for alias in aliases:
+                self.primaries[alias] = primary
+        self.max_lag = max_lag
+        self.cache_timeout = cache_timeout
+        # (lag, time of the check) by replica
+        self._lags = {}
+        self._lock = threading.Lock()
+        # the primaries written to by the thread
+        self._local = threading.local()
+        signals.request_started.connect(self.unpin)
+        signals.request_finished.connect(self.unpin)
+
+    def _pinned(self):
+        pinned = getattr(self._local, 'pinned', None)
+        if pinned is None:
+            pinned = self._local.pinned = set()
+        return pinned
+
+    def pin(self, primary=DEFAULT_DB_ALIAS):
+        """Send the reads of the current thread to `primary` rather than to
+        its replicas, until unpin() is called or the request ends"""
+        self._pinned().add(primary)
+
+    def unpin(self, **kwargs):
+        """Let the reads of the current thread go to the replicas again"""
+        self._pinned().clear()
+
+    def is_pinned(self, primary=DEFAULT_DB_ALIAS):
+        return primary in self._pinned()
+
+    def replication_lag(self, alias):
+        """
+        Return how many seconds the replica `alias` lags behind its primary,
+        None if it can't be reached or hasn't replayed anything. The result
+        is cached for `cache_timeout` seconds.
+        """
+        now = time.time()
+        with self._lock:
+            cached = self._lags.get(alias)
+        if cached is not None and now - cached[1] < self.cache_timeout:
+            return cached[0]
+        lag = self._check_lag(alias)
+        with self._lock:
+            self._lags[alias] = (lag, now)
+        return lag
+
+    def _check_lag(self, alias):
+        connection = connections[alias]
+        connected = connection.connection is not None
+        try:
+            cursor = connection.cursor()
+            cursor.execute(connection.ops.replication_lag_sql())
+            lag = cursor.fetchone()[0]
+        except (DatabaseError, psycopg2.Error):
+            # psycopg2 errors are not wrapped when connecting
+            try:
+                if connected:
+                    connection._rollback()
+                else:
+                    # don't keep a connection which failed to be set up
+                    connection.close()
+            except (DatabaseError, psycopg2.Error):
+                connection.connection = None
+            return None
+        if lag is None:
+            return None
+        return float(lag)
+
+    def usable_replicas(self, primary):
+        """Return the aliases of the replicas of `primary` lagging at most
+        `max_lag` seconds"""
+        usable = []
+        for alias in self.replicas.get(primary, ()):
+            lag = self.replication_lag(alias)
+            if lag is not None and lag <= self.max_lag:
+                usable.append(alias)
+        return usable
+
+    def _primary(self, hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return self.primaries.get(instance._state.db)
+        if DEFAULT_DB_ALIAS in self.replicas:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def db_for_read(self, model, **hints):
+        primary = self._primary(hints)
+        if primary is None or self.is_pinned(primary):
+            return primary
+        usable = self.usable_replicas(primary)
+        if not usable:
+            return primary
+        return random.choice(usable)
+
+    def db_for_write(self, model, **hints):
+        primary = self._primary(hints)
+        if primary is not None:
+            self.pin(primary)
+        return primary
+
+    def allow_relation(self, obj1, obj2, **hints):
+        primary = self.primaries.get(obj1._state.db)
+        if primary is not None and (
+                primary == self.primaries.get(obj2._state.db)):
+            return True
+        return None
+
+    def allow_syncdb(self, db, model):
+        if self.primaries.get(db, db) != db:
+            # the replicas get their tables from their primary
+            return False
+        return None
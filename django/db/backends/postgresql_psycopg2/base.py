@@ -102,6 +102,8 @@ class DatabaseWrapper(BaseDatabaseWrapper):
         'istartswith': 'LIKE UPPER(%s)',
         'iendswith': 'LIKE UPPER(%s)',
     }
+    # the keys of OPTIONS which are not connection parameters
+    django_options = ('autocommit',)
 
     def __init__(self, *args, **kwargs):
         super(DatabaseWrapper, self).__init__(*args, **kwargs)
@@ -164,8 +166,8 @@ class DatabaseWrapper(BaseDatabaseWrapper):
                 'database': settings_dict['NAME'],
             }
             conn_params.update(settings_dict['OPTIONS'])
-            if 'autocommit' in conn_params:
-                del conn_params['autocommit']
+            for option in self.django_options:
+                conn_params.pop(option, None)
             if settings_dict['USER']:
                 conn_params['user'] = settings_dict['USER']
             if settings_dict['PASSWORD']:
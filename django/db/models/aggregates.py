@@ -65,3 +65,14 @@ class Sum(Aggregate):
 
 class Variance(Aggregate):
     name = 'Variance'
+
+# pg-django only
+
+class ArrayAgg(Aggregate):
+    name = 'ArrayAgg'
+
+class ArrayLength(Aggregate):
+    name = 'ArrayLength'
+
+class Unnest(Aggregate):
+    name = 'Unnest'
@@ -309,8 +309,7 @@ class ModelBase(type):
                 if len(kwargs) and klass._meta.concrete:
                     # probably a user instanciation
                     return Model.__new__(klass, *args, **kwargs)
-                parent_fnames = [f.column for f in klass._meta.fields]
-                idx = parent_fnames.index('pgd_child_type')
+                idx = klass._meta.get_child_type_index()
                 if len(args) <= idx and 'pgd_child_type' not in kwargs:
                     # I wouldn't do that if I were you. Seems like a smart (or
                     # crazy) user is trying to do something clever (or foolish)
@@ -320,17 +319,11 @@ class ModelBase(type):
                 # Here is the magic: if you try to instanciate a m10d view
                 # you get its subbclass corresponding to its pgd_child_type
                 # That how mixed queryset work.
-                # pgd_child_type should be the last field. Just to be sure
-                leaf = klass._meta.leaf_ids.get(args[idx],None)
-                # TODO PG: add an exception here if None
+                # The column to argument mapping is computed once per leaf.
+                leaf, get_args = klass._meta.get_leaf_loader(args[idx])
 
                 # hook the __init__ arguments
-                leaf_fnames = [f.name for f in leaf._meta.fields]
-                leaf_args = [None]*len(leaf_fnames)
-                for i in range(len(parent_fnames)):
-                    fname = parent_fnames[i]
-                    if fname in leaf_fnames:
-                        leaf_args[leaf_fnames.index(fname)] = args[i]
+                leaf_args = get_args(args)
                 inst = Model.__new__(leaf,*leaf_args,**kwargs)
                 # The modified arg list is stored on the instance itself.
                 # A hook in __init__ will send it to the original __init__
@@ -414,6 +407,81 @@ class ModelState(object):
         # This impacts validation only; it has no effect on the actual save.
         self.adding = True
 
+
+def _is_data_descriptor(cls, name):
+    for klass in cls.__mro__:
+        if name in klass.__dict__:
+            return hasattr(klass.__dict__[name], '__set__')
+    return False
+
+
+def _make_loader(cls, field_names):
+    """
+    Returns the function instantiating `cls` from a database alias and the
+    values of the fields whose attnames are `field_names`, or of the first
+    fields of the model when `field_names` is None (see Model.from_db()).
+    """
+    opts = cls._meta
+    positional = field_names is None
+    if positional:
+        field_names = tuple([f.attname for f in opts.fields])
+    pre_init, post_init = signals.pre_init, signals.post_init
+
+    if (cls.__init__.im_func is not Model.__init__.im_func or
+            cls.__setattr__ is not object.__setattr__ or
+            opts.materialized_view or opts.intermediate):
+        # __init__ or __setattr__ is overridden, or the class of the instances
+        # depends on the values (see ModelBase.__new__): the instances are
+        # created the usual way
+        def load(db, values):
+            if positional:
+                obj = cls(*values)
+            else:
+                obj = cls(**dict(izip(field_names, values)))
+            obj._state.db = db
+            obj._state.adding = False
+            return obj
+        return load
+
+    # the fields whose class attribute is a descriptor are set with setattr,
+    # the others directly in the __dict__ of the instances
+    descriptors = [(i, name) for i, name in enumerate(field_names)
+                   if _is_data_descriptor(cls, name)]
+    loaded = set(field_names)
+    # the fields neither loaded nor deferred are set to their default value
+    defaults = [f for f in opts.fields if f.attname not in loaded and not
+                isinstance(cls.__dict__.get(f.attname), DeferredAttribute)]
+    count = len(field_names)
+    new = object.__new__
+
+    def load(db, values):
+        if positional and len(values) != count:
+            # like __init__, leave the missing fields to their default
+            if len(values) > count:
+                raise IndexError("Number of args exceeds number of fields")
+            obj = cls(*values)
+            obj._state.db = db
+            obj._state.adding = False
+            return obj
+        if pre_init.has_listeners(cls):
+            if positional:
+                pre_init.send(sender=cls, args=values, kwargs={})
+            else:
+                pre_init.send(sender=cls, args=(),
+                              kwargs=dict(izip(field_names, values)))
+        obj = new(cls)
+        state = obj._state = ModelState(db)
+        state.adding = False
+        obj.__dict__.update(izip(field_names, values))
+        for i, name in descriptors:
+            setattr(obj, name, values[i])
+        for field in defaults:
+            setattr(obj, field.attname, field.get_default())
+        if post_init.has_listeners(cls):
+            post_init.send(sender=cls, instance=obj)
+        return obj
+    return load
+
 class Model(object):
     __metaclass__ = ModelBase
     _deferred = False
@@ -424,7 +492,9 @@ class Model(object):
         if hasattr(self,'__hooked_args__'):
             args = self.__hooked_args__
 
-        signals.pre_init.send(sender=self.__class__, args=args, kwargs=kwargs)
+        if signals.pre_init.has_listeners(self.__class__):
+            signals.pre_init.send(sender=self.__class__, args=args,
+                                  kwargs=kwargs)
 
         # Set up the storage for instance state
         self._state = ModelState()
@@ -514,7 +584,38 @@ class Model(object):
             if kwargs:
                 raise TypeError("'%s' is an invalid keyword argument for this function" % kwargs.keys()[0])
         super(Model, self).__init__()
-        signals.post_init.send(sender=self.__class__, instance=self)
+        if signals.post_init.has_listeners(self.__class__):
+            signals.post_init.send(sender=self.__class__, instance=self)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Returns an instance of the model loaded from the database `db`, whose
+        fields with the attnames `field_names` have the `values`. When
+        `field_names` is None, `values` are the values of the fields of the
+        model, in order.
+
+        Unlike instantiating the model, this fills the attributes of the
+        instance directly rather than calling __init__, and only sends the
+        pre_init and post_init signals when they have receivers.
+        """
+        return cls.get_loader(field_names)(db, values)
+
+    @classmethod
+    def get_loader(cls, field_names=None):
+        """
+        Returns the function called by from_db() to load instances with the
+        fields `field_names`, which takes the database alias and the values
+        of the fields. It is built once per model and field names.
+        """
+        if field_names is not None:
+            field_names = tuple(field_names)
+        loaders = cls._meta._loaders
+        try:
+            return loaders[field_names]
+        except KeyError:
+            loader = loaders[field_names] = _make_loader(cls, field_names)
+            return loader
 
     def __repr__(self):
         try:
@@ -637,7 +738,8 @@ class Model(object):
         else:
             meta = cls._meta
 
-        if origin and not meta.auto_created:
+        if (origin and not meta.auto_created and
+                signals.pre_save.has_listeners(origin)):
             signals.pre_save.send(sender=origin, instance=self, raw=raw, using=using)
 
         # If we are in a raw save, save the object exactly as presented.
@@ -715,7 +817,8 @@ class Model(object):
         self._state.adding = False
 
         # Signal that the save is complete
-        if origin and not meta.auto_created:
+        if (origin and not meta.auto_created and
+                signals.post_save.has_listeners(origin)):
             signals.post_save.send(sender=origin, instance=self,
                 created=(not record_exists), raw=raw, using=using)
 
@@ -1,6 +1,7 @@
 from functools import wraps
 from operator import attrgetter
 
+from django.conf import settings
 from django.db import connections, transaction, IntegrityError
 from django.db.models import signals, sql
 from django.utils.datastructures import SortedDict
@@ -49,6 +50,14 @@ def DO_NOTHING(collector, field, sub_objs, using):
     pass
 
 
+def _is_plain_table(opts):
+    """Return whether the rows of the model are stored in a table of its own,
+    with the foreign key constraints created by Django"""
+    return (opts.managed and not opts.proxy and not opts.db_view and
+            not opts.materialized_view and not opts.intermediate and
+            not opts.leaf)
+
+
 def force_managed(func):
     @wraps(func)
     def decorated(self, *args, **kwargs):
@@ -70,12 +79,21 @@ def force_managed(func):
 
 
 class Collector(object):
+    # whether the cascades done by the database can be left to it (see
+    # uses_db_cascade())
+    use_db_cascade = True
+
     def __init__(self, using):
         self.using = using
         # Initially, {model: set([instances])}, later values become lists.
         self.data = {}
         self.batches = {} # {model: {field: set([instances])}}
         self.field_updates = {} # {model: {(field, value): set([instances])}}
+        # QuerySets deleted with a single query, without being collected
+        self.fast_deletes = []
+        # whether the database can delete the rows of a model, by model (see
+        # can_db_delete())
+        self._db_deletable = {}
 
         # Tracks deletion-order dependency for databases without transactions
         # or ability to defer constraint checks. Only concrete model classes
@@ -130,6 +148,69 @@ class Collector(object):
             model, {}).setdefault(
             (field, value), set()).update(objs)
 
+    def uses_db_cascade(self):
+        """Return whether the foreign keys using on_delete=CASCADE cascade the
+        deletions in the database (see settings.DB_CASCADE)"""
+        return (self.use_db_cascade and settings.DB_CASCADE and
+                connections[self.using].features.supports_db_cascade)
+
+    def can_db_delete(self, model):
+        """
+        Return whether the database can delete the rows of ``model`` and
+        everything their deletion cascades to on its own, without loading
+        them: the cascades are all done by the foreign keys, and no delete
+        signal receivers are connected for the models involved.
+        """
+        if not self.uses_db_cascade():
+            return False
+        if model not in self._db_deletable:
+            self._db_deletable[model] = self._can_db_delete(model, set())
+        return self._db_deletable[model]
+
+    def _can_db_delete(self, model, seen):
+        opts = model._meta
+        if not _is_plain_table(opts) or opts.parents:
+            return False
+        if not opts.auto_created and (
+                signals.pre_delete.has_listeners(model) or
+                signals.post_delete.has_listeners(model)):
+            return False
+        for relation in opts.many_to_many:
+            if not relation.rel.through:
+                # generic relations are not foreign keys
+                return False
+        seen.add(model)
+        for related in opts.get_all_related_objects(
+                include_hidden=True, include_proxy_eq=True):
+            if not self._is_db_cascade(related):
+                return False
+            if (related.model not in seen and
+                    not self._can_db_delete(related.model, seen)):
+                return False
+        return True
+
+    def _is_db_cascade(self, related):
+        field = related.field
+        return (field.rel.on_delete is CASCADE and
+                _is_plain_table(related.model._meta) and
+                _is_plain_table(field.rel.to._meta))
+
+    def can_db_cascade(self, related):
+        """
+        Return whether the database deletes on its own the objects related
+        through ``related`` to the objects deleted, and everything their
+        deletion cascades to.
+        """
+        return (self.uses_db_cascade() and self._is_db_cascade(related) and
+                self.can_db_delete(related.model))
+
+    def can_fast_delete(self, objs):
+        """
+        Return whether ``objs`` can be deleted with a single query, leaving the
+        cascades to the database (see can_db_delete()).
+        """
+        return hasattr(objs, '_raw_delete') and self.can_db_delete(objs.model)
+
     def collect(self, objs, source=None, nullable=False, collect_related=True,
         source_attr=None, reverse_dependency=False):
         """
@@ -146,7 +227,14 @@ class Collector(object):
         current model, rather than after. (Needed for cascading to parent
         models, the one case in which the cascade follows the forwards
         direction of an FK rather than the reverse direction.)
+
+        A QuerySet whose deletion the database can cascade on its own (see
+        can_fast_delete()) is not collected but deleted with a single query.
         """
+        if collect_related and self.can_fast_delete(objs):
+            self.fast_deletes.append(objs)
+            return
+
         new_objs = self.add(objs, source, nullable,
                             reverse_dependency=reverse_dependency)
         if not new_objs:
@@ -167,6 +255,9 @@ class Collector(object):
         if collect_related:
             for related in model._meta.get_all_related_objects(
                     include_hidden=True, include_proxy_eq=True):
+                if self.can_db_cascade(related):
+                    # deleted by the database with new_objs
+                    continue
                 field = related.field
                 if related.model._meta.auto_created:
                     self.add_batch(related.model, field, new_objs)
@@ -197,8 +288,16 @@ class Collector(object):
             **{"%s__in" % related.field.name: objs}
         )
 
-    def instances_with_model(self):
+    def instances_with_model(self, signal=None):
+        """
+        Yield the collected (model, instance) pairs, only the ones of the
+        models listened to through `signal` (except the automatically created
+        ones) when it is given.
+        """
         for model, instances in self.data.iteritems():
+            if signal is not None and (model._meta.auto_created or
+                                       not signal.has_listeners(model)):
+                continue
             for obj in instances:
                 yield model, obj
 
@@ -233,11 +332,10 @@ class Collector(object):
         self.sort()
 
         # send pre_delete signals
-        for model, obj in self.instances_with_model():
-            if not model._meta.auto_created:
-                signals.pre_delete.send(
-                    sender=model, instance=obj, using=self.using
-                )
+        for model, obj in self.instances_with_model(signals.pre_delete):
+            signals.pre_delete.send(
+                sender=model, instance=obj, using=self.using
+            )
 
         # update fields
         for model, instances_for_fieldvalues in self.field_updates.iteritems():
@@ -256,6 +354,10 @@ class Collector(object):
             for field, instances in batches.iteritems():
                 query.delete_batch([obj.pk for obj in instances], self.using, field)
 
+        # fast deletes
+        for qs in self.fast_deletes:
+            qs._raw_delete(using=self.using)
+
         # delete instances
         for model, instances in self.data.iteritems():
             query = sql.DeleteQuery(model)
@@ -263,11 +365,10 @@ class Collector(object):
             query.delete_batch(pk_list, self.using)
 
         # send post_delete signals
-        for model, obj in self.instances_with_model():
-            if not model._meta.auto_created:
-                signals.post_delete.send(
-                    sender=model, instance=obj, using=self.using
-                )
+        for model, obj in self.instances_with_model(signals.post_delete):
+            signals.post_delete.send(
+                sender=model, instance=obj, using=self.using
+            )
 
         # update collected instances
         for model, instances_for_fieldvalues in self.field_updates.iteritems():
@@ -1,3 +1,4 @@
+import array
 import copy
 import datetime
 import decimal
@@ -20,6 +21,11 @@ from django.utils.encoding import smart_unicode, force_unicode, smart_str
 from django.utils.ipv6 import clean_ipv6_address
 from django.db.models.fields.subclassing import SubfieldBase
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 class NOT_PROVIDED:
     pass
 
@@ -298,8 +304,8 @@ class Field(object):
         """
         Perform preliminary non-db specific lookup checks and conversions.
 
-        Modified in pg-django to accept has, has_one and has_all arrays lookup
-        types
+        Modified in pg-django to accept has, has_one, has_all, overlap and
+        contained_by arrays lookup types
         """
         if hasattr(value, 'prepare'):
             return value.prepare()
@@ -313,7 +319,7 @@ class Field(object):
             ):
             return value
         elif lookup_type in ('exact', 'gt', 'gte', 'lt', 'lte', 'has_all',
-                            'has_one'):
+                            'has_one', 'overlap', 'contained_by'):
             return self.get_prep_value(value)
         elif lookup_type in ('range', 'in'):
             return [self.get_prep_value(v) for v in value]
@@ -331,8 +337,8 @@ class Field(object):
         """
         Returns field's value prepared for database lookup.
 
-        Modified in pg-django to accept has, has_one and has_all arrays lookup
-        types
+        Modified in pg-django to accept has, has_one, has_all, overlap and
+        contained_by arrays lookup types
         """
         if not prepared:
             value = self.get_prep_lookup(lookup_type, value)
@@ -355,7 +361,8 @@ class Field(object):
         elif lookup_type in ('exact', 'gt', 'gte', 'lt', 'lte'):
             return [self.get_db_prep_value(value, connection=connection,
                                            prepared=prepared)]
-        elif lookup_type in ('range', 'in', 'has_one', 'has_all'):
+        elif lookup_type in ('range', 'in', 'has_one', 'has_all', 'overlap',
+                             'contained_by'):
             return [self.get_db_prep_value(v, connection=connection,
                                            prepared=prepared) for v in value]
         elif lookup_type in ('contains', 'icontains'):
@@ -557,26 +564,33 @@ class AutoField(Field):
     def formfield(self, **kwargs):
         return None
 
+    def allocate_ids(self, count, using=None):
+        """
+        Reserves `count` values of the sequence of this field in the database
+        `using` and returns them, so that objects get their primary key
+        before they are inserted. Ids are reserved by blocks, see
+        DatabaseOperations.allocate_ids (only implemented by pg_django).
+        """
+        from django.db import connections, router
+        if using is None:
+            using = router.db_for_write(self.model)
+        return connections[using].ops.allocate_ids(self, count)
+
+    def allocate_id(self, using=None):
+        """Reserves a single value of the sequence of this field"""
+        return self.allocate_ids(1, using)[0]
+
 
 class SharedAutoField(AutoField):
     """A sequence shared amongst several tables"""
-    # a cache of sequences already existing in the db
-    _created = {}
 
     def exists_for_connection(self,connection):
-        uid = connection.introspection.get_unique_name()
-        if not (uid, self.sequence) in SharedAutoField._created:
-            if connection.introspection.sequence_exists(self.sequence):
-                SharedAutoField._created[(uid, self.sequence)] = True
-            else:
-                SharedAutoField._created[(uid, self.sequence)] = False
-        return SharedAutoField._created[(uid, self.sequence)]
+        return connection.introspection.sequence_exists(self.sequence)
 
     def set_exists_for_connection(self,connection):
         """set the field's db sequence as existing *without check*
         Use with caution"""
-        uid = connection.introspection.get_unique_name()
-        SharedAutoField._created[(uid, self.sequence)] = True
+        connection.introspection.set_sequence_exists(self.sequence)
 
     def __init__(self, *args, **kwargs):
         self.sequence = kwargs.pop('sequence', None)
@@ -1332,19 +1346,54 @@ class URLField(CharField):
         return super(URLField, self).formfield(**defaults)
 
 
+def _map_elements(func, values):
+    """Apply `func` to the elements of `values`, the rows of multi-dimensional
+    arrays (nested lists) included"""
+    return [_map_elements(func, v) if isinstance(v, (list, tuple)) else func(v)
+            for v in values]
+
+def _is_flat(values):
+    """Return whether `values` has neither NULL elements nor nested rows"""
+    for v in values:
+        if v is None or isinstance(v, (list, tuple)):
+            return False
+    return True
+
 class ArrayFieldBase(object):
     """Django field type for an array of values. Supported only on PostgreSQL.
 
     This class is not meant to be instantiated directly; instead, field classes
     should inherit from this class and from an appropriate Django model class.
 
-    ``itertype`` is the python iterable type of field
+    ``itertype`` is the python iterable type of field. Numeric arrays (the
+    fields having a ``typecode``) can also be decoded into ``array.array`` or
+    ``numpy.ndarray`` buffers; the values having NULL elements, or being
+    multi-dimensional (nested lists), are left as lists.
+
+    ``native_types`` are the python types psycopg2 already returns for the
+    elements of the array. When every element has one of these types, the
+    values are used as is instead of going through the scalar field's
+    conversion methods, one element at a time.
+
+    When ``adapt_elements`` is set, the elements are saved as python objects
+    (dates, decimals...) that psycopg2 adapts into a typed array, instead of
+    the strings returned by the scalar field's get_db_prep_save.
     """
 
     _south_introspects = True
 
+    typecode = None
+    native_types = ()
+    adapt_elements = False
+
     def __init__(self, *args, **kwargs):
         self.itertype = kwargs.pop('itertype', list)
+        if (self.itertype is array.array or
+                (numpy is not None and self.itertype is numpy.ndarray)):
+            if self.typecode is None:
+                raise TypeError("%s can not be decoded into %s buffers."
+                                % (self.__class__.__name__,
+                                   self.itertype.__name__))
         super(ArrayFieldBase, self).__init__(*args, **kwargs)
 
     @property
@@ -1361,40 +1410,95 @@ class ArrayFieldBase(object):
                 % self.__class__.__name__)
         return super(ArrayFieldBase, self).db_type(connection=connection) + '[]'
 
+    def has_native_elements(self, values):
+        """Return True if the elements of `values` need no conversion"""
+        if not self.native_types:
+            return False
+        return not set(map(type, values)).difference(self.native_types)
+
+    def make_iterable(self, values):
+        """Return the list `values` as an instance of self.itertype"""
+        itertype = self.itertype
+        if itertype is list:
+            return values
+        if self.typecode is not None and not _is_flat(values):
+            # a typed buffer has no room for NULL elements or nested rows
+            return values
+        if itertype is array.array:
+            return array.array(self.typecode, values)
+        if numpy is not None and itertype is numpy.ndarray:
+            return numpy.array(values, dtype=self.typecode)
+        return itertype(values)
+
     def to_python(self, value):
         # psycopg2 already supports array types, so we don't actually need to serialize
         # or deserialize
         if value is None:
             return None
-        if not isinstance(value, (list, tuple, set, self.itertype)):
+        if hasattr(value, 'tolist'):
+            if isinstance(value, self.itertype):
+                # already a typed buffer
+                return value
+            value = value.tolist()
+        elif not isinstance(value, (list, tuple, set)):
             try:
                 iter(value)
             except TypeError:
                 raise exceptions.ValidationError(
                     "An ArrayField value must be None or an iterable.")
-        return self.itertype([self.fieldtype.to_python(self.subinstance, x) for x in value])
+        if self.has_native_elements(value):
+            if type(value) is not list:
+                value = list(value)
+        else:
+            to_python = self.fieldtype.to_python
+            subinstance = self.subinstance
+            value = _map_elements(lambda x: to_python(subinstance, x), value)
+        return self.make_iterable(value)
 
     def get_prep_value(self, value):
         if value is None:
             return None
-        return [self.fieldtype.get_prep_value(self.subinstance, v) for v in value]
+        if hasattr(value, 'tolist'):
+            value = value.tolist()
+        if self.has_native_elements(value):
+            return list(value)
+        get_prep_value = self.fieldtype.get_prep_value
+        subinstance = self.subinstance
+        return _map_elements(lambda v: get_prep_value(subinstance, v), value)
+
+    def get_db_prep_elements(self, values, connection):
+        if hasattr(values, 'tolist'):
+            values = values.tolist()
+        if self.has_native_elements(values):
+            return list(values)
+        subinstance = self.subinstance
+        if self.adapt_elements:
+            get_prep_value = self.fieldtype.get_prep_value
+            return _map_elements(lambda v: get_prep_value(subinstance, v),
+                                 values)
+        get_db_prep_save = self.fieldtype.get_db_prep_save
+        return _map_elements(
+            lambda v: get_db_prep_save(subinstance, v, connection), values)
 
-    #def get_db_prep_save(self,value,connection):
-        #if isinstance(value, (list, tuple, set, self.itertype)):
-            #return 'ARRAY[%s]::%s' % (', '.join(self.fieldtype.get_db_prep_value(
-                #self.subinstance, v, connection) for v in value),
-                #self.db_type(connection))
-        #return self.fieldtype.get_db_prep_save(self.subinstance, value, connection)
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if isinstance(value, (list, tuple, set, self.itertype)):
+            return self.get_db_prep_elements(value, connection)
+        # a single element, e.g. in the has_one and has_all lookups
+        return self.fieldtype.get_db_prep_value(self.subinstance, value,
+                                                connection, prepared)
 
     def get_db_prep_save(self,value,connection):
         if isinstance(value, (list, tuple, set, self.itertype)):
-            return [self.fieldtype.get_db_prep_save(self.subinstance, v,
-                                               connection) for v in value]
+            return self.get_db_prep_elements(value, connection)
         return self.fieldtype.get_db_prep_save(self.subinstance, value, connection)
 
-
     def get_default(self):
-        return self.itertype()
+        return self.make_iterable([])
+
+    def validate(self, value, model_instance):
+        if hasattr(value, 'tolist'):
+            value = value.tolist()
+        super(ArrayFieldBase, self).validate(value, model_instance)
 
     def run_validators(self, value):
         if value is None:
@@ -1407,12 +1511,17 @@ class ArrayFieldMetaclass(SubfieldBase):
     pass
 
 
-def _array_field_factory(name, fieldtype, module=ArrayFieldBase.__module__):
-    return ArrayFieldMetaclass(name, (ArrayFieldBase, fieldtype),
-        {'__module__': module,
+def _array_field_factory(name, fieldtype, module=ArrayFieldBase.__module__,
+                         **attrs):
+    attrs.update({'__module__': module,
         'description': "An array, where each element is of the same type "\
         "as %s." % fieldtype.__name__,
         'fieldtype': fieldtype})
+    return ArrayFieldMetaclass(name, (ArrayFieldBase, fieldtype), attrs)
+
+def _cast_placeholder(self, value, connection):
+    # psycopg2 adapts lists of strings into text[] arrays
+    return '%%s::%s' % self.db_type(connection)
 
 # If you want to make an array version of a field not covered below, this is
 # the easiest way:
@@ -1420,26 +1529,62 @@ def _array_field_factory(name, fieldtype, module=ArrayFieldBase.__module__):
 # class FooArrayField(dbarray.ArrayFieldBase, FooField):
 #     __metaclass__ = dbarray.ArrayFieldMetaclass
 
+_NONE = type(None)
+_INTEGER_TYPES = (int, long, _NONE)
+_STRING_TYPES = (unicode, str, _NONE)
+_BOOLEAN_TYPES = (bool, _NONE)
 
-BooleanArrayField = _array_field_factory('BooleanArrayField', BooleanField)
-CharArrayField = _array_field_factory('CharArrayField', CharField)
-#DateArrayField = _array_field_factory('DateArrayField', DateField)
-#DateTimeArrayField = _array_field_factory('DateTimeArrayField', DateTimeField)
-#DecimalArrayField = _array_field_factory('DecimalArrayField', DecimalField)
-EmailArrayField = _array_field_factory('EmailArrayField', EmailField)
-FilePathArrayField = _array_field_factory('FilePathArrayField', FilePathField)
-FloatArrayField = _array_field_factory('FloatArrayField', FloatField)
-IntegerArrayField = _array_field_factory('IntegerArrayField', IntegerField)
-BigIntegerArrayField = _array_field_factory('BigIntegerArrayField', BigIntegerField)
-#IPAddressArrayField = _array_field_factory('IPAddressArrayField', IPAddressField)
-#GenericIPAddressArrayField = _array_field_factory('GenericIPAddressArrayField', GenericIPAddressField)
-NullBooleanArrayField = _array_field_factory('NullBooleanArrayField', NullBooleanField)
+def _int64_typecode():
+    # 'q' only exists from Python 3.3, and 'l' is 32-bit on LLP64 platforms
+    # (e.g. 64-bit Windows)
+    for typecode in ('q', 'l'):
+        try:
+            if array.array(typecode).itemsize == 8:
+                return typecode
+        except ValueError:
+            pass
+    return None
+
+# The array.array type code of the 64-bit integers, None if there is none.
+INT64_TYPECODE = _int64_typecode()
+
+BooleanArrayField = _array_field_factory('BooleanArrayField', BooleanField,
+    native_types=_BOOLEAN_TYPES)
+CharArrayField = _array_field_factory('CharArrayField', CharField,
+    native_types=_STRING_TYPES)
+DateArrayField = _array_field_factory('DateArrayField', DateField,
+    adapt_elements=True)
+DateTimeArrayField = _array_field_factory('DateTimeArrayField', DateTimeField,
+    adapt_elements=True)
+DecimalArrayField = _array_field_factory('DecimalArrayField', DecimalField,
+    native_types=(decimal.Decimal, _NONE), adapt_elements=True)
+EmailArrayField = _array_field_factory('EmailArrayField', EmailField,
+    native_types=_STRING_TYPES)
+FilePathArrayField = _array_field_factory('FilePathArrayField', FilePathField,
+    native_types=_STRING_TYPES)
+FloatArrayField = _array_field_factory('FloatArrayField', FloatField,
+    native_types=(float, _NONE), typecode='d')
+IntegerArrayField = _array_field_factory('IntegerArrayField', IntegerField,
+    native_types=_INTEGER_TYPES, typecode='i')
+BigIntegerArrayField = _array_field_factory('BigIntegerArrayField',
+    BigIntegerField, native_types=_INTEGER_TYPES, typecode=INT64_TYPECODE)
+IPAddressArrayField = _array_field_factory('IPAddressArrayField',
+    IPAddressField, get_placeholder=_cast_placeholder)
+GenericIPAddressArrayField = _array_field_factory('GenericIPAddressArrayField',
+    GenericIPAddressField, get_placeholder=_cast_placeholder)
+NullBooleanArrayField = _array_field_factory('NullBooleanArrayField',
+    NullBooleanField, native_types=_BOOLEAN_TYPES)
 #PositiveIntegerArrayField = _array_field_factory('PositiveIntegerArrayField', PositiveIntegerField)
 #PositiveSmallIntegerArrayField = _array_field_factory('PositiveSmallIntegerArrayField', PositiveSmallIntegerField)
-SlugArrayField = _array_field_factory('SlugArrayField', SlugField)
-SmallIntegerArrayField = _array_field_factory('SmallIntegerArrayField', SmallIntegerField)
-TextArrayField = _array_field_factory('TextArrayField', TextField)
-#TimeArrayField = _array_field_factory('TimeArrayField', TimeField)
-URLArrayField = _array_field_factory('URLArrayField', URLField)
+SlugArrayField = _array_field_factory('SlugArrayField', SlugField,
+    native_types=_STRING_TYPES)
+SmallIntegerArrayField = _array_field_factory('SmallIntegerArrayField',
+    SmallIntegerField, native_types=_INTEGER_TYPES, typecode='h')
+TextArrayField = _array_field_factory('TextArrayField', TextField,
+    native_types=_STRING_TYPES)
+TimeArrayField = _array_field_factory('TimeArrayField', TimeField,
+    adapt_elements=True)
+URLArrayField = _array_field_factory('URLArrayField', URLField,
+    native_types=_STRING_TYPES)
 
 
@@ -139,6 +139,21 @@ class Manager(object):
     def bulk_create(self, *args, **kwargs):
         return self.get_query_set().bulk_create(*args, **kwargs)
 
+    def bulk_update(self, *args, **kwargs):
+        return self.get_query_set().bulk_update(*args, **kwargs)
+
+    def bulk_upsert(self, *args, **kwargs):
+        return self.get_query_set().bulk_upsert(*args, **kwargs)
+
+    def update_or_create(self, **kwargs):
+        return self.get_query_set().update_or_create(**kwargs)
+
+    def copy_from(self, *args, **kwargs):
+        return self.get_query_set().copy_from(*args, **kwargs)
+
+    def copy_to(self, *args, **kwargs):
+        return self.get_query_set().copy_to(*args, **kwargs)
+
     def filter(self, *args, **kwargs):
         return self.get_query_set().filter(*args, **kwargs)
 
@@ -151,6 +166,9 @@ class Manager(object):
     def complex_filter(self, *args, **kwargs):
         return self.get_query_set().complex_filter(*args, **kwargs)
 
+    def leaves(self, *args, **kwargs):
+        return self.get_query_set().leaves(*args, **kwargs)
+
     def exclude(self, *args, **kwargs):
         return self.get_query_set().exclude(*args, **kwargs)
 
@@ -160,6 +178,12 @@ class Manager(object):
     def iterator(self, *args, **kwargs):
         return self.get_query_set().iterator(*args, **kwargs)
 
+    def stream(self, *args, **kwargs):
+        return self.get_query_set().stream(*args, **kwargs)
+
+    def chunked(self, *args, **kwargs):
+        return self.get_query_set().chunked(*args, **kwargs)
+
     def latest(self, *args, **kwargs):
         return self.get_query_set().latest(*args, **kwargs)
 
@@ -181,6 +205,12 @@ class Manager(object):
     def values_list(self, *args, **kwargs):
         return self.get_query_set().values_list(*args, **kwargs)
 
+    def named(self, *args, **kwargs):
+        return self.get_query_set().named(*args, **kwargs)
+
+    def columns(self, *args, **kwargs):
+        return self.get_query_set().columns(*args, **kwargs)
+
     def update(self, *args, **kwargs):
         return self.get_query_set().update(*args, **kwargs)
 
@@ -193,6 +223,9 @@ class Manager(object):
     def only(self, *args, **kwargs):
         return self.get_query_set().only(*args, **kwargs)
 
+    def cached_sql(self, *args, **kwargs):
+        return self.get_query_set().cached_sql(*args, **kwargs)
+
     def using(self, *args, **kwargs):
         return self.get_query_set().using(*args, **kwargs)
 
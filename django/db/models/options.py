@@ -1,5 +1,6 @@
 import re
 from bisect import bisect
+from operator import itemgetter
 
 from django.conf import settings
 from django.db.models.related import RelatedObject
@@ -20,7 +21,15 @@ DEFAULT_NAMES = ('verbose_name', 'verbose_name_plural', 'db_table', 'ordering',
                 'unique_together', 'permissions', 'get_latest_by',
                 'order_with_respect_to', 'app_label', 'db_tablespace',
                 'abstract', 'managed', 'proxy', 'auto_created',
-                'db_view', 'materialized_view', 'db_view_sql', 'concrete')
+                'db_view', 'materialized_view', 'db_view_sql', 'concrete',
+                'view_maintenance', 'max_staleness', 'child_type_indexes')
+
+# How the leaves of a materialized view keep its base table up to date:
+# 'row' runs one trigger call per written row, 'statement' runs one set-based
+# trigger call per SQL statement using transition tables (PostgreSQL >= 10),
+# 'deferred' only queues the changes in a change-log table. They are applied
+# in batches later on (see django.db.backends.pg_django.maintenance)
+VIEW_MAINTENANCE_MODES = ('row', 'statement', 'deferred')
 
 
 class Options(object):
@@ -68,6 +77,25 @@ class Options(object):
         # table)
         self.concrete = True
         self.leaf = False
+        # how the materialized view base table is maintained (see
+        # VIEW_MAINTENANCE_MODES). None means inherited from the base.
+        self.view_maintenance = None
+        # how old (in seconds) the data read from a materialized view base
+        # may be, when some of its leaves use deferred maintenance
+        self.max_staleness = None
+        # fields of a materialized view base indexed together with
+        # pgd_child_type, in composite (pgd_child_type, column) indexes
+        self.child_type_indexes = []
+        # maps the leaf ids of a materialized or intermediate view to the
+        # leaf model and its constructor arguments getter (see
+        # get_leaf_loader)
+        self._leaf_loaders = {}
+        # maps column names to the ids of the leaves storing them (see
+        # get_column_leaf_ids)
+        self._column_leaf_ids = {}
+        # maps the names of the fields loaded to the functions instantiating
+        # the model from the database (see Model.get_loader)
+        self._loaders = {}
 
         # To handle various inheritance situations, we need to track where
         # managers came from (concrete or abstract base classes).
@@ -124,6 +152,15 @@ class Options(object):
             self.verbose_name_plural = string_concat(self.verbose_name, 's')
         del self.meta
 
+        if (self.view_maintenance is not None and
+                self.view_maintenance not in VIEW_MAINTENANCE_MODES):
+            raise TypeError("'class Meta' got invalid view_maintenance %r. "
+                            "Choices are: %s" % (self.view_maintenance,
+                                    ', '.join(VIEW_MAINTENANCE_MODES)))
+        if self.child_type_indexes and not self.materialized_view:
+            raise TypeError("'class Meta' child_type_indexes is only valid on "
+                            "materialized view bases.")
+
         # If the db_table wasn't provided, use the app_label + module_name.
         if not self.db_table:
             # remember that the db_table was set automatically
@@ -234,6 +271,23 @@ class Options(object):
             for column in elt:
                 self.duplicate_targets[column] = elt.difference(set([column]))
 
+    @property
+    def view_changelog_table(self):
+        """The table queuing the changes of leaves using deferred
+        maintenance, on a materialized view base"""
+        return '%s_changes' % self.db_table
+
+    def get_view_maintenance(self):
+        """Return the materialized view maintenance mode of this model.
+        Unless they define their own, leaves use the mode of their
+        materialized view base, which defaults to 'row'"""
+        if self.view_maintenance is not None:
+            return self.view_maintenance
+        mat_view_base = getattr(self, 'mat_view_base', None)
+        if mat_view_base is not None:
+            return mat_view_base._meta.get_view_maintenance()
+        return 'row'
+
     def register_leaf(self,leaf):
         if not self.materialized_view:
             # TODO PG: exception?
@@ -253,16 +307,87 @@ class Options(object):
         else:
             self.leaf_ids[leaf._meta.leaf_id] = leaf
             self.leaves[leaf] = leaf._meta.leaf_id
+            self._leaf_loaders = {}
+            self._column_leaf_ids = {}
             for base in leaf.__mro__:
                 if hasattr(base,'_meta') and base._meta.intermediate:
                     # add the leaf to intermediate views
                     base._meta.leaf_ids[leaf._meta.leaf_id] = leaf
                     base._meta.leaves[leaf] = leaf._meta.leaf_id
+                    base._meta._leaf_loaders = {}
+                    base._meta._column_leaf_ids = {}
                     if base in self.leaves and not base._meta.concrete:
                         # remove the view from leaves
                         del self.leaves[base._meta.concrete_model]
                         del self.leaf_ids[base._meta.leaf_id]
 
+    def get_child_type_index(self):
+        """The position of the pgd_child_type column in the rows of a
+        materialized or intermediate view"""
+        try:
+            return self._child_type_index
+        except AttributeError:
+            columns = [f.column for f in self.fields]
+            self._child_type_index = columns.index('pgd_child_type')
+            return self._child_type_index
+
+    def get_leaf_loader(self, leaf_id):
+        """
+        Returns a (leaf, get_args) tuple for the leaf identified by `leaf_id`
+        in this materialized or intermediate view. get_args() takes a row of
+        the view and returns the positional arguments of the leaf model
+        constructor.
+
+        The mapping between the view columns and the leaf fields is computed
+        once per leaf, so that instantiating the rows of polymorphic querysets
+        costs about as much as plain model instantiation.
+        """
+        try:
+            return self._leaf_loaders[leaf_id]
+        except KeyError:
+            pass
+        try:
+            leaf = self.leaf_ids[leaf_id]
+        except KeyError:
+            raise FieldError("Unknown pgd_child_type %r for %s" %
+                             (leaf_id, self.object_name))
+        positions = dict([(f.attname, i) for i, f in enumerate(self.fields)])
+        indexes = [positions.get(f.attname) for f in leaf._meta.fields]
+        if None not in indexes and len(indexes) > 1:
+            get_args = itemgetter(*indexes)
+        else:
+            # some leaf fields are not in the view (or a single one is):
+            # they are initialized to None
+            def get_args(row):
+                return [row[i] if i is not None else None for i in indexes]
+        self._leaf_loaders[leaf_id] = (leaf, get_args)
+        return leaf, get_args
+
+    def get_column_leaf_ids(self, column):
+        """
+        Returns the set of the ids of the leaves of this materialized or
+        intermediate view storing `column` in their own table. Rows of the
+        other leaves hold NULL in this column.
+        """
+        try:
+            return self._column_leaf_ids[column]
+        except KeyError:
+            pass
+        leaf_ids = set()
+        for leaf_id, leaf in self.leaf_ids.items():
+            for f in leaf._meta.fields:
+                if f.column == column and not getattr(f, 'child_field', False):
+                    leaf_ids.add(leaf_id)
+                    break
+        self._column_leaf_ids[column] = leaf_ids
+        return leaf_ids
+
+    def is_leaf_column(self, column):
+        """True if `column` of this materialized or intermediate view is
+        stored by some of its leaves only"""
+        return ((self.materialized_view or self.intermediate) and
+                self.get_column_leaf_ids(column) != set(self.leaf_ids))
+
     def add_field(self, field):
         # Insert the given field in the order in which it was created, using
         # the "creation_counter" attribute of the field.
@@ -278,6 +403,11 @@ class Options(object):
             if hasattr(self, '_field_cache'):
                 del self._field_cache
                 del self._field_name_cache
+            if hasattr(self, '_child_type_index'):
+                del self._child_type_index
+            self._leaf_loaders = {}
+            self._column_leaf_ids = {}
+            self._loaders = {}
 
         if hasattr(self, '_name_map'):
             del self._name_map
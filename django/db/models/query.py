@@ -2,16 +2,21 @@
 The main QuerySet implementation. This provides the public API for the ORM.
 """
 
+import array
 import copy
 import itertools
 import sys
+from collections import namedtuple
 
+from django.core.exceptions import NonPersistantModel
 from django.db import connections, router, transaction, IntegrityError
-from django.db.models.fields import AutoField
+from django.db.models.fields import AutoField, INT64_TYPECODE
 from django.db.models.query_utils import (Q, select_related_descend,
     deferred_class_factory, InvalidQuery)
 from django.db.models.deletion import Collector
-from django.db.models import sql
+from django.db.models import signals, sql
+from django.db.models.sql.constants import MULTI
+from django.utils.datastructures import SortedDict
 from django.utils.functional import partition
 
 # Used to control how many objects are worked with at once in some cases (e.g.
@@ -19,9 +24,25 @@ from django.utils.functional import partition
 CHUNK_SIZE = 100
 ITER_CHUNK_SIZE = CHUNK_SIZE
 
+# The number of rows fetched at once by QuerySet.stream()
+STREAM_CHUNK_SIZE = 2000
+
 # The maximum number of items to display in a QuerySet.__repr__
 REPR_OUTPUT_SIZE = 20
 
+# The array.array type codes of the columns of QuerySet.columns(), by internal
+# type of field. The values of the other fields are put in lists, as are the
+# booleans, which an array would turn into integers.
+COLUMN_TYPECODES = {
+    'AutoField': 'l',
+    'BigIntegerField': INT64_TYPECODE,
+    'FloatField': 'd',
+    'IntegerField': 'l',
+    'PositiveIntegerField': 'l',
+    'PositiveSmallIntegerField': 'l',
+    'SmallIntegerField': 'l',
+}
+
 # Pull into this namespace for backwards compatibility.
 EmptyResultSet = sql.EmptyResultSet
 
@@ -280,6 +301,9 @@ class QuerySet(object):
                 else:
                     init_list.append(field.attname)
             model_cls = deferred_class_factory(self.model, skip)
+            load = model_cls.get_loader(init_list)
+        else:
+            load = self.model.get_loader()
 
         # Cache db and model outside the loop
         db = self.db
@@ -288,22 +312,24 @@ class QuerySet(object):
         if fill_cache:
             klass_info = get_klass_info(model, max_depth=max_depth,
                                         requested=requested, only_load=only_load)
+        # Rows of materialized and intermediate views are instantiated as
+        # their leaf model, picked by their pgd_child_type.
+        dispatch_leaves = (model._meta.materialized_view or
+                           model._meta.intermediate)
+        if dispatch_leaves:
+            get_leaf_loader = model._meta.get_leaf_loader
+            child_type_index = model._meta.get_child_type_index()
         for row in compiler.results_iter():
             if fill_cache:
                 obj, _ = get_cached_row(row, index_start, db, klass_info,
                                         offset=len(aggregate_select))
+            elif dispatch_leaves and not skip:
+                row_data = row[index_start:aggregate_start]
+                leaf, get_args = get_leaf_loader(row_data[child_type_index])
+                obj = leaf.get_loader()(db, get_args(row_data))
             else:
-                if skip:
-                    row_data = row[index_start:aggregate_start]
-                    obj = model_cls(**dict(zip(init_list, row_data)))
-                else:
-                    # Omit aggregates in object creation.
-                    obj = model(*row[index_start:aggregate_start])
-
-                # Store the source database of the object
-                obj._state.db = db
-                # This object came from the database; it's not being added.
-                obj._state.adding = False
+                # Omit aggregates in object creation.
+                obj = load(db, row[index_start:aggregate_start])
 
             if extra_select:
                 for i, k in enumerate(extra_select):
@@ -316,6 +342,50 @@ class QuerySet(object):
 
             yield obj
 
+    def stream(self, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        An iterator over the results from applying this QuerySet to the
+        database, like iterator(). The rows are fetched `chunk_size` at a time
+        from a server-side cursor, so that memory use does not grow with the
+        number of results. Backends not supporting server-side cursors read
+        the results as iterator() does.
+        """
+        clone = self._clone()
+        clone.query.stream_chunk_size = chunk_size
+        return clone.iterator()
+
+    def chunked(self, size, key='pk'):
+        """
+        Returns an iterator over the results of this QuerySet as lists of at most `size`
+        objects, ordered by `key`: the name of a unique field, prefixed with
+        '-' for the descending order. Each chunk is read by its own query
+        selecting the objects after the key of the last object of the previous
+        chunk (keyset pagination), rather than with an OFFSET, so the cost of
+        a chunk does not depend on its depth.
+        """
+        assert self.query.can_filter(), \
+                "Cannot use 'limit' or 'offset' with chunked."
+        size = int(size)
+        if size < 1:
+            raise ValueError("The chunk size must be positive.")
+        name = key.lstrip('-')
+        opts = self.model._meta
+        if name == 'pk':
+            attname = opts.pk.attname
+        else:
+            attname = opts.get_field(name).attname
+        lookup = '%s__%s' % (name, key.startswith('-') and 'lt' or 'gt')
+        return self._chunks(self.order_by(key), size, lookup, attname)
+
+    def _chunks(self, qs, size, lookup, attname):
+        chunk = list(qs[:size])
+        while chunk:
+            yield chunk
+            if len(chunk) < size:
+                return
+            last = getattr(chunk[-1], attname)
+            chunk = list(qs.filter(**{lookup: last})[:size])
+
     def aggregate(self, *args, **kwargs):
         """
         Returns a dictionary containing the calculations (aggregation)
@@ -377,12 +447,16 @@ class QuerySet(object):
         obj.save(force_insert=True, using=self.db)
         return obj
 
-    def bulk_create(self, objs):
+    def bulk_create(self, objs, batch_size=None):
         """
         Inserts each of the instances into the database. This does *not* call
         save() on each of the instances, does not send any pre/post save
         signals, and does not set the primary key attribute if it is an
-        autoincrement field.
+        autoincrement field (unless the backend can return the ids of a
+        multi-row insert).
+
+        If batch_size is given, the objects are inserted by statements of at
+        most batch_size rows.
         """
         # So this case is fun. When you bulk insert you don't get the primary
         # keys back (if it's an autoincrement), so you can't insert into the
@@ -392,12 +466,19 @@ class QuerySet(object):
         # tables to get the primary keys back, and then doing a single bulk
         # insert into the childmost table. We're punting on these for now
         # because they are relatively rare cases.
-        if self.model._meta.parents:
+        # pg_django returns the primary keys of multi-row inserts, so the
+        # parent tables are inserted first, a statement per table.
+        opts = self.model._meta
+        if opts.materialized_view or (opts.intermediate and not opts.concrete):
+            raise NonPersistantModel("Materialized views and intermediate "
+                                     "views can't be saved or deleted")
+        connection = connections[self.db]
+        return_ids = connection.features.can_return_ids_from_bulk_insert
+        if self.model._meta.parents and not return_ids:
             raise ValueError("Can't bulk create an inherited model")
         if not objs:
             return objs
         self._for_write = True
-        connection = connections[self.db]
         fields = self.model._meta.local_fields
         if not transaction.is_managed(using=self.db):
             transaction.enter_transaction_management(using=self.db)
@@ -405,15 +486,18 @@ class QuerySet(object):
         else:
             forced_managed = False
         try:
-            if (connection.features.can_combine_inserts_with_and_without_auto_increment_pk
-                and self.model._meta.has_auto_field):
-                self.model._base_manager._insert(objs, fields=fields, using=self.db)
-            else:
-                objs_with_pk, objs_without_pk = partition(lambda o: o.pk is None, objs)
-                if objs_with_pk:
-                    self.model._base_manager._insert(objs_with_pk, fields=fields, using=self.db)
-                if objs_without_pk:
-                    self.model._base_manager._insert(objs_without_pk, fields=[f for f in fields if not isinstance(f, AutoField)], using=self.db)
+            for batch in self._get_batches(objs, batch_size):
+                if return_ids:
+                    self._batched_insert(batch, self.model)
+                elif (connection.features.can_combine_inserts_with_and_without_auto_increment_pk
+                    and self.model._meta.has_auto_field):
+                    self.model._base_manager._insert(batch, fields=fields, using=self.db)
+                else:
+                    objs_with_pk, objs_without_pk = partition(lambda o: o.pk is None, batch)
+                    if objs_with_pk:
+                        self.model._base_manager._insert(objs_with_pk, fields=fields, using=self.db)
+                    if objs_without_pk:
+                        self.model._base_manager._insert(objs_without_pk, fields=[f for f in fields if not isinstance(f, AutoField)], using=self.db)
             if forced_managed:
                 transaction.commit(using=self.db)
             else:
@@ -424,6 +508,194 @@ class QuerySet(object):
 
         return objs
 
+    def _get_batches(self, objs, batch_size):
+        """
+        Splits objs in lists of at most batch_size objects (a single list if
+        batch_size is None).
+        """
+        if not batch_size:
+            return [objs]
+        return [objs[i:i + batch_size] for i in xrange(0, len(objs), batch_size)]
+
+    def _batched_insert(self, objs, model):
+        """
+        Inserts objs in the table of model, after the tables of its parents,
+        and sets the primary keys returned by the database on objs. Needs
+        features.can_return_ids_from_bulk_insert.
+        """
+        meta = model._meta
+        for parent, field in meta.parents.items():
+            # Same as Model.save_base(): the parent primary key may be
+            # given by the link field
+            if field:
+                for obj in objs:
+                    if (getattr(obj, parent._meta.pk.attname) is None and
+                            getattr(obj, field.attname) is not None):
+                        setattr(obj, parent._meta.pk.attname,
+                                getattr(obj, field.attname))
+            self._batched_insert(objs, parent)
+            if field:
+                for obj in objs:
+                    setattr(obj, field.attname, obj._get_pk_val(parent._meta))
+        if meta.proxy:
+            return
+        fields = meta.local_fields
+        objs_with_pk, objs_without_pk = partition(
+            lambda o: o._get_pk_val(meta) is None, objs)
+        if objs_with_pk:
+            model._base_manager._insert(objs_with_pk, fields=fields,
+                                        using=self.db)
+        if objs_without_pk:
+            fields = [f for f in fields if not isinstance(f, AutoField)]
+            ids = model._base_manager._insert(objs_without_pk, fields=fields,
+                                              return_id=True, using=self.db)
+            if len(objs_without_pk) == 1:
+                ids = [ids]
+            for obj, pk in zip(objs_without_pk, ids):
+                setattr(obj, meta.pk.attname, pk)
+        for obj in objs:
+            obj._state.db = self.db
+            obj._state.adding = False
+
+    def bulk_upsert(self, objs, conflict_fields=None, update_fields=None,
+                    batch_size=None):
+        """
+        Inserts each of the instances into the database or, for the ones
+        conflicting with an existing row on conflict_fields, updates the
+        update_fields of this row instead, with a single
+        INSERT ... ON CONFLICT statement per batch (on backends supporting
+        it). Unlike a lookup followed by an insert, this does not race with
+        concurrent writers.
+
+        conflict_fields are the names of fields covered by a unique
+        constraint, by default the primary key. update_fields default to
+        the other local fields, except the auto_now_add ones. A batch must
+        not hold two instances conflicting with each other.
+
+        As with bulk_create(), save() is not called and no signal is sent.
+        The primary keys of the inserted or updated rows are set on the
+        instances. Returns a list of (object, created) tuples.
+        """
+        opts = self.model._meta
+        if opts.materialized_view or (opts.intermediate and not opts.concrete):
+            raise NonPersistantModel("Materialized views and intermediate "
+                                     "views can't be saved or deleted")
+        if opts.parents or opts.intermediate:
+            raise ValueError("Can't bulk upsert an inherited model")
+        if conflict_fields is None:
+            conflict_fields = [opts.pk]
+        else:
+            conflict_fields = [opts.get_field(name) for name in conflict_fields]
+        if update_fields is None:
+            update_fields = [f for f in opts.local_fields
+                             if not f.primary_key and
+                             f not in conflict_fields and
+                             not getattr(f, 'auto_now_add', False)]
+        else:
+            update_fields = [opts.get_field(name) for name in update_fields]
+        if not objs:
+            return []
+        self._for_write = True
+        on_conflict = (conflict_fields, update_fields)
+        fields = opts.local_fields
+        fields_without_pk = [f for f in fields if not isinstance(f, AutoField)]
+        created = {}
+        if not transaction.is_managed(using=self.db):
+            transaction.enter_transaction_management(using=self.db)
+            forced_managed = True
+        else:
+            forced_managed = False
+        try:
+            for batch in self._get_batches(objs, batch_size):
+                objs_with_pk, objs_without_pk = partition(
+                    lambda o: o.pk is None, batch)
+                for batch_objs, batch_fields in (
+                        (objs_with_pk, fields),
+                        (objs_without_pk, fields_without_pk)):
+                    if not batch_objs:
+                        continue
+                    rows = self.model._base_manager._insert(
+                        batch_objs, fields=batch_fields, return_id=True,
+                        using=self.db, on_conflict=on_conflict)
+                    for obj, (pk, inserted) in zip(batch_objs, rows):
+                        setattr(obj, opts.pk.attname, pk)
+                        obj._state.db = self.db
+                        obj._state.adding = False
+                        created[id(obj)] = inserted
+            if forced_managed:
+                transaction.commit(using=self.db)
+            else:
+                transaction.commit_unless_managed(using=self.db)
+        finally:
+            if forced_managed:
+                transaction.leave_transaction_management(using=self.db)
+        return [(obj, created[id(obj)]) for obj in objs]
+
+    def copy_from(self, rows, fields=None):
+        """
+        Loads `rows` in the table of the model with a single COPY statement
+        (on backends supporting it). `rows` is an iterable of instances of
+        the model or of tuples of values of `fields`, or a file in the text
+        format of COPY. Rows are converted and sent as they are iterated over,
+        so a generator is never held in memory.
+
+        `fields` are the names of the fields loaded, by default all the local
+        fields but an auto-incremented primary key. As with bulk_create(),
+        save() is not called, no signal is sent and primary keys are not set.
+        Returns the number of rows loaded.
+        """
+        opts = self.model._meta
+        if opts.materialized_view or (opts.intermediate and not opts.concrete):
+            raise NonPersistantModel("Materialized views and intermediate "
+                                     "views can't be saved or deleted")
+        if opts.parents:
+            raise ValueError("Can't copy rows into an inherited model")
+        if fields is None:
+            fields = [f for f in opts.local_fields
+                      if not isinstance(f, AutoField)]
+        else:
+            fields = [opts.get_field(name) for name in fields]
+        self._for_write = True
+        connection = connections[self.db]
+        if not hasattr(rows, 'read'):
+            rows = self._get_copy_values(rows, fields, connection)
+        count = connection.ops.copy_from(opts.concrete_table_name,
+                                         [f.column for f in fields], rows)
+        transaction.commit_unless_managed(using=self.db)
+        return count
+
+    def _get_copy_values(self, rows, fields, connection):
+        """
+        Yields the values of `fields` of each of `rows` (instances or tuples),
+        prepared for saving.
+        """
+        for row in rows:
+            if isinstance(row, self.model):
+                yield [f.get_db_prep_save(f.pre_save(row, True),
+                                          connection=connection)
+                       for f in fields]
+            else:
+                yield [f.get_db_prep_save(value, connection=connection)
+                       for f, value in zip(fields, row)]
+
+    def copy_to(self, file, fields=None):
+        """
+        Writes the rows of this QuerySet to `file` (an object with a write()
+        method) with a single COPY statement (on backends supporting it), in
+        the text format of COPY. The rows are written as the database sends
+        them. `fields` are the names of the fields written, by default all
+        the fields of the model. Returns the number of rows written.
+
+        See django.db.backends.pg_django.bulkcopy.read_copy_rows() to read
+        them back as python values.
+        """
+        qs = self.values_list(*(fields or ()))
+        try:
+            sql, params = qs.query.get_compiler(self.db).as_sql()
+        except EmptyResultSet:
+            return 0
+        return connections[self.db].ops.copy_to(sql, params, file)
+
     def get_or_create(self, **kwargs):
         """
         Looks up an object with the given kwargs, creating one if necessary.
@@ -458,6 +730,93 @@ class QuerySet(object):
                     # Re-raise the IntegrityError with its original traceback.
                     raise exc_info[1], None, exc_info[2]
 
+    def update_or_create(self, defaults=None, **kwargs):
+        """
+        Looks up an object with the given kwargs, updating it with the
+        defaults if it exists, creating it otherwise. Returns a tuple of
+        (object, created), where created is a boolean specifying whether an
+        object was created.
+
+        On backends supporting upserts, when the kwargs are the local fields
+        of a unique constraint, this is a single INSERT ... ON CONFLICT
+        statement returning the stored row, which does not race with
+        concurrent calls. Otherwise the object is looked up, then saved.
+        """
+        assert kwargs, \
+                'update_or_create() must be passed at least one keyword argument'
+        defaults = defaults or {}
+        self._for_write = True
+        conflict_fields = self._get_unique_fields(kwargs)
+        update_fields = self._get_local_fields(defaults)
+        if (conflict_fields is None or update_fields is None or
+                not connections[self.db].features.supports_upsert):
+            obj, created = self.get_or_create(defaults=defaults, **kwargs)
+            if not created and defaults:
+                for name, value in defaults.iteritems():
+                    setattr(obj, name, value)
+                obj.save(using=self.db)
+            return obj, created
+
+        params = kwargs.copy()
+        params.update(defaults)
+        obj = self.model(**params)
+        opts = self.model._meta
+        meta = opts.concrete_model._meta
+        signals.pre_save.send(sender=obj.__class__, instance=obj, raw=False,
+                              using=self.db)
+        fields = meta.local_fields
+        if obj.pk is None:
+            fields = [f for f in fields if not isinstance(f, AutoField)]
+        rows = meta.concrete_model._base_manager._insert(
+            [obj], fields=fields, return_id=True, using=self.db,
+            on_conflict=(conflict_fields, update_fields),
+            returning_fields=meta.local_fields)
+        row = rows[0]
+        for field, value in zip(meta.local_fields, row[:-1]):
+            setattr(obj, field.attname, value)
+        created = row[-1]
+        transaction.commit_unless_managed(using=self.db)
+        obj._state.db = self.db
+        obj._state.adding = False
+        signals.post_save.send(sender=obj.__class__, instance=obj,
+                               created=created, raw=False, using=self.db)
+        return obj, created
+
+    def _get_local_fields(self, names):
+        """
+        Returns the local fields of the model named `names` (names or
+        attnames), or None if one of them is not a local field or the model
+        can't be upserted.
+        """
+        opts = self.model._meta
+        if (opts.parents or opts.materialized_view or opts.intermediate or
+                self.query.where):
+            return None
+        by_name = {'pk': opts.pk}
+        for f in opts.local_fields:
+            by_name[f.name] = by_name[f.attname] = f
+        try:
+            return [by_name[name] for name in names]
+        except KeyError:
+            return None
+
+    def _get_unique_fields(self, names):
+        """
+        Returns the local fields named `names` if they are covered by a
+        unique constraint, so that they can be the conflict fields of an
+        upsert, None otherwise.
+        """
+        fields = self._get_local_fields(names)
+        if not fields:
+            return None
+        if len(fields) == 1 and fields[0].unique:
+            return fields
+        field_names = set([f.name for f in fields])
+        for unique in self.model._meta.unique_together:
+            if set(unique) == field_names:
+                return fields
+        return None
+
     def latest(self, field_name=None):
         """
         Returns the latest object, according to the model's 'get_latest_by'
@@ -514,6 +873,14 @@ class QuerySet(object):
         self._result_cache = None
     delete.alters_data = True
 
+    def _raw_delete(self, using):
+        """
+        Deletes the records of the QuerySet with a single query, without
+        collecting them nor sending signals.
+        """
+        sql.DeleteQuery(self.model).delete_qs(self, using)
+    _raw_delete.alters_data = True
+
     def update(self, **kwargs):
         """
         Updates all elements in the current QuerySet, setting all the given
@@ -542,6 +909,60 @@ class QuerySet(object):
         return rows
     update.alters_data = True
 
+    def bulk_update(self, objs, fields, batch_size=None):
+        """
+        Updates the given fields of each of the instances in the database,
+        setting the values of each instance on its row, with a single query
+        per batch: an UPDATE ... FROM (VALUES ...) on backends supporting
+        it, CASE expressions otherwise. Only the rows of this QuerySet are
+        updated.
+
+        As with bulk_create(), save() is not called and no signal is sent.
+        Returns the number of rows updated.
+        """
+        assert self.query.can_filter(), \
+                "Cannot update a query once a slice has been taken."
+        opts = self.model._meta
+        if opts.materialized_view or (opts.intermediate and not opts.concrete):
+            raise NonPersistantModel("Materialized views and intermediate "
+                                     "views can't be saved or deleted")
+        if not fields:
+            raise ValueError("Field names must be given to bulk_update().")
+        fields = [opts.get_field(name) for name in fields]
+        for field in fields:
+            if field.primary_key or field not in opts.local_fields:
+                raise ValueError("bulk_update() can only update the local "
+                                 "fields of a model, not %r" % field.name)
+        if [obj for obj in objs if obj.pk is None]:
+            raise ValueError("All bulk_update() objects must have a primary "
+                             "key set.")
+        if not objs:
+            return 0
+        self._for_write = True
+        rows = 0
+        if not transaction.is_managed(using=self.db):
+            transaction.enter_transaction_management(using=self.db)
+            forced_managed = True
+        else:
+            forced_managed = False
+        try:
+            for batch in self._get_batches(objs, batch_size):
+                query = self.query.clone(sql.UpdateQuery)
+                query.add_bulk_update_values(fields, [
+                    (obj.pk, [f.pre_save(obj, False) for f in fields])
+                    for obj in batch])
+                rows += query.get_compiler(self.db).execute_sql(None)
+            if forced_managed:
+                transaction.commit(using=self.db)
+            else:
+                transaction.commit_unless_managed(using=self.db)
+        finally:
+            if forced_managed:
+                transaction.leave_transaction_management(using=self.db)
+        self._result_cache = None
+        return rows
+    bulk_update.alters_data = True
+
     def _update(self, values):
         """
         A version of update that accepts field objects instead of field names.
@@ -584,6 +1005,31 @@ class QuerySet(object):
         return self._clone(klass=ValuesListQuerySet, setup=True, flat=flat,
                 _fields=fields)
 
+    def named(self, *fields):
+        """
+        Returns a ValuesListQuerySet yielding named tuples rather than plain
+        tuples, whose attributes are the names of the fields (and of the
+        extra selects and annotations).
+        """
+        return self._clone(klass=NamedValuesListQuerySet, setup=True,
+                flat=False, _fields=fields)
+
+    def columns(self, *fields, **kwargs):
+        """
+        Returns a SortedDict mapping the names of the values that
+        values_list(*fields) would return to the columns of these values.
+        The columns of integer and float fields are array.array instances
+        (or NumPy arrays when numpy=True), the other ones lists. With
+        numpy=True, the columns of booleans are boolean NumPy arrays.
+        The rows are read a chunk at a time, without building an object per
+        row.
+        """
+        use_numpy = kwargs.pop('numpy', False)
+        if kwargs:
+            raise TypeError('Unexpected keyword arguments to columns: %s'
+                    % (kwargs.keys(),))
+        return self.values_list(*fields)._columns(use_numpy)
+
     def dates(self, field_name, kind, order='ASC'):
         """
         Returns a list of datetime objects representing all available dates for
@@ -656,6 +1102,29 @@ class QuerySet(object):
         else:
             return self._filter_or_exclude(None, **filter_obj)
 
+    def leaves(self, *models):
+        """
+        pg_django: returns a new QuerySet instance of a materialized or
+        intermediate view restricted to the rows of the given leaf models (or
+        of the leaves of the given intermediate views).
+        """
+        opts = self.model._meta
+        if not (opts.materialized_view or opts.intermediate):
+            raise TypeError("leaves() is only available on materialized and "
+                            "intermediate views.")
+        leaf_ids = set()
+        for model in models:
+            if model._meta.intermediate:
+                ids = model._meta.leaf_ids.keys()
+            else:
+                ids = [model._meta.leaf_id]
+            for leaf_id in ids:
+                if leaf_id not in opts.leaf_ids:
+                    raise TypeError("%s is not a leaf of %s." % (
+                        model._meta.object_name, opts.object_name))
+            leaf_ids.update(ids)
+        return self.filter(pgd_child_type__in=sorted(leaf_ids))
+
     def select_for_update(self, **kwargs):
         """
         Returns a new QuerySet instance that will select objects with a
@@ -690,7 +1159,7 @@ class QuerySet(object):
             obj.query.max_depth = depth
         return obj
 
-    def prefetch_related(self, *lookups):
+    def prefetch_related(self, *lookups, **kwargs):
         """
         Returns a new QuerySet instance that will prefetch the specified
         Many-To-One and Many-To-Many related objects when the QuerySet is
@@ -699,11 +1168,23 @@ class QuerySet(object):
         When prefetch_related() is called more than once, the list of lookups to
         prefetch is appended to. If prefetch_related(None) is called, the
         the list is cleared.
+
+        The lookups may be Prefetch objects, giving the queryset of the related
+        objects. When chunk_size is given, the related objects of the lookups
+        given as strings are fetched for at most chunk_size instances at once.
         """
+        chunk_size = kwargs.pop('chunk_size', None)
+        if kwargs:
+            raise TypeError('Unexpected keyword arguments to prefetch_related: %s'
+                    % (kwargs.keys(),))
         clone = self._clone()
         if lookups == (None,):
             clone._prefetch_related_lookups = []
         else:
+            if chunk_size is not None:
+                lookups = [isinstance(lookup, Prefetch) and lookup or
+                           Prefetch(lookup, chunk_size=chunk_size)
+                           for lookup in lookups]
             clone._prefetch_related_lookups.extend(lookups)
         return clone
 
@@ -814,6 +1295,18 @@ class QuerySet(object):
         clone.query.add_immediate_loading(fields)
         return clone
 
+    def cached_sql(self):
+        """
+        Returns a new QuerySet instance whose SQL is looked up in the SQL
+        cache (see django.db.models.sql.cache) by the shape of its query:
+        evaluating querysets built the same way, with different filter
+        values, only prepares the new values instead of compiling the SQL
+        again.
+        """
+        clone = self._clone()
+        clone.query.use_sql_cache = True
+        return clone
+
     def using(self, alias):
         """
         Selects which database this QuerySet should excecute its query against.
@@ -945,6 +1438,10 @@ class ValuesQuerySet(QuerySet):
         for row in self.query.get_compiler(self.db).results_iter():
             yield dict(zip(names, row))
 
+    def chunked(self, size, key='pk'):
+        raise TypeError("Cannot use chunked() with values() or "
+                        "values_list().")
+
     def _setup_query(self):
         """
         Constructs the field_names list that the values query will be
@@ -1084,6 +1581,43 @@ class ValuesListQuerySet(ValuesQuerySet):
                 data = dict(zip(names, row))
                 yield tuple([data[f] for f in fields])
 
+    def _result_names(self):
+        """
+        Returns the names of the values of the tuples yielded, in order.
+        """
+        extra_names = self.query.extra_select.keys()
+        aggregate_names = self.query.aggregate_select.keys()
+        if not extra_names and not aggregate_names:
+            return list(self.field_names)
+        if self._fields:
+            return list(self._fields) + filter(
+                lambda f: f not in self._fields, aggregate_names)
+        return extra_names + self.field_names + aggregate_names
+
+    def _columns(self, use_numpy):
+        names = self._result_names()
+        fields = dict(zip(self.field_names, self.query.select_fields))
+        columns = [_new_column(fields.get(name)) for name in names]
+        if self._result_cache is not None:
+            chunks = [self._result_cache]
+        else:
+            compiler = self.query.get_compiler(self.db)
+            if (self.query.select_for_update and
+                    transaction.is_managed(self.db)):
+                transaction.set_dirty(self.db)
+            if (hasattr(compiler, 'resolve_columns') or
+                    self.query.extra_select or self.query.aggregate_select):
+                # the rows need converting or reordering
+                chunks = _chunks(self.iterator(), ITER_CHUNK_SIZE)
+            else:
+                chunks = compiler.execute_sql(MULTI) or []
+        for rows in chunks:
+            for i, values in enumerate(zip(*rows)):
+                columns[i] = _extend_column(columns[i], values)
+        if use_numpy:
+            columns = [_to_numpy(column) for column in columns]
+        return SortedDict(zip(names, columns))
+
     def _clone(self, *args, **kwargs):
         clone = super(ValuesListQuerySet, self)._clone(*args, **kwargs)
         if not hasattr(clone, "flat"):
@@ -1092,6 +1626,81 @@ class ValuesListQuerySet(ValuesQuerySet):
         return clone
 
 
+class NamedValuesListQuerySet(ValuesListQuerySet):
+    def iterator(self):
+        make = get_row_class(self._result_names())._make
+        for row in super(NamedValuesListQuerySet, self).iterator():
+            yield make(row)
+
+
+# the named tuple classes of NamedValuesListQuerySet, by names of the values
+_row_classes = {}
+
+
+def get_row_class(names):
+    """
+    Returns the named tuple class of the rows with the values `names`. The
+    names which aren't valid attribute names are replaced by their position
+    prefixed with an underscore.
+    """
+    names = tuple(names)
+    try:
+        return _row_classes[names]
+    except KeyError:
+        row_class = _row_classes[names] = namedtuple('Row', names, rename=True)
+        return row_class
+
+
+def _new_column(field):
+    if field is not None and field.rel:
+        field = field.rel.get_related_field()
+    typecode = field is not None and COLUMN_TYPECODES.get(
+        field.get_internal_type())
+    if typecode:
+        return array.array(typecode)
+    return []
+
+
+def _extend_column(column, values):
+    """
+    Appends `values` to `column` and returns it. An array column is turned
+    into a list when a value doesn't fit in it (e.g. None).
+    """
+    if isinstance(column, list):
+        column.extend(values)
+        return column
+    length = len(column)
+    try:
+        column.extend(values)
+    except (TypeError, OverflowError):
+        del column[length:]
+        column = column.tolist()
+        column.extend(values)
+    return column
+
+
+def _to_numpy(column):
+    import numpy
+    if isinstance(column, list):
+        if column and not set(map(type, column)).difference([bool]):
+            return numpy.array(column, dtype=numpy.bool_)
+        result = numpy.empty(len(column), dtype=object)
+        result[:] = column
+        return result
+    if not column:
+        return numpy.zeros(0, dtype=column.typecode)
+    return numpy.frombuffer(column, dtype=column.typecode).copy()
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
 class DateQuerySet(QuerySet):
     def iterator(self):
         return self.query.get_compiler(self.db).results_iter()
@@ -1134,6 +1743,9 @@ class EmptyQuerySet(QuerySet):
     def delete(self):
         pass
 
+    def copy_to(self, file, fields=None):
+        return 0
+
     def _clone(self, klass=None, setup=False, **kwargs):
         c = super(EmptyQuerySet, self)._clone(klass, setup=setup, **kwargs)
         c._result_cache = []
@@ -1168,6 +1780,12 @@ class EmptyQuerySet(QuerySet):
         """
         return self
 
+    def leaves(self, *models):
+        """
+        Always returns EmptyQuerySet.
+        """
+        return self
+
     def select_related(self, *fields, **kwargs):
         """
         Always returns EmptyQuerySet.
@@ -1333,7 +1951,8 @@ def get_klass_info(klass, max_depth=0, cur_depth=0, requested=None,
                                             requested=next, only_load=only_load, local_only=True)
                 reverse_related_fields.append((o.field, klass_info))
 
-    return klass, field_names, field_count, related_fields, reverse_related_fields
+    return (klass.get_loader(field_names or None), field_count, related_fields,
+            reverse_related_fields)
 
 
 def get_cached_row(row, index_start, using,  klass_info, offset=0):
@@ -1356,7 +1975,7 @@ def get_cached_row(row, index_start, using,  klass_info, offset=0):
     """
     if klass_info is None:
         return None
-    klass, field_names, field_count, related_fields, reverse_related_fields = klass_info
+    load, field_count, related_fields, reverse_related_fields = klass_info
 
     fields = row[index_start : index_start + field_count]
     # If all the select_related columns are None, then the related
@@ -1365,15 +1984,7 @@ def get_cached_row(row, index_start, using,  klass_info, offset=0):
     if fields == (None,) * field_count:
         obj = None
     else:
-        if field_names:
-            obj = klass(**dict(zip(field_names, fields)))
-        else:
-            obj = klass(*fields)
-
-    # If an object was retrieved, set the database state.
-    if obj:
-        obj._state.db = using
-        obj._state.adding = False
+        obj = load(using, fields)
 
     # Instantiate related fields
     index_end = index_start + field_count + offset
@@ -1479,8 +2090,11 @@ class RawQuerySet(object):
             if self.model._meta.pk.attname in skip:
                 raise InvalidQuery('Raw query must include the primary key')
             model_cls = deferred_class_factory(self.model, skip)
+            model_init_field_names = model_init_field_names.items()
+            load = model_cls.get_loader(
+                [attname for attname, pos in model_init_field_names])
         else:
-            model_cls = self.model
+            load = self.model.get_loader()
             # All model's fields are present in the query. So, it is possible
             # to use *args based model instantation. For each field of the model,
             # record the query column position matching that field.
@@ -1495,20 +2109,15 @@ class RawQuerySet(object):
                 values = compiler.resolve_columns(values, fields)
             # Associate fields to values
             if skip:
-                model_init_kwargs = {}
-                for attname, pos in model_init_field_names.iteritems():
-                    model_init_kwargs[attname] = values[pos]
-                instance = model_cls(**model_init_kwargs)
+                instance = load(db, [values[pos] for attname, pos
+                                     in model_init_field_names])
             else:
-                model_init_args = [values[pos] for pos in model_init_field_pos]
-                instance = model_cls(*model_init_args)
+                instance = load(db, [values[pos]
+                                     for pos in model_init_field_pos])
             if annotation_fields:
                 for column, pos in annotation_fields:
                     setattr(instance, column, values[pos])
 
-            instance._state.db = db
-            instance._state.adding = False
-
             yield instance
 
     def __repr__(self):
@@ -1565,17 +2174,50 @@ class RawQuerySet(object):
         return self._model_fields
 
 
-def insert_query(model, objs, fields, return_id=False, raw=False, using=None):
+def insert_query(model, objs, fields, return_id=False, raw=False, using=None,
+                 on_conflict=None, returning_fields=None):
     """
     Inserts a new record for the given model. This provides an interface to
     the InsertQuery class and is how Model.save() is implemented. It is not
     part of the public API.
+
+    on_conflict is the (conflict_fields, update_fields) pair of an upsert
+    (see InsertQuery.set_on_conflict).
     """
     query = sql.InsertQuery(model)
     query.insert_values(fields, objs, raw=raw)
+    if on_conflict:
+        query.set_on_conflict(returning_fields=returning_fields, *on_conflict)
     return query.get_compiler(using=using).execute_sql(return_id)
 
 
+class Prefetch(object):
+    """
+    A lookup of prefetch_related() whose related objects are fetched with
+    `queryset` (by default, the one of the default manager of their model),
+    for at most `chunk_size` instances at once (by default, all of them).
+    The queryset only applies to the last relation of the lookup.
+    """
+    def __init__(self, lookup, queryset=None, chunk_size=None):
+        if queryset is not None and isinstance(queryset, ValuesQuerySet):
+            raise ValueError("Prefetch querysets cannot use values().")
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError("The chunk size of a Prefetch must be positive.")
+        self.prefetch_through = lookup
+        self.queryset = queryset
+        self.chunk_size = chunk_size
+
+    def __repr__(self):
+        return '<%s: %s>' % (self.__class__.__name__, self.prefetch_through)
+
+    def __getstate__(self):
+        obj_dict = self.__dict__.copy()
+        if self.queryset is not None:
+            # don't pickle the results of the queryset
+            obj_dict['queryset'] = self.queryset._clone()
+        return obj_dict
+
+
 def prefetch_related_objects(result_cache, related_lookups):
     """
     Helper function for prefetch_related functionality
@@ -1601,6 +2243,12 @@ def prefetch_related_objects(result_cache, related_lookups):
 
     all_lookups = itertools.chain(related_lookups, auto_lookups)
     for lookup in all_lookups:
+        is_auto_lookup = lookup in auto_lookups
+        if isinstance(lookup, Prefetch):
+            prefetch = lookup
+            lookup = prefetch.prefetch_through
+        else:
+            prefetch = Prefetch(lookup)
         if lookup in done_lookups:
             # We've done exactly this already, skip the whole thing
             continue
@@ -1638,51 +2286,114 @@ def prefetch_related_objects(result_cache, related_lookups):
 
             # We assume that objects retrieved are homogenous (which is the premise
             # of prefetch_related), so what applies to first object applies to all.
-            first_obj = obj_list[0]
-            prefetcher, descriptor, attr_found, is_fetched = get_prefetcher(first_obj, attr)
-
-            if not attr_found:
-                raise AttributeError("Cannot find '%s' on %s object, '%s' is an invalid "
-                                     "parameter to prefetch_related()" %
-                                     (attr, first_obj.__class__.__name__, lookup))
-
-            if level == len(attrs) - 1 and prefetcher is None:
-                # Last one, this *must* resolve to something that supports
-                # prefetching, otherwise there is no point adding it and the
-                # developer asking for it has made a mistake.
-                raise ValueError("'%s' does not resolve to a item that supports "
-                                 "prefetching - this is an invalid parameter to "
-                                 "prefetch_related()." % lookup)
-
-            if prefetcher is not None and not is_fetched:
-                # Check we didn't do this already
-                current_lookup = LOOKUP_SEP.join(attrs[0:level+1])
-                if current_lookup in done_queries:
-                    obj_list = done_queries[current_lookup]
-                else:
-                    obj_list, additional_prl = prefetch_one_level(obj_list, prefetcher, attr)
+            # pg_django: objects of mixed materialized view querysets are split
+            # in groups of leaves sharing the relation (see get_prefetch_groups)
+            current_lookup = LOOKUP_SEP.join(attrs[0:level+1])
+            level_obj_list = []
+            done_query = False
+            for (prefetcher, descriptor, attr_found, is_fetched,
+                    instances) in get_prefetch_groups(obj_list, attr):
+                first_obj = instances[0]
+                if not attr_found:
+                    raise AttributeError("Cannot find '%s' on %s object, '%s' is an invalid "
+                                         "parameter to prefetch_related()" %
+                                         (attr, first_obj.__class__.__name__, lookup))
+
+                if level == len(attrs) - 1 and prefetcher is None:
+                    # Last one, this *must* resolve to something that supports
+                    # prefetching, otherwise there is no point adding it and the
+                    # developer asking for it has made a mistake.
+                    raise ValueError("'%s' does not resolve to a item that supports "
+                                     "prefetching - this is an invalid parameter to "
+                                     "prefetch_related()." % lookup)
+
+                if prefetcher is not None and not is_fetched:
+                    # Check we didn't do this already
+                    if current_lookup in done_queries:
+                        level_obj_list = done_queries[current_lookup]
+                        break
+                    if level == len(attrs) - 1:
+                        queryset = prefetch.queryset
+                    else:
+                        queryset = None
+                    prefetched, additional_prl = prefetch_one_level(
+                        instances, prefetcher, attr, queryset,
+                        prefetch.chunk_size)
                     # We need to ensure we don't keep adding lookups from the
                     # same relationships to stop infinite recursion. So, if we
                     # are already on an automatically added lookup, don't add
                     # the new lookups from relationships we've seen already.
-                    if not (lookup in auto_lookups and
+                    if not (is_auto_lookup and
                             descriptor in followed_descriptors):
                         for f in additional_prl:
-                            new_prl = LOOKUP_SEP.join([current_lookup, f])
+                            if isinstance(f, Prefetch):
+                                new_prl = Prefetch(
+                                    LOOKUP_SEP.join([current_lookup,
+                                                     f.prefetch_through]),
+                                    f.queryset, f.chunk_size)
+                            else:
+                                new_prl = LOOKUP_SEP.join([current_lookup, f])
                             auto_lookups.append(new_prl)
-                        done_queries[current_lookup] = obj_list
+                        done_query = True
                     followed_descriptors.add(descriptor)
-            else:
-                # Either a singly related object that has already been fetched
-                # (e.g. via select_related), or hopefully some other property
-                # that doesn't support prefetching but needs to be traversed.
+                    level_obj_list.extend(prefetched)
+                else:
+                    # Either a singly related object that has already been fetched
+                    # (e.g. via select_related), or hopefully some other property
+                    # that doesn't support prefetching but needs to be traversed.
 
-                # We replace the current list of parent objects with that list.
-                obj_list = [getattr(obj, attr) for obj in obj_list]
+                    # We replace the current list of parent objects with that list.
+                    related_objs = [getattr(obj, attr) for obj in instances]
 
-                # Filter out 'None' so that we can continue with nullable
-                # relations.
-                obj_list = [obj for obj in obj_list if obj is not None]
+                    # Filter out 'None' so that we can continue with nullable
+                    # relations.
+                    level_obj_list.extend([obj for obj in related_objs
+                                           if obj is not None])
+            if done_query:
+                done_queries[current_lookup] = level_obj_list
+            obj_list = level_obj_list
+
+
+def get_prefetch_groups(instances, attr):
+    """
+    Splits `instances` in groups sharing the same prefetcher for 'attr'.
+    Returns a list of 5 tuples: the 4 items returned by get_prefetcher() for
+    the first instance of a group, and the instances of the group.
+
+    Instances are usually homogenous and make a single group. pg_django:
+    instances of mixed materialized view querysets are grouped by leaf model.
+    The leaves sharing a relation (declared on a common intermediate view)
+    make a single group, so that one query is run per relation. The leaves
+    which do not store the relation are left out.
+    """
+    first_obj = instances[0]
+    opts = getattr(first_obj, '_meta', None)
+    if getattr(opts, 'mat_view_base', None) is None:
+        return [get_prefetcher(first_obj, attr) + (instances,)]
+    by_class = SortedDict()
+    for obj in instances:
+        by_class.setdefault(obj.__class__, []).append(obj)
+    if len(by_class) == 1:
+        return [get_prefetcher(first_obj, attr) + (instances,)]
+
+    groups = SortedDict()
+    for objs in by_class.values():
+        prefetcher, descriptor, attr_found, is_fetched = get_prefetcher(objs[0], attr)
+        field = getattr(descriptor, 'field', None)
+        if not attr_found or getattr(field, 'acquired', False):
+            # the leaf only inherits the copy of the relation of a view
+            continue
+        if field is not None:
+            key = (descriptor.__class__, field.name, field.rel.to)
+        else:
+            key = descriptor or objs[0].__class__
+        if key in groups:
+            groups[key][4].extend(objs)
+        else:
+            groups[key] = (prefetcher, descriptor, attr_found, is_fetched, objs)
+    if not groups:
+        return [(None, None, False, False, instances)]
+    return groups.values()
 
 
 def get_prefetcher(instance, attr):
@@ -1728,19 +2439,23 @@ def get_prefetcher(instance, attr):
     return prefetcher, rel_obj_descriptor, attr_found, is_fetched
 
 
-def prefetch_one_level(instances, prefetcher, attname):
+def prefetch_one_level(instances, prefetcher, attname, queryset=None,
+                       chunk_size=None):
     """
     Helper function for prefetch_related_objects
 
     Runs prefetches on all instances using the prefetcher object,
-    assigning results to relevant caches in instance.
+    assigning results to relevant caches in instance. The related objects are
+    fetched with `queryset` when it is given, for at most `chunk_size`
+    instances per query.
 
     The prefetched objects are returned, along with any additional
     prefetches that must be done due to prefetch_related lookups
     found from default managers.
     """
     # prefetcher must have a method get_prefetch_query_set() which takes a list
-    # of instances, and returns a tuple:
+    # of instances, and optionally the queryset to start from, and returns a
+    # tuple:
 
     # (queryset of instances of self.model that are related to passed in instances,
     #  callable that gets value to be matched for returned instances,
@@ -1751,20 +2466,26 @@ def prefetch_one_level(instances, prefetcher, attname):
     # The 'values to be matched' must be hashable as they will be used
     # in a dictionary.
 
-    rel_qs, rel_obj_attr, instance_attr, single, cache_name =\
-        prefetcher.get_prefetch_query_set(instances)
-    # We have to handle the possibility that the default manager itself added
-    # prefetch_related lookups to the QuerySet we just got back. We don't want to
-    # trigger the prefetch_related functionality by evaluating the query.
-    # Rather, we need to merge in the prefetch_related lookups.
-    additional_prl = getattr(rel_qs, '_prefetch_related_lookups', [])
-    if additional_prl:
-        # Don't need to clone because the manager should have given us a fresh
-        # instance, so we access an internal instead of using public interface
-        # for performance reasons.
-        rel_qs._prefetch_related_lookups = []
-
-    all_related_objects = list(rel_qs)
+    all_related_objects = []
+    additional_prl = []
+    for chunk in _chunks(instances, chunk_size or len(instances)):
+        if queryset is None:
+            result = prefetcher.get_prefetch_query_set(chunk)
+        else:
+            result = prefetcher.get_prefetch_query_set(chunk, queryset)
+        rel_qs, rel_obj_attr, instance_attr, single, cache_name = result
+        # We have to handle the possibility that the default manager itself added
+        # prefetch_related lookups to the QuerySet we just got back. We don't want to
+        # trigger the prefetch_related functionality by evaluating the query.
+        # Rather, we need to merge in the prefetch_related lookups.
+        additional_prl = getattr(rel_qs, '_prefetch_related_lookups', [])
+        if additional_prl:
+            # Don't need to clone because the manager should have given us a fresh
+            # instance, so we access an internal instead of using public interface
+            # for performance reasons.
+            rel_qs._prefetch_related_lookups = []
+
+        all_related_objects.extend(rel_qs)
 
     rel_obj_cache = {}
     for rel_obj in all_related_objects:
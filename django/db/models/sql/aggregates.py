@@ -14,6 +14,8 @@ class Aggregate(object):
     """
     is_ordinal = False
     is_computed = False
+    is_aggregate = True
+    is_raw = False
     sql_template = '%(function)s(%(field)s)'
 
     def __init__(self, col, source=None, is_summary=False, **extra):
@@ -39,6 +41,11 @@ class Aggregate(object):
          * is_computed, a boolean indicating if this output of this aggregate
            is a computed float (e.g., an average), regardless of the input
            type.
+         * is_aggregate, a boolean indicating if this is an aggregate function.
+           Otherwise (e.g., an array length) it is computed for each row and
+           the query is grouped by its value.
+         * is_raw, a boolean indicating if the output of this aggregate is
+           returned as is by the database (e.g., an array).
 
         """
         self.col = col
@@ -119,3 +126,23 @@ class Variance(Aggregate):
     def __init__(self, col, sample=False, **extra):
         super(Variance, self).__init__(col, **extra)
         self.sql_function = sample and 'VAR_SAMP' or 'VAR_POP'
+
+# pg-django only
+
+class ArrayAgg(Aggregate):
+    is_raw = True
+    sql_function = 'ARRAY_AGG'
+    sql_template = '%(function)s(%(distinct)s%(field)s)'
+
+    def __init__(self, col, distinct=False, **extra):
+        super(ArrayAgg, self).__init__(col, distinct=distinct and 'DISTINCT ' or '', **extra)
+
+class ArrayLength(Aggregate):
+    is_ordinal = True
+    is_aggregate = False
+    sql_function = 'CARDINALITY'
+
+class Unnest(Aggregate):
+    is_aggregate = False
+    is_raw = True
+    sql_function = 'UNNEST'
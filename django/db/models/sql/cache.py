@@ -0,0 +1,84 @@
+"""
+The cache of the SQL compiled for the queries of a given shape.
+
+Querysets opting in with QuerySet.cached_sql() look their SQL up by the shape
+of their query (see Query.get_shape()): everything the SQL depends on but the
+values of the filters. On a hit, the compiler only prepares the values of the
+filters (see WhereNode.get_params()).
+"""
+import threading
+
+from django.conf import settings
+
+
+class LRUCache(object):
+    """
+    A thread-safe mapping holding at most `size` items (by default
+    settings.SQL_CACHE_SIZE), evicting the least recently used ones. The hits
+    and misses of get() are counted.
+    """
+    def __init__(self, size=None):
+        self._size = size
+        self._lock = threading.Lock()
+        self.clear()
+
+    @property
+    def size(self):
+        if self._size is None:
+            return settings.SQL_CACHE_SIZE
+        return self._size
+
+    def clear(self):
+        """Remove all the items and reset the counters"""
+        with self._lock:
+            self.hits = self.misses = 0
+            self._items = {}
+            # a circular doubly linked list of [prev, next, key, value], from
+            # the least to the most recently used item
+            root = self._root = []
+            root[:] = [root, root, None, None]
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, default=None):
+        with self._lock:
+            link = self._items.get(key)
+            if link is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            prev, next, _, value = link
+            # move the item to the end of the list
+            prev[1], next[0] = next, prev
+            last = self._root[0]
+            last[1] = self._root[0] = link
+            link[0], link[1] = last, self._root
+            return value
+
+    def set(self, key, value):
+        size = self.size
+        if not size:
+            return
+        with self._lock:
+            link = self._items.pop(key, None)
+            if link is not None:
+                link[0][1], link[1][0] = link[1], link[0]
+            elif len(self._items) >= size:
+                # evict the least recently used item
+                oldest = self._root[1]
+                oldest[0][1], oldest[1][0] = oldest[1], oldest[0]
+                del self._items[oldest[2]]
+            last = self._root[0]
+            link = [last, self._root, key, value]
+            last[1] = self._root[0] = self._items[key] = link
+
+    def info(self):
+        """Return a dictionary of the hits, misses, current and maximum size
+        of the cache"""
+        return {'hits': self.hits, 'misses': self.misses,
+                'currsize': len(self._items), 'maxsize': self.size}
+
+
+# the SQL of the queries, by shape
+sql_cache = LRUCache()
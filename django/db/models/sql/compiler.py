@@ -3,11 +3,14 @@ from itertools import izip
 from django.core.exceptions import FieldError
 from django.db import transaction
 from django.db.backends.util import truncate_name
+from django.db.models.fields import AutoField, IntegerField
 from django.db.models.query_utils import select_related_descend
+from django.db.models.sql.cache import sql_cache
 from django.db.models.sql.constants import *
 from django.db.models.sql.datastructures import EmptyResultSet
 from django.db.models.sql.expressions import SQLEvaluator
 from django.db.models.sql.query import get_order_dir, Query
+from django.db.models.sql.where import Constraint, EmptyShortCircuit, OR
 from django.db.utils import DatabaseError
 
 
@@ -34,6 +37,71 @@ class SQLCompiler(object):
         if self.query.select_related and not self.query.related_select_cols:
             self.fill_related_selections()
 
+    def get_leaf_pruning(self):
+        """
+        pg_django: returns the condition restricting a query on a materialized
+        or intermediate view to the leaves its filters can match, or an empty
+        string if any leaf can match.
+
+        Filters on pgd_child_type and on columns stored by some leaves only
+        (which are NULL in the rows of the other leaves) are taken into
+        account. Raises EmptyResultSet if no leaf can match.
+        """
+        opts = self.query.model._meta
+        if (not (opts.materialized_view or opts.intermediate) or
+                not self.connection.features.support_materialized_view_base):
+            return ''
+        alias = self.query.tables[0]
+        leaf_ids = self.get_where_leaf_ids(self.query.where, alias)
+        if leaf_ids is None:
+            return ''
+        all_ids = set(opts.leaf_ids)
+        leaf_ids = leaf_ids & all_ids
+        if not leaf_ids:
+            raise EmptyResultSet
+        if leaf_ids == all_ids:
+            return ''
+        return '%s.%s IN (%s)' % (self.quote_name_unless_alias(alias),
+                                  self.connection.ops.quote_name('pgd_child_type'),
+                                  ', '.join([str(i) for i in sorted(leaf_ids)]))
+
+    def get_where_leaf_ids(self, node, alias):
+        """
+        Returns the set of the ids of the leaves the where node `node` can
+        match, or None if it does not restrict the leaves.
+        """
+        if getattr(node, 'negated', False):
+            return None
+        if isinstance(node, tuple):
+            constraint, lookup_type, _, value = node
+            if not isinstance(constraint, Constraint) or constraint.alias != alias:
+                return None
+            if constraint.col == 'pgd_child_type':
+                if lookup_type == 'exact' and isinstance(value, (int, long)):
+                    return set([value])
+                if lookup_type == 'in' and isinstance(value, (list, tuple, set)):
+                    return set(value)
+                return None
+            if lookup_type == 'isnull' and value:
+                return None
+            leaf_ids = self.query.model._meta.get_column_leaf_ids(constraint.col)
+            if leaf_ids == set(self.query.model._meta.leaf_ids):
+                return None
+            return leaf_ids
+        children = getattr(node, 'children', None)
+        if not children:
+            return None
+        children_ids = [self.get_where_leaf_ids(child, alias)
+                        for child in children]
+        if node.connector == OR:
+            if None in children_ids:
+                return None
+            return reduce(set.union, children_ids)
+        children_ids = [ids for ids in children_ids if ids is not None]
+        if not children_ids:
+            return None
+        return reduce(set.intersection, children_ids)
+
     def quote_name_unless_alias(self, name):
         """
         A wrapper around connection.ops.quote_name that doesn't quote aliases
@@ -57,10 +125,65 @@ class SQLCompiler(object):
 
         If 'with_limits' is False, any limit/offset information is not included
         in the query.
+
+        The SQL of the queries using the SQL cache (QuerySet.cached_sql()) is
+        looked up by the shape of the query first.
         """
         if with_limits and self.query.low_mark == self.query.high_mark:
             return '', ()
+        if self.query.use_sql_cache:
+            key = self.get_sql_cache_key(with_limits, with_col_aliases)
+            if key is not None:
+                return self.as_cached_sql(key, with_limits, with_col_aliases)
+        return self.build_sql(with_limits, with_col_aliases)
+
+    def get_sql_cache_key(self, with_limits, with_col_aliases):
+        """
+        Returns the key of the SQL of the query in the SQL cache, or None if
+        it can't be cached.
+        """
+        if (not sql_cache.size or
+                self.connection.features.interprets_empty_strings_as_nulls):
+            return None
+        shape = self.query.get_shape(self.connection)
+        if shape is None:
+            return None
+        key = (self.__class__, self.connection.alias, with_limits,
+               with_col_aliases, shape)
+        try:
+            hash(key)
+        except TypeError:
+            # e.g. a filter on a mutable value
+            return None
+        return key
 
+    def as_cached_sql(self, key, with_limits, with_col_aliases):
+        """
+        Returns the SQL of the query from the SQL cache, and the parameters
+        of its filters. On a miss, the SQL is built and cached.
+        """
+        entry = sql_cache.get(key)
+        try:
+            params = tuple(self.query.where.get_params(self.connection))
+        except EmptyShortCircuit:
+            return self.build_sql(with_limits, with_col_aliases)
+        if entry is not None:
+            sql, ordering_aliases, related_select_fields = entry
+            # the state results_iter() expects from pre_sql_setup()
+            self.query.ordering_aliases = list(ordering_aliases)
+            if related_select_fields:
+                self.query.related_select_fields = list(related_select_fields)
+            return sql, params
+        sql, sql_params = self.build_sql(with_limits, with_col_aliases)
+        if sql_params == params:
+            sql_cache.set(key, (sql, list(self.query.ordering_aliases),
+                                list(self.query.related_select_fields)))
+        return sql, sql_params
+
+    def build_sql(self, with_limits=True, with_col_aliases=False):
+        """
+        Builds the SQL of the query (see as_sql()).
+        """
         self.pre_sql_setup()
         # After executing the query, we must get rid of any joins the query
         # setup created. So, take note of alias counts before the query ran.
@@ -80,6 +203,9 @@ class SQLCompiler(object):
         qn = self.quote_name_unless_alias
 
         where, w_params = self.query.where.as_sql(qn=qn, connection=self.connection)
+        leaf_pruning = self.get_leaf_pruning()
+        if leaf_pruning:
+            where = where and '(%s) AND %s' % (where, leaf_pruning) or leaf_pruning
         having, h_params = self.query.having.as_sql(qn=qn, connection=self.connection)
         params = []
         for val in self.query.extra_select.itervalues():
@@ -542,7 +668,12 @@ class SQLCompiler(object):
         """
         qn = self.quote_name_unless_alias
         result, params = [], []
-        if self.query.group_by is not None:
+        aggregates = self.query.aggregates.values()
+        # the annotations computed for each row (e.g., an array length) are
+        # grouped by, like the columns
+        row_values = [a for a in aggregates if not a.is_aggregate]
+        if (self.query.group_by is not None and
+                not (aggregates and len(row_values) == len(aggregates))):
             if (len(self.query.model._meta.fields) == len(self.query.select) and
                 self.connection.features.allows_group_by_pk):
                 self.query.group_by = [
@@ -556,7 +687,7 @@ class SQLCompiler(object):
                 extra_selects.append(extra_select)
                 params.extend(extra_params)
             cols = (group_by + self.query.select +
-                self.query.related_select_cols + extra_selects)
+                self.query.related_select_cols + extra_selects + row_values)
             seen = set()
             for col in cols:
                 if col in seen:
@@ -615,7 +746,9 @@ class SQLCompiler(object):
             avoid = avoid_set.copy()
             dupe_set = orig_dupe_set.copy()
             table = f.rel.to._meta.db_table
-            promote = nullable or f.null
+            # the relations of some leaves of a materialized or intermediate
+            # view are NULL in the rows of the other leaves
+            promote = nullable or f.null or opts.is_leaf_column(f.column)
             if model:
                 int_opts = opts
                 alias = root_alias
@@ -814,6 +947,10 @@ class SQLCompiler(object):
             else:
                 return
 
+        if (result_type == MULTI and self.query.stream_chunk_size and
+                self.connection.features.supports_server_side_cursors):
+            return self.stream_results(sql, params)
+
         cursor = self.connection.cursor()
         cursor.execute(sql, params)
 
@@ -838,6 +975,30 @@ class SQLCompiler(object):
             return list(result)
         return result
 
+    def stream_results(self, sql, params):
+        """
+        Yields the blocks of rows of the query, fetched query.stream_chunk_size
+        at a time from a server-side cursor, so that only one block is held
+        in memory.
+
+        Out of managed transactions, the cursor is declared WITH HOLD: it
+        survives the commits done while the rows are consumed (e.g. by
+        save()), the rows not fetched yet being then kept by the server.
+        """
+        cursor = self.connection.server_side_cursor(
+            withhold=not transaction.is_managed(self.using))
+        try:
+            cursor.execute(sql, params)
+            trim = len(self.query.ordering_aliases)
+            chunk_size = self.query.stream_chunk_size
+            for rows in iter((lambda: cursor.fetchmany(chunk_size)),
+                    self.connection.features.empty_fetchmany_value):
+                if trim:
+                    rows = [r[:-trim] for r in rows]
+                yield rows
+        finally:
+            cursor.close()
+
 
 class SQLInsertCompiler(SQLCompiler):
     def placeholder(self, field, val):
@@ -877,6 +1038,12 @@ class SQLInsertCompiler(SQLCompiler):
             fields = [None]
         can_bulk = (not any(hasattr(field, "get_placeholder") for field in fields) and
             not self.return_id and self.connection.features.has_bulk_insert)
+        on_conflict = []
+        if self.query.on_conflict:
+            conflict_fields, update_fields = self.query.on_conflict
+            on_conflict.append(self.connection.ops.on_conflict_sql(
+                opts.db_table, [f.column for f in conflict_fields],
+                [f.column for f in update_fields]))
 
         if can_bulk:
             placeholders = [["%s"] * len(fields)]
@@ -886,30 +1053,56 @@ class SQLInsertCompiler(SQLCompiler):
                 for val in values
             ]
         if self.return_id and self.connection.features.can_return_id_from_insert:
-            params = params[0]
             col = "%s.%s" % (qn(opts.db_table), qn(opts.pk.column))
-            result.append("VALUES (%s)" % ", ".join(placeholders[0]))
-            r_fmt, r_params = self.connection.ops.return_insert_id()
+            if len(values) > 1:
+                # a single statement returning the ids of all the rows
+                params = [v for val in params for v in val]
+                result.append("VALUES %s" % ", ".join(
+                    ["(%s)" % ", ".join(p) for p in placeholders]))
+            else:
+                params = params[0]
+                result.append("VALUES (%s)" % ", ".join(placeholders[0]))
+            result.extend(on_conflict)
+            if self.query.on_conflict:
+                returning = self.query.returning_fields or [opts.pk]
+                col = ", ".join(["%s.%s" % (qn(opts.db_table), qn(f.column))
+                                 for f in returning])
+                r_fmt, r_params = self.connection.ops.return_upsert_id()
+            else:
+                r_fmt, r_params = self.connection.ops.return_insert_id()
             result.append(r_fmt % col)
             params += r_params
             return [(" ".join(result), tuple(params))]
         if can_bulk:
             result.append(self.connection.ops.bulk_insert_sql(fields, len(values)))
-            return [(" ".join(result), tuple([v for val in values for v in val]))]
+            return [(" ".join(result + on_conflict), tuple([v for val in values for v in val]))]
         else:
             return [
-                (" ".join(result + ["VALUES (%s)" % ", ".join(p)]), vals)
+                (" ".join(result + ["VALUES (%s)" % ", ".join(p)] + on_conflict), vals)
                 for p, vals in izip(placeholders, params)
             ]
 
     def execute_sql(self, return_id=False):
-        assert not (return_id and len(self.query.objs) != 1)
+        """
+        Runs the INSERT. If return_id is True, returns the id of the inserted
+        row or, if several objects are inserted (only supported when
+        features.can_return_ids_from_bulk_insert), the list of their ids.
+        Upserts return the list of the rows of their returning fields, ending
+        with whether the row was inserted.
+        """
+        bulk_return = len(self.query.objs) > 1
+        assert not (return_id and bulk_return and not
+                    self.connection.features.can_return_ids_from_bulk_insert)
         self.return_id = return_id
         cursor = self.connection.cursor()
         for sql, params in self.as_sql():
             cursor.execute(sql, params)
         if not (return_id and cursor):
             return
+        if self.query.on_conflict:
+            return cursor.fetchall()
+        if bulk_return:
+            return self.connection.ops.fetch_returned_insert_ids(cursor)
         if self.connection.features.can_return_id_from_insert:
             return self.connection.ops.fetch_returned_insert_id(cursor)
         return self.connection.ops.last_insert_id(cursor,
@@ -927,7 +1120,8 @@ class SQLDeleteCompiler(SQLCompiler):
         qn = self.quote_name_unless_alias
         result = ['DELETE FROM %s' % qn(self.query.tables[0])]
         where, params = self.query.where.as_sql(qn=qn, connection=self.connection)
-        result.append('WHERE %s' % where)
+        if where:
+            result.append('WHERE %s' % where)
         return ' '.join(result), tuple(params)
 
 class SQLUpdateCompiler(SQLCompiler):
@@ -937,6 +1131,8 @@ class SQLUpdateCompiler(SQLCompiler):
         parameters.
         """
         self.pre_sql_setup()
+        if self.query.bulk_values:
+            return self.as_bulk_sql()
         if not self.query.values:
             return '', ()
         table = self.query.tables[0]
@@ -976,6 +1172,84 @@ class SQLUpdateCompiler(SQLCompiler):
             result.append('WHERE %s' % where)
         return ' '.join(result), tuple(update_params + params)
 
+    def as_bulk_sql(self):
+        """
+        Creates the SQL of an update setting different values per row (see
+        UpdateQuery.add_bulk_update_values): an UPDATE ... FROM (VALUES ...)
+        on backends supporting it, CASE expressions on the primary key
+        otherwise.
+        """
+        table = self.query.tables[0]
+        qn = self.quote_name_unless_alias
+        qn2 = self.connection.ops.quote_name
+        pk_field = self.query.model._meta.pk
+        pk_col = '%s.%s' % (qn(table), qn2(pk_field.column))
+        fields = self.query.bulk_fields
+        rows = [
+            ([pk_field.get_db_prep_save(pk, connection=self.connection)] +
+             [f.get_db_prep_save(v, connection=self.connection)
+              for f, v in izip(fields, values)])
+            for pk, values in self.query.bulk_values
+        ]
+        all_fields = [pk_field] + fields
+        params = []
+        if self.connection.features.supports_update_from_values:
+            values = []
+            for i, row in enumerate(rows):
+                placeholders = [self.placeholder(f, v)
+                                for f, v in izip(all_fields, row)]
+                if not i:
+                    # the types of the VALUES columns are given by the first
+                    # row
+                    placeholders = ['CAST(%s AS %s)' % (p, self.cast_type(f))
+                                    for p, f in izip(placeholders, all_fields)]
+                values.append('(%s)' % ', '.join(placeholders))
+                params.extend(row)
+            alias = qn2('bulk_values')
+            result = ['UPDATE %s SET %s FROM (VALUES %s) AS %s (%s)' % (
+                qn(table),
+                ', '.join(['%s = %s.%s' % (qn2(f.column), alias, qn2(f.column))
+                           for f in fields]),
+                ', '.join(values), alias,
+                ', '.join([qn2(f.column) for f in all_fields])),
+                'WHERE %s = %s.%s' % (pk_col, alias, qn2(pk_field.column))]
+        else:
+            values = []
+            for i, field in enumerate(fields, 1):
+                cases = []
+                for row in rows:
+                    cases.append('WHEN %s THEN %s' % (
+                        self.placeholder(pk_field, row[0]),
+                        self.placeholder(field, row[i])))
+                    params.extend([row[0], row[i]])
+                values.append('%s = CASE %s %s END' % (
+                    qn2(field.column), pk_col, ' '.join(cases)))
+            params.extend([row[0] for row in rows])
+            result = ['UPDATE %s SET %s' % (qn(table), ', '.join(values)),
+                      'WHERE %s IN (%s)' % (pk_col, ', '.join(
+                          [self.placeholder(pk_field, row[0])
+                           for row in rows]))]
+        where, where_params = self.query.where.as_sql(qn=qn,
+                                                      connection=self.connection)
+        if where:
+            result.append('AND %s' % where)
+        return ' '.join(result), tuple(params + list(where_params))
+
+    def placeholder(self, field, val):
+        if hasattr(field, 'get_placeholder'):
+            return field.get_placeholder(val, self.connection)
+        return '%s'
+
+    def cast_type(self, field):
+        """
+        Returns the type the values of `field` are cast to in a VALUES list.
+        """
+        if isinstance(field, AutoField):
+            # serial is not a type
+            field = IntegerField()
+        return self.connection.ops.values_cast_type(
+            field.db_type(self.connection))
+
     def execute_sql(self, result_type):
         """
         Execute the specified update. Returns the number of rows affected by
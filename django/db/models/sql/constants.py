@@ -5,9 +5,13 @@ QUERY_TERMS = dict([(x, None) for x in (
     'exact', 'iexact', 'contains', 'icontains', 'gt', 'gte', 'lt', 'lte', 'in',
     'startswith', 'istartswith', 'endswith', 'iendswith', 'range', 'year',
     'month', 'day', 'week_day', 'isnull', 'search', 'regex', 'iregex','has_one',
-    'has_all', 'has'
+    'has_all', 'has', 'overlap', 'contained_by'
     )])
 
+# pg_django only. The transforms of array fields usable before a lookup type:
+# their length (tags__len), an element (tags__0) or a slice (tags__0_3).
+ARRAY_TRANSFORM_PATTERN = re.compile(r'^(len|\d+|\d+_\d+)$')
+
 # Size of each "chunk" for get_iterator calls.
 # Larger values are slightly faster at the expense of more storage space.
 GET_ITERATOR_CHUNK_SIZE = 100
@@ -59,10 +59,12 @@ class SQLEvaluator(object):
     # Vistor methods for final expression evaluation #
     ##################################################
 
-    def evaluate_node(self, node, qn, connection):
+    def evaluate_node(self, node, qn, connection, children=None):
+        if children is None:
+            children = node.children
         expressions = []
         expression_params = []
-        for child in node.children:
+        for child in children:
             if hasattr(child, 'evaluate'):
                 sql, params = child.evaluate(self, qn, connection)
             else:
@@ -87,8 +89,10 @@ class SQLEvaluator(object):
             return '%s.%s' % (qn(col[0]), qn(col[1])), ()
 
     def evaluate_date_modifier_node(self, node, qn, connection):
-        timedelta = node.children.pop()
-        sql, params = self.evaluate_node(node, qn, connection)
+        # the node may be evaluated again, e.g. by a clone of the query
+        timedelta = node.children[-1]
+        sql, params = self.evaluate_node(node, qn, connection,
+                                         node.children[:-1])
 
         if timedelta.days == 0 and timedelta.seconds == 0 and \
                 timedelta.microseconds == 0:
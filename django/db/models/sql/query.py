@@ -15,14 +15,14 @@ from django.utils.tree import Node
 from django.db import connections, DEFAULT_DB_ALIAS
 from django.db.models import signals
 from django.db.models.expressions import ExpressionNode
-from django.db.models.fields import FieldDoesNotExist
+from django.db.models.fields import FieldDoesNotExist, ArrayFieldBase
 from django.db.models.query_utils import InvalidQuery
 from django.db.models.sql import aggregates as base_aggregates_module
 from django.db.models.sql.constants import *
 from django.db.models.sql.datastructures import EmptyResultSet, Empty, MultiJoin
 from django.db.models.sql.expressions import SQLEvaluator
 from django.db.models.sql.where import (WhereNode, Constraint, EverythingNode,
-    ExtraWhere, AND, OR)
+    ExtraWhere, ArrayConstraint, AND, OR)
 from django.core.exceptions import FieldError
 
 __all__ = ['Query', 'RawQuery']
@@ -130,6 +130,10 @@ class Query(object):
         self.distinct_fields = []
         self.select_for_update = False
         self.select_for_update_nowait = False
+        # Number of rows fetched at once by QuerySet.stream()
+        self.stream_chunk_size = None
+        # Whether the compiled SQL is cached by shape (QuerySet.cached_sql())
+        self.use_sql_cache = False
         self.select_related = False
         self.related_select_cols = []
 
@@ -224,6 +228,53 @@ class Query(object):
 
         return connection.ops.compiler(self.compiler)(self, connection, using)
 
+    def get_shape(self, connection=None):
+        """
+        Returns a hashable summary of everything the SQL of this query depends
+        on but the values of its filters, so that queries of the same shape
+        compile to the same SQL. Returns None if the SQL depends on more than
+        that: extra(), aggregates, subqueries or expressions in the filters,
+        or the leaves of materialized views. The shape of the 'in' filters
+        compiled for `connection` to an array parameter doesn't depend on
+        the number of values.
+        """
+        opts = self.model._meta
+        if (self.extra or self.aggregates or self.having.children or
+                opts.materialized_view or opts.intermediate):
+            return None
+        if [col for col in self.select if not isinstance(col, tuple)]:
+            return None
+        if self.group_by is None:
+            group_by = None
+        elif [col for col in self.group_by if not isinstance(col, tuple)]:
+            return None
+        else:
+            group_by = tuple(self.group_by)
+        where = self.where.get_shape(connection)
+        if where is None:
+            return None
+
+        def freeze(value):
+            if isinstance(value, dict):
+                return frozenset([(k, freeze(v)) for k, v in value.iteritems()])
+            return value
+
+        return (self.__class__, self.model, where, tuple(self.select),
+                tuple([id(f) for f in self.select_fields]), tuple(self.tables),
+                freeze(self.alias_map), freeze(self.alias_refcount),
+                freeze(dict([(k, tuple(v))
+                             for k, v in self.table_map.iteritems()])),
+                freeze(self.included_inherited_models), group_by,
+                tuple(self.order_by), tuple(self.ordering_aliases),
+                tuple(self.extra_tables), tuple(self.extra_order_by),
+                self.default_cols, self.default_ordering,
+                self.standard_ordering, self.low_mark, self.high_mark,
+                self.distinct, tuple(self.distinct_fields),
+                self.select_for_update, self.select_for_update_nowait,
+                freeze(self.select_related), len(self.related_select_cols),
+                self.max_depth, frozenset(self.deferred_loading[0]),
+                self.deferred_loading[1])
+
     def get_meta(self):
         """
         Returns the Options instance (the model._meta) from which to start
@@ -256,22 +307,36 @@ class Query(object):
         obj.dupe_avoidance = self.dupe_avoidance.copy()
         obj.select = self.select[:]
         obj.tables = self.tables[:]
-        obj.where = copy.deepcopy(self.where, memo=memo)
+        if memo is None:
+            # The where and having trees are shared with the clone, only their
+            # roots are copied: WhereNode.relabel_aliases() copies the nodes
+            # it changes, and the others are only ever added to.
+            obj.where = self.where.clone()
+            obj.having = self.having.clone()
+        else:
+            obj.where = copy.deepcopy(self.where, memo=memo)
+            obj.having = copy.deepcopy(self.having, memo=memo)
         obj.where_class = self.where_class
         if self.group_by is None:
             obj.group_by = None
         else:
             obj.group_by = self.group_by[:]
-        obj.having = copy.deepcopy(self.having, memo=memo)
         obj.order_by = self.order_by[:]
         obj.low_mark, obj.high_mark = self.low_mark, self.high_mark
         obj.distinct = self.distinct
         obj.distinct_fields = self.distinct_fields[:]
         obj.select_for_update = self.select_for_update
         obj.select_for_update_nowait = self.select_for_update_nowait
+        obj.stream_chunk_size = self.stream_chunk_size
+        obj.use_sql_cache = self.use_sql_cache
         obj.select_related = self.select_related
         obj.related_select_cols = []
-        obj.aggregates = copy.deepcopy(self.aggregates, memo=memo)
+        if memo is None:
+            # Likewise, the aggregates are copied by change_aliases() before
+            # being relabelled.
+            obj.aggregates = self.aggregates.copy()
+        else:
+            obj.aggregates = copy.deepcopy(self.aggregates, memo=memo)
         if self.aggregate_select_mask is None:
             obj.aggregate_select_mask = None
         else:
@@ -294,7 +359,8 @@ class Query(object):
             obj._extra_select_cache = self._extra_select_cache.copy()
         obj.extra_tables = self.extra_tables
         obj.extra_order_by = self.extra_order_by
-        obj.deferred_loading = copy.deepcopy(self.deferred_loading, memo=memo)
+        # The sets of deferred_loading are replaced, never changed in place.
+        obj.deferred_loading = self.deferred_loading
         if self.filter_is_sticky and self.used_aliases:
             obj.used_aliases = self.used_aliases.copy()
         else:
@@ -333,6 +399,9 @@ class Query(object):
         elif aggregate.is_computed:
             # Any computed aggregate (e.g., avg) returns a float
             return float(value)
+        elif aggregate.is_raw:
+            # e.g., arrays and their elements
+            return value
         else:
             # Return value depends on the type of the field being processed.
             return self.convert_values(value, aggregate.field, connection)
@@ -508,7 +577,7 @@ class Query(object):
         # Now relabel a copy of the rhs where-clause and add it to the current
         # one.
         if rhs.where:
-            w = copy.deepcopy(rhs.where)
+            w = rhs.where.clone()
             w.relabel_aliases(change_map)
             if not self.where:
                 # Since 'self' matches everything, add an explicit "include
@@ -763,6 +832,8 @@ class Query(object):
                     old_alias = col[0]
                     mapping[key] = (change_map.get(old_alias, old_alias), col[1])
                 else:
+                    # the aggregates may be shared with the clones of the query
+                    col = mapping[key] = copy.copy(col)
                     col.relabel_aliases(change_map)
 
         # 2. Rename the alias in the internal table/alias datastructures.
@@ -1027,6 +1098,23 @@ class Query(object):
         # Add the aggregate to the query
         aggregate.add_to_query(self, alias, col=col, source=source, is_summary=is_summary)
 
+    def is_array_lookup(self, parts):
+        """
+        Returns True if the lookup 'parts' (a list of field names) leads to an
+        array field (pg-django only).
+        """
+        opts = self.get_meta()
+        for counter, name in enumerate(parts):
+            try:
+                field = opts.get_field(name)
+            except FieldDoesNotExist:
+                return False
+            if counter + 1 < len(parts):
+                if not field.rel:
+                    return False
+                opts = field.rel.to._meta
+        return isinstance(field, ArrayFieldBase)
+
     def add_filter(self, filter_expr, connector=AND, negate=False, trim=False,
             can_reuse=None, process_extras=True, force_having=False):
         """
@@ -1084,6 +1172,13 @@ class Query(object):
                         lookup_type = parts.pop()
                         break
 
+        # pg-django: the length, an element or a slice of an array field may
+        # be compared instead of the whole array.
+        array_transform = None
+        if (len(parts) > 1 and ARRAY_TRANSFORM_PATTERN.match(parts[-1]) and
+                self.is_array_lookup(parts[:-1])):
+            array_transform = parts.pop()
+
         # By default, this is a WHERE clause. If an aggregate is referenced
         # in the value, the filter will be promoted to a HAVING
         having_clause = False
@@ -1175,14 +1270,16 @@ class Query(object):
             self.promote_alias_chain(join_it, join_promote)
             self.promote_alias_chain(table_it, table_promote or join_promote)
 
+        if array_transform is None:
+            constraint = Constraint(alias, col, field)
+        else:
+            constraint = ArrayConstraint(alias, col, field, array_transform)
         if having_clause or force_having:
             if (alias, col) not in self.group_by:
                 self.group_by.append((alias, col))
-            self.having.add((Constraint(alias, col, field), lookup_type, value),
-                connector)
+            self.having.add((constraint, lookup_type, value), connector)
         else:
-            self.where.add((Constraint(alias, col, field), lookup_type, value),
-                connector)
+            self.where.add((constraint, lookup_type, value), connector)
 
         if negate:
             self.promote_alias_chain(join_list)
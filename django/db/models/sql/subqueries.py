@@ -43,6 +43,25 @@ class DeleteQuery(Query):
                     pk_list[offset:offset + GET_ITERATOR_CHUNK_SIZE]), AND)
             self.do_query(self.model._meta.db_table, where, using=using)
 
+    def delete_qs(self, query, using):
+        """
+        Delete the rows of the QuerySet `query` with a single query. Its
+        filters are used as they are when they don't join other tables, else
+        the rows are selected by primary key in a subquery.
+        """
+        innerq = query.query
+        innerq.get_initial_alias()
+        tables = [t for t in innerq.tables if innerq.alias_refcount[t]]
+        if (len(tables) == 1 and tables[0] == self.model._meta.db_table and
+                not innerq.extra_tables):
+            where = innerq.where
+        else:
+            pk = self.model._meta.pk
+            where = self.where_class()
+            where.add((Constraint(None, pk.column, pk), 'in',
+                       query.values('pk')), AND)
+        self.do_query(self.model._meta.db_table, where, using=using)
+
 class UpdateQuery(Query):
     """
     Represents an "update" SQL query.
@@ -61,6 +80,10 @@ class UpdateQuery(Query):
         are also set up after a clone() call.
         """
         self.values = []
+        # the fields and (pk, values) rows of an update setting different
+        # values per row
+        self.bulk_fields = []
+        self.bulk_values = []
         self.related_ids = None
         if not hasattr(self, 'related_updates'):
             self.related_updates = {}
@@ -108,6 +131,18 @@ class UpdateQuery(Query):
                       for value in values_seq]
         self.values.extend(values_seq)
 
+    def add_bulk_update_values(self, fields, rows):
+        """
+        Turns the query into an update of `fields` to different values per
+        row: `rows` is a sequence of (pk, [values of fields]) pairs. Only
+        the rows whose primary key is in `rows` are updated.
+        """
+        self.bulk_fields = fields
+        self.bulk_values = [
+            (pk, [force_unicode(v) if isinstance(v, Promise) else v
+                  for v in values])
+            for pk, values in rows]
+
     def add_related_update(self, model, field, value):
         """
         Adds (name, value) to an update query for an ancestor model.
@@ -143,12 +178,18 @@ class InsertQuery(Query):
         super(InsertQuery, self).__init__(*args, **kwargs)
         self.fields = []
         self.objs = []
+        # (conflict_fields, update_fields) of an upsert
+        self.on_conflict = None
+        # the fields returned by an upsert, the primary key by default
+        self.returning_fields = None
 
     def clone(self, klass=None, **kwargs):
         extras = {
             'fields': self.fields[:],
             'objs': self.objs[:],
             'raw': self.raw,
+            'on_conflict': self.on_conflict,
+            'returning_fields': self.returning_fields,
         }
         extras.update(kwargs)
         return super(InsertQuery, self).clone(klass, **extras)
@@ -173,6 +214,17 @@ class InsertQuery(Query):
         self.objs = objs
         self.raw = raw
 
+    def set_on_conflict(self, conflict_fields, update_fields,
+                        returning_fields=None):
+        """
+        Turns the insert into an upsert: the rows conflicting with existing
+        rows on conflict_fields update the update_fields of these rows
+        instead of failing. The statement returns the returning_fields (the
+        primary key by default) of each row, and whether it was inserted.
+        """
+        self.on_conflict = (list(conflict_fields), list(update_fields))
+        self.returning_fields = returning_fields
+
 class DateQuery(Query):
     """
     A DateQuery is a normal query, except that it specifically selects a single
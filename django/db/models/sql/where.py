@@ -4,11 +4,12 @@ Code to manage the creation and SQL rendering of 'where' constraints.
 
 from __future__ import absolute_import
 
+import copy
 import datetime
 from itertools import repeat
 
 from django.utils import tree
-from django.db.models.fields import Field
+from django.db.models.fields import Field, IntegerField
 from django.db.models.sql.datastructures import EmptyResultSet, FullResultSet
 from django.db.models.sql.aggregates import Aggregate
 
@@ -17,12 +18,43 @@ AND = 'AND'
 OR = 'OR'
 
 
+# pg-django only. The SQL operators of the array lookups
+ARRAY_OPERATORS = {
+    'has': '@>',
+    'has_all': '@>',
+    'has_one': '&&',
+    'overlap': '&&',
+    'contained_by': '<@',
+}
+
+# Fake field used to prepare the values compared to the length of arrays.
+array_length_field = IntegerField()
+
+
 def get_sql_type(lvalue):
     """ pg-djando only. find sql type of an array"""
     if isinstance(lvalue, tuple):
         return lvalue[2]
 
 
+def get_array_transform_sql(transform, lhs):
+    """pg-django only. Return the SQL for the length, an element or a slice
+    (see ArrayConstraint) of the array `lhs`"""
+    if transform == 'len':
+        return 'cardinality(%s)' % lhs
+    if '_' in transform:
+        start, stop = transform.split('_')
+        return '(%s)[%d:%d]' % (lhs, int(start) + 1, int(stop))
+    return '(%s)[%d]' % (lhs, int(transform) + 1)
+
+
+def is_expression(value):
+    """Return True if `value` is compiled into SQL (e.g. a subquery or an
+    F() expression) rather than passed as a parameter"""
+    return (hasattr(value, 'as_sql') or hasattr(value, '_as_sql') or
+            hasattr(value, 'evaluate') or hasattr(value, 'prepare'))
+
+
 class EmptyShortCircuit(Exception):
     """
     Internal exception used to indicate that a "matches nothing" node should be
@@ -134,6 +166,84 @@ class WhereNode(tree.Node):
                 sql_string = '(%s)' % sql_string
         return sql_string, result_params
 
+    def get_shape(self, connection=None):
+        """
+        Returns a hashable summary of everything the SQL of this node depends
+        on but the values of its constraints, or None if it depends on more
+        than that (e.g. a subquery, an expression or an extra() condition).
+        """
+        if type(self) is not WhereNode:
+            return None
+        shapes = []
+        for child in self.children:
+            if isinstance(child, WhereNode):
+                shape = child.get_shape(connection)
+            elif isinstance(child, tuple):
+                shape = self.get_atom_shape(child, connection)
+            else:
+                shape = None
+            if shape is None:
+                return None
+            shapes.append(shape)
+        return (self.connector, self.negated, tuple(shapes))
+
+    def get_atom_shape(self, child, connection=None):
+        """
+        Returns the shape (see get_shape()) of the tuple `child`, or None.
+        """
+        lvalue, lookup_type, value_annotation, value = child
+        if not isinstance(lvalue, Constraint) or is_expression(value):
+            return None
+        if hasattr(value, '__len__') and not isinstance(value, basestring):
+            if [v for v in value if is_expression(v)]:
+                return None
+            # the number of placeholders
+            length = len(value)
+            if lookup_type == 'in' and connection is not None:
+                db_type = (lvalue.field and
+                           lvalue.field.db_type(connection=connection) or None)
+                if self.uses_array_param(db_type, value, connection):
+                    # a single array parameter, whatever the number of values
+                    length = 'array'
+        else:
+            length = None
+        return (lvalue.__class__, lvalue.alias, lvalue.col,
+                getattr(lvalue, 'transform', None), lookup_type,
+                value_annotation, length)
+
+    def get_params(self, connection):
+        """
+        Returns the parameters of the SQL of this node, as as_sql() does, but
+        without building the SQL. Only valid for the nodes having a shape (see
+        get_shape()) whose SQL could be built.
+        """
+        params = []
+        for child in self.children:
+            if isinstance(child, WhereNode):
+                params.extend(child.get_params(connection))
+                continue
+            lvalue, lookup_type, value_annotation, value = child
+            if lookup_type == 'isnull' or (lookup_type == 'in' and
+                                           not value_annotation):
+                # no parameter, or an empty constraint left out of the SQL
+                continue
+            lvalue, child_params = lvalue.process(lookup_type, value, connection)
+            if lookup_type == 'in' and self.uses_array_param(
+                    lvalue[2], child_params, connection):
+                child_params = [list(child_params)]
+            params.extend(child_params)
+        return params
+
+    def uses_array_param(self, db_type, params, connection):
+        """
+        Returns whether the 'in' lookup of a column of the database type
+        `db_type` with the parameters `params` is compiled to a comparison
+        with a single array parameter (see DatabaseOperations.in_array_sql()).
+        """
+        threshold = connection.ops.in_array_threshold()
+        return (threshold is not None and len(params) >= threshold and
+                not (db_type and db_type.endswith(']')))
+
     def make_atom(self, child, qn, connection):
         """
         Turn a tuple (Constraint(table_alias, column_name, db_type),
@@ -190,6 +300,10 @@ class WhereNode(tree.Node):
                 raise EmptyResultSet
             if extra:
                 return ('%s IN %s' % (field_sql, extra), params)
+            db_type = isinstance(lvalue, tuple) and lvalue[2] or None
+            if self.uses_array_param(db_type, params, connection):
+                return (connection.ops.in_array_sql(field_sql, db_type),
+                        [list(params)])
             max_in_list_size = connection.ops.max_in_list_size()
             if max_in_list_size and len(params) > max_in_list_size:
                 # Break up the params list into an OR of manageable chunks.
@@ -225,13 +339,14 @@ class WhereNode(tree.Node):
         # @> is faster than ANY. ANY can't use GIN indexes
         #elif lookup_type == 'has':
             #return (' %%s = ANY (%s)' % field_sql, params)
-        elif lookup_type in ('has_all', 'has'):
-            return ('%s @> ARRAY[%s]::%s' % (field_sql,
-                                        ', '.join(repeat('%s', len(params))),
-                                            get_sql_type(lvalue)),
-                    params)
-        elif lookup_type == 'has_one':
-            return ('%s && ARRAY[%s]::%s' % (field_sql,
+        elif lookup_type in ARRAY_OPERATORS:
+            operator = ARRAY_OPERATORS[lookup_type]
+            if extra:
+                # the elements are selected by a subquery
+                return ('%s %s ARRAY%s::%s' % (field_sql, operator, extra,
+                                                get_sql_type(lvalue)),
+                        params)
+            return ('%s %s ARRAY[%s]::%s' % (field_sql, operator,
                                         ', '.join(repeat('%s', len(params))),
                                             get_sql_type(lvalue)),
                     params)
@@ -245,37 +360,56 @@ class WhereNode(tree.Node):
         constraint (for example, the "T1.foo" portion in the clause
         "WHERE ... T1.foo = 6").
         """
-        table_alias, name, db_type = data
+        table_alias, name, db_type = data[:3]
         if table_alias:
             lhs = '%s.%s' % (qn(table_alias), qn(name))
         else:
             lhs = qn(name)
+        if len(data) > 3:
+            # pg-django only, see ArrayConstraint
+            lhs = get_array_transform_sql(data[3], lhs)
         return connection.ops.field_cast_sql(db_type) % lhs
 
     def relabel_aliases(self, change_map, node=None):
         """
         Relabels the alias values of any children. 'change_map' is a dictionary
         mapping old (current) alias values to the new values.
+
+        The children are replaced by relabelled copies rather than changed in
+        place, since they may be shared with the clones of the query (see
+        Node.clone()).
         """
         if not node:
             node = self
         for pos, child in enumerate(node.children):
-            if hasattr(child, 'relabel_aliases'):
+            if isinstance(child, tree.Node):
+                child = child.clone()
+                if hasattr(child, 'relabel_aliases'):
+                    child.relabel_aliases(change_map)
+                else:
+                    self.relabel_aliases(change_map, child)
+            elif hasattr(child, 'relabel_aliases'):
+                child = copy.deepcopy(child)
                 child.relabel_aliases(change_map)
-            elif isinstance(child, tree.Node):
-                self.relabel_aliases(change_map, child)
             elif isinstance(child, (list, tuple)):
                 if isinstance(child[0], (list, tuple)):
                     elt = list(child[0])
                     if elt[0] in change_map:
                         elt[0] = change_map[elt[0]]
-                        node.children[pos] = (tuple(elt),) + child[1:]
+                    lvalue = tuple(elt)
                 else:
-                    child[0].relabel_aliases(change_map)
+                    lvalue = copy.copy(child[0])
+                    lvalue.relabel_aliases(change_map)
+                child = (lvalue,) + tuple(child[1:])
 
                 # Check if the query value also requires relabelling
                 if hasattr(child[3], 'relabel_aliases'):
-                    child[3].relabel_aliases(change_map)
+                    value = copy.deepcopy(child[3])
+                    value.relabel_aliases(change_map)
+                    child = child[:3] + (value,) + child[4:]
+            else:
+                continue
+            node.children[pos] = child
 
 class EverythingNode(object):
     """
@@ -370,3 +504,33 @@ class Constraint(object):
     def relabel_aliases(self, change_map):
         if self.alias in change_map:
             self.alias = change_map[self.alias]
+
+
+class ArrayConstraint(Constraint):
+    """
+    pg-django only. A Constraint on the length (``len``), an element (e.g.
+    ``0``) or a slice (e.g. ``0_3``) of an array column. As in python, indexes
+    start at 0 and slices exclude their upper bound.
+    """
+    def __init__(self, alias, col, field, transform):
+        super(ArrayConstraint, self).__init__(alias, col, field)
+        self.transform = transform
+
+    def get_lookup_field(self):
+        """Return the field preparing the values compared to the transformed
+        column"""
+        if self.transform == 'len':
+            return array_length_field
+        if '_' in self.transform:
+            return self.field
+        return self.field.subinstance
+
+    def prepare(self, lookup_type, value):
+        return self.get_lookup_field().get_prep_lookup(lookup_type, value)
+
+    def process(self, lookup_type, value, connection):
+        field = self.get_lookup_field()
+        params = field.get_db_prep_lookup(lookup_type, value,
+            connection=connection, prepared=True)
+        db_type = field.db_type(connection=connection)
+        return (self.alias, self.col, db_type, self.transform), params
@@ -18,20 +18,31 @@ class Signal(object):
     
         receivers
             { receriverkey (id) : weakref(receiver) }
+
+        sender_receivers_cache
+            { sender : [weakref(receiver)] }, when use_caching is set
     """
     
-    def __init__(self, providing_args=None):
+    def __init__(self, providing_args=None, use_caching=False):
         """
         Create a new signal.
         
         providing_args
             A list of the arguments this signal can pass along in a send() call.
+
+        use_caching
+            Whether to cache the receivers connected for each sender, until a
+            receiver is connected, disconnected or garbage collected. Only
+            worth it for the signals sent many times by a few long lived
+            senders, such as the model signals.
         """
         self.receivers = []
         if providing_args is None:
             providing_args = []
         self.providing_args = set(providing_args)
         self.lock = threading.Lock()
+        self.use_caching = use_caching
+        self.sender_receivers_cache = weakref.WeakKeyDictionary()
 
     def connect(self, receiver, sender=None, weak=True, dispatch_uid=None):
         """
@@ -106,6 +117,9 @@ class Signal(object):
                     break
             else:
                 self.receivers.append((lookup_key, receiver))
+            # replaced rather than cleared, so that a list of receivers
+            # computed before the change lands in the old cache
+            self.sender_receivers_cache = weakref.WeakKeyDictionary()
         finally:
             self.lock.release()
 
@@ -143,6 +157,9 @@ class Signal(object):
                 if r_key == lookup_key:
                     del self.receivers[index]
                     break
+            # replaced rather than cleared, so that a list of receivers
+            # computed before the change lands in the old cache
+            self.sender_receivers_cache = weakref.WeakKeyDictionary()
         finally:
             self.lock.release()
 
@@ -168,7 +185,7 @@ class Signal(object):
         if not self.receivers:
             return responses
 
-        for receiver in self._live_receivers(_make_id(sender)):
+        for receiver in self._live_receivers(sender):
             response = receiver(signal=self, sender=sender, **named)
             responses.append((receiver, response))
         return responses
@@ -202,7 +219,7 @@ class Signal(object):
 
         # Call each receiver with whatever arguments it can accept.
         # Return a list of tuple pairs [(receiver, response), ... ].
-        for receiver in self._live_receivers(_make_id(sender)):
+        for receiver in self._live_receivers(sender):
             try:
                 response = receiver(signal=self, sender=sender, **named)
             except Exception, err:
@@ -211,25 +228,58 @@ class Signal(object):
                 responses.append((receiver, response))
         return responses
 
-    def _live_receivers(self, senderkey):
+    def has_listeners(self, sender=None):
         """
-        Filter sequence of receivers to get resolved, live receivers.
+        Return whether any live receiver is connected for sender, which lets
+        the callers sending the signal very often skip preparing its
+        arguments when nobody listens.
+        """
+        if not self.receivers:
+            return False
+        return bool(self._live_receivers(sender))
 
-        This checks for weak references and resolves them, then returning only
-        live receivers.
+    def _sender_receivers(self, sender):
+        """
+        Return the receivers connected for sender, which may be weak
+        references, from the cache when use_caching is set.
         """
+        cache = None
+        if self.use_caching:
+            cache = self.sender_receivers_cache
+            try:
+                receivers = cache.get(sender)
+            except TypeError:
+                # sender can't be weakly referenced, e.g. None
+                cache = receivers = None
+            if receivers is not None:
+                return receivers
+
         none_senderkey = _make_id(None)
+        senderkey = _make_id(sender)
         receivers = []
-
         for (receiverkey, r_senderkey), receiver in self.receivers:
             if r_senderkey == none_senderkey or r_senderkey == senderkey:
-                if isinstance(receiver, WEAKREF_TYPES):
-                    # Dereference the weak reference.
-                    receiver = receiver()
-                    if receiver is not None:
-                        receivers.append(receiver)
-                else:
+                receivers.append(receiver)
+        if cache is not None:
+            cache[sender] = receivers
+        return receivers
+
+    def _live_receivers(self, sender):
+        """
+        Filter sequence of receivers to get resolved, live receivers.
+
+        This checks for weak references and resolves them, then returning only
+        live receivers.
+        """
+        receivers = []
+        for receiver in self._sender_receivers(sender):
+            if isinstance(receiver, WEAKREF_TYPES):
+                # Dereference the weak reference.
+                receiver = receiver()
+                if receiver is not None:
                     receivers.append(receiver)
+            else:
+                receivers.append(receiver)
         return receivers
 
     def _remove_receiver(self, receiver):
@@ -250,6 +300,9 @@ class Signal(object):
                 for idx, (r_key, _) in enumerate(reversed(self.receivers)):
                     if r_key == key:
                         del self.receivers[last_idx-idx]
+            # a cached list of receivers may still hold the dead ones, which
+            # are skipped anyway
+            self.sender_receivers_cache.clear()
         finally:
             self.lock.release()
 
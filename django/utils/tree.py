@@ -62,6 +62,17 @@ class Node(object):
         obj.subtree_parents = copy.deepcopy(self.subtree_parents, memodict)
         return obj
 
+    def clone(self):
+        """
+        Returns a copy of the node sharing its children with it. Only the node
+        itself is copied, so the children must not be changed in place
+        afterwards: the methods of this class only ever change the node they
+        are called on.
+        """
+        obj = self._new_instance(self.children, self.connector, self.negated)
+        obj.subtree_parents = [node.clone() for node in self.subtree_parents]
+        return obj
+
     def __len__(self):
         """
         The size of a node if the number of children it has.
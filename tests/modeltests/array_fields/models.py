@@ -1,3 +1,5 @@
+import array
+
 from django.db import models
 
 TEST_SKIP_UNLESS_DB_FEATURES = ['support_arrays']
@@ -33,21 +35,31 @@ class MiscArraysItem(Item):
     these fields. Write deeper tests for those and remove them from here"""
 
     boolean = models.BooleanArrayField()
-    #date = models.DateArrayField()
-    #date_time = models.DateTimeArrayField()
-    #decimal = models.DecimalArrayField(max_digits=5, decimal_places=2)
+    date = models.DateArrayField()
+    date_time = models.DateTimeArrayField()
+    decimal = models.DecimalArrayField(max_digits=5, decimal_places=2)
     email = models.EmailArrayField()
     filepath = models.FilePathArrayField()
     floatt = models.FloatArrayField()
     big_integer = models.BigIntegerArrayField()
-    #ip_address = models.IPAddressArrayField()
-    #generic_ip_address = models.GenericIPAddressArrayField()
+    ip_address = models.IPAddressArrayField()
+    generic_ip_address = models.GenericIPAddressArrayField()
     null_boolean = models.NullBooleanArrayField()
     #positive_integer = models.PositiveIntegerArrayField()
     #positive_small_integer = models.PositiveSmallIntegerArrayField()
     slug = models.SlugArrayField()
     small_integer = models.SmallIntegerArrayField()
-    #time = models.TimeArrayField()
+    time = models.TimeArrayField()
     url = models.URLArrayField()
 
 
+class MeasuredItem(Item):
+    # numeric arrays can be decoded into array.array (or numpy.ndarray)
+    # buffers
+    counts = models.IntegerArrayField(itertype=array.array)
+    measures = models.FloatArrayField(itertype=array.array)
+
+
+class Tag(models.Model):
+    name = models.CharField(max_length=10)
+    featured = models.BooleanField()
@@ -3,15 +3,25 @@ from __future__ import absolute_import
 from operator import attrgetter
 
 from django.core.exceptions import FieldError
+from django.db import models
+from django.db.models import ArrayAgg, ArrayLength, Count, Unnest
 from django.test import TestCase
+from django.utils import unittest
 
 from .models import (Item, TaggedItem, CommentedItem, RatedItem,
-                    MiscArraysItem)
+                    MiscArraysItem, MeasuredItem, Tag)
 
+import array
 import datetime
+from StringIO import StringIO
 from time import time
 import decimal
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 class ArrayFieldTestCase(TestCase):
 
     def test_CharArrayField(self):
@@ -137,21 +147,21 @@ class ArrayFieldTestCase(TestCase):
         of these fields should be full tested"""
         fields = dict(
             boolean=[True, False],
-            #date=[datetime.date.today()],
-            #date_time=[datetime.datetime.now()],
-            #decimal=[decimal.Decimal(42.42)],
+            date=[datetime.date.today()],
+            date_time=[datetime.datetime.now()],
+            decimal=[decimal.Decimal('42.42')],
             email=['aa@bb.cc'],
             filepath=['/a/path'],
             floatt=[42.42],
             big_integer=[4242424242424242424],
-            #ip_address=['42.42.42.42'],
-            #generic_ip_address=['2001:0db8:85a3:0000:0000:8a2e:0370:7334'],
+            ip_address=['42.42.42.42'],
+            generic_ip_address=['2001:db8:85a3::8a2e:370:7334'],
             null_boolean=[None,True,False],
             #positive_integer=[4242424242],
             #positive_small_integer=[42],
             slug=['a_slug'],
             small_integer=[-42],
-            #time=[datetime.time()],
+            time=[datetime.time()],
             url=['http://example.org'],
         )
 
@@ -172,3 +182,181 @@ class ArrayFieldTestCase(TestCase):
         for fn in fields:
             self.assertEqual(getattr(mai,fn), fields[fn])
 
+
+class ArrayFieldConversionTestCase(TestCase):
+
+    def test_native_elements(self):
+        """Elements already having the right python type are not converted
+        one by one"""
+        field = RatedItem._meta.get_field('rates')
+        values = range(1000)
+        self.assertTrue(field.has_native_elements(values))
+        self.assertIs(field.to_python(values), values)
+        self.assertFalse(field.has_native_elements(['1', 2]))
+        self.assertEqual(field.to_python(['1', 2]), [1, 2])
+        self.assertEqual(field.get_db_prep_save(['1', 2], None), [1, 2])
+
+        ri = RatedItem.objects.create(title='rated', rates=values)
+        ri = RatedItem.objects.get(pk=ri.pk)
+        self.assertEqual(ri.rates, values)
+
+        ci = CommentedItem.objects.create(title='commented',
+                                          comments=['a', u'\xe9'])
+        ci = CommentedItem.objects.get(pk=ci.pk)
+        self.assertEqual(ci.comments, [u'a', u'\xe9'])
+        self.assertTrue(all(isinstance(c, unicode) for c in ci.comments))
+
+    def test_array_itertype(self):
+        mi = MeasuredItem(title='measured', counts=[1, 2, 3],
+                          measures=[0.5, 1.5])
+        self.assertEqual(mi.counts, array.array('i', [1, 2, 3]))
+        self.assertEqual(mi.measures, array.array('d', [0.5, 1.5]))
+        mi.save()
+        mi = MeasuredItem.objects.get(pk=mi.pk)
+        self.assertEqual(mi.counts, array.array('i', [1, 2, 3]))
+        self.assertEqual(mi.measures, array.array('d', [0.5, 1.5]))
+        self.assertEqual(MeasuredItem.objects.filter(counts__has=2).count(),
+                         1)
+
+        mi = MeasuredItem.objects.create(title='empty')
+        mi = MeasuredItem.objects.get(pk=mi.pk)
+        self.assertEqual(mi.counts, array.array('i'))
+
+    def test_array_itertype_fallback(self):
+        """The values which don't fit in a typed buffer are left as lists"""
+        mi = MeasuredItem.objects.create(title='null', counts=[1, None])
+        mi = MeasuredItem.objects.get(pk=mi.pk)
+        self.assertEqual(mi.counts, [1, None])
+        self.assertEqual(mi.measures, array.array('d'))
+
+        mi = MeasuredItem.objects.create(title='nested',
+                                         counts=[[1, 2], [3, 4]])
+        mi = MeasuredItem.objects.get(pk=mi.pk)
+        self.assertEqual(mi.counts, [[1, 2], [3, 4]])
+        field = MeasuredItem._meta.get_field('counts')
+        self.assertEqual(field.to_python([['1', 2], [3, None]]),
+                         [[1, 2], [3, None]])
+
+    def test_big_integer_itertype(self):
+        field = models.BigIntegerArrayField(itertype=array.array)
+        value = field.to_python([2 ** 40, -2 ** 62])
+        self.assertEqual(value.itemsize, 8)
+        self.assertEqual(list(value), [2 ** 40, -2 ** 62])
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_numpy_itertype(self):
+        field = models.FloatArrayField(itertype=numpy.ndarray)
+        value = field.to_python([0.5, 1.5])
+        self.assertIsInstance(value, numpy.ndarray)
+        self.assertEqual(value.dtype, numpy.dtype('d'))
+        self.assertEqual(field.get_db_prep_save(value, None), [0.5, 1.5])
+
+    def test_invalid_itertype(self):
+        self.assertRaises(TypeError, models.CharArrayField, max_length=10,
+                          itertype=array.array)
+
+
+class ArrayLookupsTestCase(TestCase):
+
+    def setUp(self):
+        for title, comments in [('a', ['x', 'y', 'z']), ('b', ['y', 'z']),
+                                ('c', ['z']), ('d', [])]:
+            CommentedItem.objects.create(title=title, comments=comments)
+        for name in ['x', 'y']:
+            Tag.objects.create(name=name, featured=True)
+        Tag.objects.create(name='z', featured=False)
+
+    def assertTitles(self, qs, titles):
+        self.assertEqual(sorted([i.title for i in qs]), sorted(titles))
+
+    def test_len(self):
+        self.assertTitles(CommentedItem.objects.filter(comments__len=2),
+                          ['b'])
+        self.assertTitles(CommentedItem.objects.filter(comments__len__gte=2),
+                          ['a', 'b'])
+        self.assertTitles(CommentedItem.objects.filter(comments__len=0),
+                          ['d'])
+        self.assertTitles(CommentedItem.objects.exclude(comments__len__lt=3),
+                          ['a'])
+
+    def test_index(self):
+        self.assertTitles(CommentedItem.objects.filter(comments__0='y'),
+                          ['b'])
+        self.assertTitles(CommentedItem.objects.filter(comments__1='z'),
+                          ['b'])
+        self.assertTitles(
+            CommentedItem.objects.filter(comments__0__in=['x', 'z']),
+            ['a', 'c'])
+        self.assertTitles(CommentedItem.objects.filter(comments__0=None),
+                          ['d'])
+
+    def test_slice(self):
+        self.assertTitles(CommentedItem.objects.filter(comments__0_2__has='z'),
+                          ['b', 'c'])
+        self.assertTitles(
+            CommentedItem.objects.filter(comments__1_3=['y', 'z']), ['a'])
+
+    def test_contained_by(self):
+        self.assertTitles(
+            CommentedItem.objects.filter(comments__contained_by=['y', 'z']),
+            ['b', 'c', 'd'])
+
+    def test_overlap(self):
+        self.assertTitles(
+            CommentedItem.objects.filter(comments__overlap=['x', 'y']),
+            ['a', 'b'])
+        featured = Tag.objects.filter(featured=True).values_list('name',
+                                                                 flat=True)
+        self.assertTitles(
+            CommentedItem.objects.filter(comments__overlap=featured),
+            ['a', 'b'])
+        self.assertTitles(
+            CommentedItem.objects.filter(comments__contained_by=featured),
+            ['d'])
+
+    def test_invalid_transform(self):
+        self.assertRaises(FieldError, CommentedItem.objects.filter,
+                          title__0='a')
+
+    def test_array_length(self):
+        items = CommentedItem.objects.annotate(
+            n=ArrayLength('comments')).order_by('title')
+        self.assertEqual([(i.title, i.n) for i in items],
+                         [('a', 3), ('b', 2), ('c', 1), ('d', 0)])
+        self.assertNotIn('GROUP BY', str(items.query))
+
+    def test_unnest(self):
+        counts = CommentedItem.objects.annotate(
+            comment=Unnest('comments')).values('comment').annotate(
+            n=Count('id')).order_by('-n')
+        self.assertEqual([(c['comment'], c['n']) for c in counts],
+                         [(u'z', 3), (u'y', 2), (u'x', 1)])
+
+    def test_array_agg(self):
+        titles = CommentedItem.objects.filter(comments__has='z').aggregate(
+            titles=ArrayAgg('title'))['titles']
+        self.assertEqual(sorted(titles), [u'a', u'b', u'c'])
+
+
+class ArrayCopyTestCase(TestCase):
+
+    def test_copy(self):
+        values = dict(title='one', null_boolean=[True, None],
+                      date=[datetime.date.today()],
+                      email=[u'a "quoted", {braced}\\ \xe9'],
+                      decimal=[decimal.Decimal('1.50')], floatt=[1.5],
+                      ip_address=['10.0.0.1'])
+        items = (MiscArraysItem(**values) for i in range(2))
+        self.assertEqual(MiscArraysItem.objects.copy_from(items), 2)
+        item = MiscArraysItem.objects.all()[0]
+        for name, value in values.items():
+            self.assertEqual(getattr(item, name), value)
+        self.assertEqual(item.slug, [])
+
+        from django.db.backends.pg_django.bulkcopy import read_copy_rows
+        fields = values.keys()
+        data = StringIO()
+        self.assertEqual(MiscArraysItem.objects.copy_to(data, fields), 2)
+        data.seek(0)
+        self.assertEqual(list(read_copy_rows(data, MiscArraysItem, fields)),
+                         [tuple([values[f] for f in fields])] * 2)
@@ -3,6 +3,7 @@ from __future__ import absolute_import
 from datetime import datetime
 
 from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import signals
 from django.db.models.fields import FieldDoesNotExist
 from django.test import TestCase, skipIfDBFeature, skipUnlessDBFeature
 from django.utils.translation import ugettext_lazy
@@ -578,3 +579,63 @@ class ModelTest(TestCase):
         Article.objects.bulk_create([Article(headline=lazy, pub_date=datetime.now())])
         article = Article.objects.get()
         self.assertEqual(article.headline, notlazy)
+
+
+class ModelFromDbTests(TestCase):
+    def test_from_db(self):
+        a = Article.from_db('default', None,
+                            (1, u'Area man programs in Python',
+                             datetime(2005, 7, 28)))
+        self.assertEqual(a.id, 1)
+        self.assertEqual(a.headline, u'Area man programs in Python')
+        self.assertEqual(a.pub_date, datetime(2005, 7, 28))
+        self.assertEqual(a._state.db, 'default')
+        self.assertFalse(a._state.adding)
+
+    def test_field_names(self):
+        a = Article.from_db('other', ['pub_date', 'id'],
+                            (datetime(2005, 7, 28), 1))
+        self.assertEqual(a.id, 1)
+        self.assertEqual(a.pub_date, datetime(2005, 7, 28))
+        self.assertEqual(a.headline, 'Default headline')
+        self.assertEqual(a._state.db, 'other')
+
+    def test_loader_cached(self):
+        self.assertTrue(Article.get_loader() is Article.get_loader())
+        self.assertTrue(Article.get_loader(['id']) is
+                        Article.get_loader(('id',)))
+
+    def test_queryset(self):
+        Article.objects.create(headline='Article 1',
+                               pub_date=datetime(2005, 7, 26))
+        a = Article.objects.get()
+        self.assertEqual(a.headline, 'Article 1')
+        self.assertFalse(a._state.adding)
+        a = Article.objects.defer('headline').get()
+        self.assertEqual(a.pub_date, datetime(2005, 7, 26))
+        self.assertEqual(a.headline, 'Article 1')
+        a = list(Article.objects.raw('SELECT id, pub_date FROM basic_article'))[0]
+        self.assertEqual(a.headline, 'Article 1')
+        self.assertFalse(a._state.adding)
+
+    def test_signals(self):
+        sent = []
+        def pre_init(sender, args, kwargs, **kw):
+            sent.append(('pre_init', tuple(args), kwargs))
+        def post_init(sender, instance, **kwargs):
+            sent.append(('post_init', instance.id))
+        signals.pre_init.connect(pre_init, sender=Article)
+        signals.post_init.connect(post_init, sender=Article)
+        try:
+            Article.from_db('default', None,
+                            (1, u'Article 1', datetime(2005, 7, 26)))
+            Article.from_db('default', ['id'], (2,))
+        finally:
+            signals.pre_init.disconnect(pre_init, sender=Article)
+            signals.post_init.disconnect(post_init, sender=Article)
+        self.assertEqual(sent, [
+            ('pre_init', (1, u'Article 1', datetime(2005, 7, 26)), {}),
+            ('post_init', 1),
+            ('pre_init', (), {'id': 2}),
+            ('post_init', 2),
+        ])
@@ -64,3 +64,37 @@ class GetOrCreateTests(TestCase):
             formatted_traceback = traceback.format_exc()
             self.assertIn('obj.save', formatted_traceback)
 
+    def test_update_or_create(self):
+        Person.objects.create(
+            first_name='John', last_name='Lennon', birthday=date(1940, 10, 9)
+        )
+        p, created = Person.objects.update_or_create(
+            first_name='John', last_name='Lennon', defaults={
+                'birthday': date(1940, 10, 10)
+            }
+        )
+        self.assertFalse(created)
+        self.assertEqual(Person.objects.get().birthday, date(1940, 10, 10))
+
+        p, created = Person.objects.update_or_create(
+            first_name='George', last_name='Harrison', defaults={
+                'birthday': date(1943, 2, 25)
+            }
+        )
+        self.assertTrue(created)
+        self.assertEqual(Person.objects.count(), 2)
+
+        # an existing primary key updates the object
+        ManualPrimaryKeyTest.objects.create(id=1, data="Original")
+        m, created = ManualPrimaryKeyTest.objects.update_or_create(
+            id=1, defaults={'data': "Different"}
+        )
+        self.assertFalse(created)
+        self.assertEqual(m.data, "Different")
+        self.assertEqual(ManualPrimaryKeyTest.objects.get(id=1).data,
+                         "Different")
+        m, created = ManualPrimaryKeyTest.objects.update_or_create(
+            id=2, defaults={'data': "New"}
+        )
+        self.assertTrue(created)
+        self.assertEqual(ManualPrimaryKeyTest.objects.count(), 2)
@@ -1,5 +1,6 @@
 from __future__ import absolute_import, with_statement
 
+import array
 from datetime import datetime
 from operator import attrgetter
 
@@ -320,6 +321,56 @@ class LookupTests(TestCase):
             ], transform=identity)
         self.assertRaises(TypeError, Article.objects.values_list, 'id', 'headline', flat=True)
 
+    def test_named(self):
+        rows = list(Article.objects.named('id', 'headline').order_by('id'))
+        self.assertEqual(rows[0].id, self.a1.id)
+        self.assertEqual(rows[0].headline, u'Article 1')
+        self.assertEqual(rows[0], (self.a1.id, u'Article 1'))
+        self.assertEqual([r.headline for r in rows],
+                         [u'Article %s' % i for i in range(1, 8)])
+        # the class of the rows is cached per field names
+        self.assertTrue(type(rows[0]) is
+                        type(Article.objects.named('id', 'headline')[0]))
+        # all the fields by default
+        row = Article.objects.named().get(pk=self.a1.pk)
+        self.assertEqual(row.author_id, self.au1.id)
+        self.assertEqual(row.pub_date, datetime(2005, 7, 26))
+        row = Article.objects.extra(select={'id_plus_one': 'id+1'}).named(
+            'id_plus_one', 'id').get(pk=self.a1.pk)
+        self.assertEqual(row, (self.a1.id + 1, self.a1.id))
+        self.assertEqual(row.id_plus_one, self.a1.id + 1)
+        row = Author.objects.named('name', 'article__headline').order_by(
+            'name', 'article__headline')[0]
+        self.assertEqual(row.article__headline, u'Article 1')
+
+    def test_columns(self):
+        columns = Article.objects.order_by('id').columns('id', 'headline',
+                                                         'author')
+        self.assertEqual(columns.keys(), ['id', 'headline', 'author'])
+        self.assertTrue(isinstance(columns['id'], array.array))
+        self.assertEqual(list(columns['id']), [self.a1.id, self.a2.id,
+            self.a3.id, self.a4.id, self.a5.id, self.a6.id, self.a7.id])
+        self.assertEqual(columns['headline'],
+                         [u'Article %s' % i for i in range(1, 8)])
+        self.assertEqual(list(columns['author']),
+                         [self.au1.id] * 4 + [self.au2.id] * 3)
+        # a None value turns an array column into a list
+        self.a1.author = None
+        self.a1.save()
+        columns = Article.objects.order_by('id').columns('author')
+        self.assertEqual(columns['author'],
+                         [None] * 1 + [self.au1.id] * 3 + [self.au2.id] * 3)
+        # all the fields, the extra selects and the annotations by default
+        columns = Article.objects.extra(select={'id_plus_one': 'id+1'}).filter(
+            pk=self.a2.pk).columns()
+        self.assertEqual(columns.keys(), ['id_plus_one', 'id', 'headline',
+                                          'pub_date', 'author_id'])
+        self.assertEqual(list(columns['id_plus_one']), [self.a2.id + 1])
+        self.assertEqual(list(columns['pub_date']), [datetime(2005, 7, 27)])
+        columns = Article.objects.none().columns('id', 'headline')
+        self.assertEqual(columns, {'id': array.array('l'), 'headline': []})
+        self.assertRaises(TypeError, Article.objects.columns, 'id', flat=True)
+
     def test_get_next_previous_by(self):
         # Every DateField and DateTimeField creates get_next_by_FOO() and
         # get_previous_by_FOO() methods. In the case of identical date values,
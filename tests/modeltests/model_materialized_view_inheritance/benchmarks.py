@@ -0,0 +1,179 @@
+"""
+Benchmarks for the materialized view based inheritance.
+
+They are skipped unless the PG_DJANGO_BENCHMARKS environment variable is set
+to the number of rows to work with, e.g.:
+
+    PG_DJANGO_BENCHMARKS=100000 ./runtests.py --settings=test_pg_django \
+        model_materialized_view_inheritance
+
+Results are written on stderr.
+"""
+from __future__ import absolute_import
+
+import copy
+import os
+import sys
+import time
+
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase, skipUnlessDBFeature
+from django.utils import unittest
+
+from .models import DocumentBase, FileDocument, OtherTaggedStuff
+
+
+BENCHMARK_ROWS = int(os.environ.get('PG_DJANGO_BENCHMARKS') or 0)
+
+benchmark = unittest.skipUnless(BENCHMARK_ROWS,
+                                'PG_DJANGO_BENCHMARKS is not set')
+
+
+class Timer(object):
+    """Context manager reporting the throughput of the enclosed block"""
+    def __init__(self, label, rows=BENCHMARK_ROWS):
+        self.label = label
+        self.rows = rows
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.time() - self.start
+        sys.stderr.write('\n%-55s %9d rows %8.3fs %11.0f rows/s' % (
+            self.label, self.rows, self.elapsed,
+            self.rows / (self.elapsed or 1e-9)))
+
+
+@benchmark
+class ViewMaintenanceBenchmark(TestCase):
+    """Compare bulk write throughput of row and statement level
+    maintenance of the materialized view base table"""
+
+    def set_maintenance(self, mode):
+        FileDocument._meta.view_maintenance = mode
+        cursor = connection.cursor()
+        for sql in connection.creation.sql_view_triggers(DocumentBase,
+                                                         no_style(),
+                                                         replace=True):
+            cursor.execute(sql)
+
+    def tearDown(self):
+        self.set_maintenance(None)
+
+    def bench_writes(self, mode):
+        self.set_maintenance(mode)
+        docs = [FileDocument(title='doc %s' % i, summary='summary',
+                             path='/some/path/%s' % i, tags=['a', 'b'])
+                for i in xrange(BENCHMARK_ROWS)]
+        with Timer('%s level maintenance: bulk_create()' % mode):
+            FileDocument.objects.bulk_create(docs)
+        with Timer('%s level maintenance: update()' % mode):
+            FileDocument.objects.update(summary='updated')
+        self.assertEqual(
+            DocumentBase.objects.filter(summary='updated').count(),
+            BENCHMARK_ROWS)
+        with Timer('%s level maintenance: DELETE' % mode):
+            connection.cursor().execute('DELETE FROM %s' %
+                connection.ops.quote_name(FileDocument._meta.db_table))
+        self.assertEqual(DocumentBase.objects.count(), 0)
+
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_row_level_maintenance(self):
+        self.bench_writes('row')
+
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_statement_level_maintenance(self):
+        self.bench_writes('statement')
+
+
+@benchmark
+class LeafDispatchBenchmark(TestCase):
+    """Compare the instantiation throughput of mixed materialized view
+    querysets with the one of plain leaf querysets"""
+
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_leaf_dispatch(self):
+        half = BENCHMARK_ROWS // 2
+        FileDocument.objects.bulk_create([
+            FileDocument(title='doc %s' % i, summary='summary',
+                         path='/some/path/%s' % i, tags=['a', 'b'])
+            for i in xrange(half)])
+        OtherTaggedStuff.objects.bulk_create([
+            OtherTaggedStuff(title='stuff %s' % i, summary='summary',
+                             spam='spam', tags=['c'])
+            for i in xrange(BENCHMARK_ROWS - half)])
+        rows = list(DocumentBase.objects.values_list())
+
+        with Timer('plain leaf queryset', rows=half):
+            docs = list(FileDocument.objects.all())
+        self.assertEqual(len(docs), half)
+        with Timer('mixed materialized view queryset'):
+            docs = list(DocumentBase.objects.all())
+        self.assertEqual(len(docs), BENCHMARK_ROWS)
+        self.assertEqual(set([d.__class__ for d in docs]),
+                         set([FileDocument, OtherTaggedStuff]))
+        with Timer('mixed rows instantiation, DocumentBase(*row)'):
+            for row in rows:
+                DocumentBase(*row)
+
+
+@benchmark
+class FromDbBenchmark(TestCase):
+    """Compare the instantiation throughput of Model.from_db() with the one
+    of calling the model"""
+
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_from_db(self):
+        FileDocument.objects.bulk_create([
+            FileDocument(title='doc %s' % i, summary='summary',
+                         path='/some/path/%s' % i, tags=['a', 'b'])
+            for i in xrange(BENCHMARK_ROWS)])
+        rows = list(FileDocument.objects.values_list())
+
+        with Timer('rows instantiation, FileDocument(*row)'):
+            for row in rows:
+                doc = FileDocument(*row)
+                doc._state.db = 'default'
+                doc._state.adding = False
+        with Timer('rows instantiation, FileDocument.from_db()'):
+            for row in rows:
+                FileDocument.from_db('default', None, row)
+        with Timer('plain leaf queryset'):
+            docs = list(FileDocument.objects.all())
+        self.assertEqual(len(docs), BENCHMARK_ROWS)
+
+
+@benchmark
+class QueryCloneBenchmark(TestCase):
+    """Compare the throughput of the copy-on-write cloning of the queries
+    with the one of deep copying them, on chains of filters such as the ones
+    built by the admin changelist"""
+
+    def build_chain(self, i):
+        qs = FileDocument.objects.all()
+        qs = qs.filter(title__icontains='doc %s' % i)
+        qs = qs.filter(Q(summary='summary') | Q(path__startswith='/some'))
+        qs = qs.exclude(path='/some/other/path')
+        qs = qs.filter(id__gte=i, id__lt=i + 100)
+        qs = qs.order_by('-title', 'id')
+        return qs.distinct()
+
+    def test_query_clone(self):
+        query = self.build_chain(0).query
+        with Timer('query clones, deepcopy'):
+            for i in xrange(BENCHMARK_ROWS):
+                copy.deepcopy(query)
+        with Timer('query clones, copy-on-write'):
+            for i in xrange(BENCHMARK_ROWS):
+                query.clone()
+        chains = BENCHMARK_ROWS // 10
+        with Timer('changelist-like filter chains', rows=chains):
+            for i in xrange(chains):
+                self.build_chain(i)
+        sql = str(self.build_chain(0).query)
+        self.assertEqual(str(copy.deepcopy(query)), sql)
+        self.assertEqual(str(query.clone()), sql)
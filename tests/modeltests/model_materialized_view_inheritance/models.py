@@ -36,6 +36,13 @@ class DocumentBase(models.Model):
         return u'%s %s' % (self.__class__.__name__, self.title)
 
 
+class Author(models.Model):
+    name = models.CharField(max_length=100)
+
+    def __unicode__(self):
+        return self.name
+
+
 class TaggedDocument(DocumentBase):
     """An intermediate view ( a non-concrete branch in the inheritance tree).
     This doesn't create a db table, but a view instead, based on DocumentBase
@@ -44,6 +51,8 @@ class TaggedDocument(DocumentBase):
     Instantiation works as for materialized views
     """
     tags = CharArrayField(max_length=60, db_index=True)
+    # a relation shared by all the tagged leaves
+    owner = models.ForeignKey(Author, null=True, related_name='+')
 
     class Meta:
         # Tell django this is an abstract intermediate view
@@ -102,6 +111,11 @@ class News(DocumentBase):
     date = models.DateTimeField()
 
 
+class Review(DocumentBase):
+    """A leaf with a foreign key of its own"""
+    author = models.ForeignKey(Author)
+
+
 class Referer(models.Model):
     """Test foreign keys on root, branch and leaves"""
     leaf = models.ForeignKey(RatedTextDocument, null=True)
@@ -111,4 +125,46 @@ class Referer(models.Model):
     #cbranch = models.ForeignKey(TextDocument, null=True)
 
 
+class EventBase(models.Model):
+    """Another materialized base. Its leaves update the base table once per
+    SQL statement instead of once per row. Its names are indexed per leaf"""
+    name = models.CharField(max_length=100)
+
+    class Meta:
+        materialized_view = True
+        view_maintenance = 'statement'
+        child_type_indexes = ('name',)
+
+    def __unicode__(self):
+        return u'%s %s' % (self.__class__.__name__, self.name)
+
+
+class Meeting(EventBase):
+    """A leaf inheriting the statement level maintenance of its base. Only
+    the meetings are indexed by room in the base table"""
+    room = models.CharField(max_length=20, db_index=True)
+
+
+class Call(EventBase):
+    """A leaf overriding the maintenance mode of its base"""
+    number = models.CharField(max_length=20)
+
+    class Meta:
+        view_maintenance = 'row'
+
+
+class JournalBase(models.Model):
+    """A materialized base whose leaves only queue their changes. They are
+    applied in batches by the refreshviews command or a background worker,
+    so reads on this model may be up to a minute late"""
+    text = models.CharField(max_length=100)
+
+    class Meta:
+        materialized_view = True
+        view_maintenance = 'deferred'
+        max_staleness = 60
+
+
+class Entry(JournalBase):
+    level = models.IntegerField()
 
@@ -20,13 +20,22 @@ When the root or a branch is queried, the resulting queryset is said
 
 from __future__ import absolute_import
 
-from django.core.exceptions import NonPersistantModel
-from django.test import TestCase, skipUnlessDBFeature
-
+import threading
+import time
 from datetime import datetime
+from StringIO import StringIO
+
+from django.core.exceptions import NonPersistantModel
+from django.core.paginator import KeysetPaginator
+from django.core.management import call_command
+from django.db import connection, models
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
 
 from .models import (DocumentBase, TaggedDocument, News, FileDocument,
-            Referer, Comment, OtherTaggedStuff, TextDocument, RatedTextDocument)
+            Referer, Comment, OtherTaggedStuff, TextDocument, RatedTextDocument,
+            EventBase, Meeting, Call, JournalBase, Entry, Author, Review)
+from .benchmarks import (FromDbBenchmark, LeafDispatchBenchmark,
+    QueryCloneBenchmark, ViewMaintenanceBenchmark)
 
 class ModelMaterializedViewInheritanceTests(TestCase):
     @skipUnlessDBFeature('support_materialized_view_base')
@@ -167,6 +176,379 @@ class ModelMaterializedViewInheritanceTests(TestCase):
         #self.assertEqual(ref.cbranch.title, 'a text')
 
 
+class LeafPruningTests(TestCase):
+    def setUp(self):
+        FileDocument.objects.create(title='a file', path='/a/path',
+                                    tags=['foo'])
+        OtherTaggedStuff.objects.create(title='some stuff', spam='eggs',
+                                        tags=['foo'])
+        TextDocument.objects.create(title='a text', content='some text',
+                                    tags=['foo'])
+        RatedTextDocument.objects.create(title='rate me', content='rated',
+                                         rate=42, tags=['foo'])
+        Comment.objects.create(title='a comment', text='some text',
+                               commenter='me')
+
+    def assertLeaves(self, qs, leaves):
+        pruning = 'IN (%s)' % ', '.join(
+            [str(i) for i in sorted([l._meta.leaf_id for l in leaves])])
+        self.assertIn(pruning, str(qs.query))
+        self.assertEqual(set([obj.__class__ for obj in qs]), set(leaves))
+
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_leaf_field_pruning(self):
+        self.assertLeaves(DocumentBase.objects.filter(path='/a/path'),
+                          [FileDocument])
+        self.assertLeaves(TaggedDocument.objects.filter(spam='eggs'),
+                          [OtherTaggedStuff])
+        self.assertLeaves(DocumentBase.objects.filter(content__isnull=False),
+                          [TextDocument, RatedTextDocument])
+        self.assertLeaves(DocumentBase.objects.filter(text='some text') |
+                          DocumentBase.objects.filter(rate=42),
+                          [Comment, RatedTextDocument])
+        # these filters may match rows of any leaf
+        for qs in (DocumentBase.objects.exclude(path='/a/path'),
+                   DocumentBase.objects.filter(path__isnull=True),
+                   DocumentBase.objects.filter(title='a text')):
+            self.assertNotIn('IN (', str(qs.query))
+        with self.assertNumQueries(0):
+            self.assertEqual(list(DocumentBase.objects.filter(
+                path='/a/path', text='some text')), [])
+
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_child_type_pruning(self):
+        self.assertLeaves(DocumentBase.objects.filter(
+                pgd_child_type=Comment._meta.leaf_id), [Comment])
+        self.assertLeaves(DocumentBase.objects.leaves(FileDocument, Comment),
+                          [FileDocument, Comment])
+        self.assertLeaves(DocumentBase.objects.leaves(TextDocument),
+                          [TextDocument, RatedTextDocument])
+        self.assertLeaves(TaggedDocument.objects.leaves(OtherTaggedStuff),
+                          [OtherTaggedStuff])
+        self.assertEqual(DocumentBase.objects.leaves(News).count(), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(list(TaggedDocument.objects.leaves(
+                FileDocument).filter(spam='eggs')), [])
+        with self.assertRaises(TypeError):
+            TaggedDocument.objects.leaves(Comment)
+        with self.assertRaises(TypeError):
+            Comment.objects.leaves(Comment)
+
+
+class LeafBulkCreateTests(TestCase):
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_leaf_bulk_create(self):
+        files = [FileDocument(title='file %s' % i, path='/path/%s' % i,
+                              tags=['foo']) for i in range(3)]
+        texts = [TextDocument(title='text %s' % i, content='content',
+                              tags=['bar']) for i in range(2)]
+        with self.assertNumQueries(2):
+            FileDocument.objects.bulk_create(files)
+            TextDocument.objects.bulk_create(texts)
+        for doc in files + texts:
+            self.assertIsNotNone(doc.pk)
+            self.assertEqual(DocumentBase.objects.get(pk=doc.pk).title,
+                             doc.title)
+        # the ids come from the shared sequence of the base
+        self.assertEqual(len(set([d.pk for d in files + texts])), 5)
+        with self.assertRaises(NonPersistantModel):
+            DocumentBase.objects.bulk_create([Comment(title='a comment')])
+
+
+class ChunkedIterationTests(TestCase):
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_mixed_chunks(self):
+        FileDocument.objects.bulk_create([
+            FileDocument(title='file %s' % i, path='/path/%s' % i,
+                         tags=['foo']) for i in range(3)])
+        TextDocument.objects.bulk_create([
+            TextDocument(title='text %s' % i, content='content',
+                         tags=['bar']) for i in range(2)])
+        docs = DocumentBase.objects.order_by('pk')
+        with self.assertNumQueries(3):
+            chunks = list(DocumentBase.objects.chunked(2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual([(d.__class__, d.pk) for chunk in chunks
+                          for d in chunk],
+                         [(d.__class__, d.pk) for d in docs])
+
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_keyset_pagination(self):
+        TextDocument.objects.bulk_create([
+            TextDocument(title='text %s' % i, content='content',
+                         tags=['bar']) for i in range(5)])
+        paginator = KeysetPaginator(DocumentBase.objects.all(), 3, key='-pk')
+        p = paginator.page()
+        self.assertEqual([d.title for d in p],
+                         ['text 4', 'text 3', 'text 2'])
+        self.assertTrue(isinstance(p[0], TextDocument))
+        p = paginator.page(after=p.next_page_key())
+        self.assertEqual([d.title for d in p], ['text 1', 'text 0'])
+        self.assertFalse(p.has_next())
+
+
+class IdAllocationTests(TestCase):
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_shared_sequence_allocation(self):
+        pk = FileDocument._meta.pk
+        ids = pk.allocate_ids(3)
+        self.assertEqual(len(set(ids)), 3)
+        # the next ids come from the block reserved by this connection
+        with self.assertNumQueries(0):
+            more_ids = Comment._meta.pk.allocate_ids(2)
+        self.assertFalse(set(ids) & set(more_ids))
+        docs = [FileDocument(id=i, title='file', path='/path', tags=['a'])
+                for i in ids]
+        FileDocument.objects.bulk_create(docs)
+        self.assertEqual(
+            sorted(DocumentBase.objects.values_list('id', flat=True)),
+            sorted(ids))
+        # the reserved ids are not used by the database defaults
+        comment = Comment.objects.create(title='a comment')
+        self.assertNotIn(comment.pk, ids + more_ids)
+
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_auto_field_allocation(self):
+        a_id = Author._meta.pk.allocate_id()
+        author = Author.objects.create(name='other')
+        self.assertNotEqual(author.pk, a_id)
+        Author.objects.bulk_create([Author(pk=a_id, name='allocated')])
+        self.assertEqual(Author.objects.get(pk=a_id).name, 'allocated')
+
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_sequences_cache(self):
+        sequence = DocumentBase._meta.pk.sequence
+        self.assertTrue(connection.introspection.sequence_exists(sequence))
+        with self.assertNumQueries(0):
+            self.assertTrue(DocumentBase._meta.pk.exists_for_connection(
+                connection))
+            self.assertFalse(connection.introspection.sequence_exists(
+                'no_such_sequence'))
+
+
+class LeafRelationsTests(TestCase):
+    def setUp(self):
+        self.a = Author.objects.create(name='a')
+        self.b = Author.objects.create(name='b')
+        Review.objects.create(title='a review', author=self.a)
+        FileDocument.objects.create(title='a file', path='/a/path',
+                                    tags=['foo'], owner=self.b)
+        OtherTaggedStuff.objects.create(title='some stuff', spam='eggs',
+                                        tags=['foo'], owner=self.a)
+        c = Comment.objects.create(title='a comment', text='some text',
+                                   commenter='me')
+        Referer.objects.create(root=c)
+
+    def check_relations(self, docs):
+        docs = dict([(d.title, d) for d in docs])
+        self.assertEqual(len(docs), 4)
+        self.assertEqual(docs['a review'].author, self.a)
+        self.assertEqual(docs['a file'].owner, self.b)
+        self.assertEqual(docs['some stuff'].owner, self.a)
+
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_select_related(self):
+        with self.assertNumQueries(1):
+            # rows of the leaves without author are kept
+            docs = list(DocumentBase.objects.select_related())
+            self.assertEqual(len(docs), 4)
+            self.assertEqual([d.author for d in docs
+                              if isinstance(d, Review)], [self.a])
+        with self.assertNumQueries(1):
+            self.check_relations(
+                DocumentBase.objects.select_related('author', 'owner'))
+
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_prefetch_related(self):
+        # one query per relation, whichever leaves define it
+        with self.assertNumQueries(4):
+            docs = list(DocumentBase.objects.prefetch_related(
+                'author', 'owner', 'referer_set'))
+            self.check_relations(docs)
+            self.assertEqual(sum([len(d.referer_set.all()) for d in docs]), 1)
+
+
+class BaseIndexesTests(TestCase):
+    def get_indexes(self, model):
+        cursor = connection.cursor()
+        cursor.execute("SELECT indexname, indexdef FROM pg_indexes "
+                       "WHERE tablename = %s", [model._meta.db_table])
+        return dict(cursor.fetchall())
+
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_partial_indexes(self):
+        indexes = self.get_indexes(EventBase)
+        table = EventBase._meta.db_table
+        self.assertIn('WHERE (room IS NOT NULL)',
+                      indexes['%s_room' % table])
+        self.assertIn('WHERE (room IS NOT NULL)',
+                      indexes['%s_room_like' % table])
+        self.assertNotIn('WHERE', indexes['%s_pgd_child_type' % table])
+        # the room index may be used by the queries on meeting rooms
+        Meeting.objects.create(name='weekly', room='42')
+        self.assertEqual(
+            [e.name for e in EventBase.objects.filter(room='42')], ['weekly'])
+
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_child_type_indexes(self):
+        indexes = self.get_indexes(EventBase)
+        self.assertTrue([sql for sql in indexes.values()
+                         if 'btree (pgd_child_type, name)' in sql])
+        with self.assertRaises(TypeError):
+            class NoBase(models.Model):
+                class Meta:
+                    child_type_indexes = ('id',)
+
+
+class ViewMaintenanceTests(TestCase):
+    def test_maintenance_mode(self):
+        self.assertEqual(FileDocument._meta.get_view_maintenance(), 'row')
+        self.assertEqual(Meeting._meta.get_view_maintenance(), 'statement')
+        self.assertEqual(Call._meta.get_view_maintenance(), 'row')
+
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_statement_level_maintenance(self):
+        Meeting.objects.bulk_create([Meeting(name='meeting %s' % i,
+                                             room='room %s' % i)
+                                     for i in range(5)])
+        Call(name='a call', number='0123456789').save()
+        self.assertEqual(EventBase.objects.count(), 6)
+        self.assertEqual(
+            sorted(unicode(e) for e in EventBase.objects.all())[:2],
+            [u'Call a call', u'Meeting meeting 0'])
+
+        Meeting.objects.filter(room__in=['room 1', 'room 2']).update(
+            name='moved')
+        self.assertEqual(EventBase.objects.filter(name='moved').count(), 2)
+        self.assertEqual(
+            set(type(e) for e in EventBase.objects.filter(name='moved')),
+            set([Meeting]))
+
+        Meeting.objects.exclude(name='moved').delete()
+        self.assertEqual(EventBase.objects.count(), 3)
+        Meeting.objects.all().delete()
+        self.assertEqual(
+            [unicode(e) for e in EventBase.objects.all()], [u'Call a call'])
+
+
+class DeferredMaintenanceTests(TestCase):
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_queued_changes(self):
+        from django.db.backends.pg_django.maintenance import (
+            apply_view_changes, get_view_staleness, get_deferred_bases)
+
+        self.assertEqual(get_deferred_bases(), [JournalBase])
+        for i in range(3):
+            Entry(text='entry %s' % i, level=i).save()
+        # nothing is written on the base until the queue is applied
+        self.assertEqual(JournalBase.objects.count(), 0)
+        self.assertTrue(get_view_staleness(JournalBase) >= 0)
+        self.assertEqual(apply_view_changes(JournalBase), 3)
+        self.assertEqual(get_view_staleness(JournalBase), 0)
+        self.assertEqual(
+            sorted(unicode(e.text) for e in JournalBase.objects.all()),
+            [u'entry 0', u'entry 1', u'entry 2'])
+
+        Entry.objects.filter(level__gte=1).update(text='changed')
+        Entry.objects.filter(level=0).delete()
+        self.assertEqual(JournalBase.objects.count(), 3)
+        # several changes of the same rows are applied at once, in batches
+        self.assertEqual(apply_view_changes(JournalBase, batch_size=2), 3)
+        self.assertEqual(
+            [(e.__class__, e.text) for e in JournalBase.objects.all()],
+            [(Entry, u'changed'), (Entry, u'changed')])
+
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_refreshviews_command(self):
+        Entry(text='an entry', level=1).save()
+        self.assertEqual(JournalBase.objects.count(), 0)
+        call_command('refreshviews',
+                     'model_materialized_view_inheritance.JournalBase',
+                     verbosity=0)
+        self.assertEqual(JournalBase.objects.get().text, 'an entry')
+        # EventBase has no deferred leaves, hence no queue
+        stderr = StringIO()
+        self.assertRaises(SystemExit, call_command, 'refreshviews',
+                          'model_materialized_view_inheritance.EventBase',
+                          verbosity=0, stderr=stderr)
+        self.assertTrue('not a materialized view base with deferred leaves'
+                        in stderr.getvalue())
+
+
+class DeferredMaintenanceWorkerTests(TransactionTestCase):
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_worker(self):
+        from django.db.backends.pg_django.maintenance import (
+            ViewMaintenanceWorker)
+
+        for i in range(5):
+            Entry(text='entry %s' % i, level=i).save()
+        worker = ViewMaintenanceWorker(interval=0.01)
+        worker.start()
+        try:
+            for _ in range(500):
+                if JournalBase.objects.count() == 5:
+                    break
+                time.sleep(0.01)
+        finally:
+            worker.stop()
+            worker.join()
+        self.assertEqual(JournalBase.objects.count(), 5)
+
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_worker_survives_errors(self):
+        from django.db.backends.pg_django.maintenance import (
+            ViewMaintenanceWorker)
+
+        Entry(text='an entry', level=1).save()
+        # applying the changes of EventBase, which has no queue, fails
+        worker = ViewMaintenanceWorker([EventBase, JournalBase],
+                                       interval=0.01)
+        worker.start()
+        try:
+            for _ in range(500):
+                if JournalBase.objects.count() == 1:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(JournalBase.objects.count(), 1)
+            Entry(text='another entry', level=2).save()
+            for _ in range(500):
+                if JournalBase.objects.count() == 2:
+                    break
+                time.sleep(0.01)
+            self.assertTrue(worker.is_alive())
+        finally:
+            worker.stop()
+            worker.join()
+        self.assertEqual(JournalBase.objects.count(), 2)
+
+    @skipUnlessDBFeature('support_materialized_view_base')
+    def test_concurrent_changes_of_a_row(self):
+        from django.db.backends.pg_django.maintenance import (
+            apply_view_changes_batch, lock_key)
 
+        def apply_batch():
+            try:
+                apply_view_changes_batch(JournalBase)
+            finally:
+                connection.close()
 
+        entry = Entry.objects.create(text='an entry', level=1)
+        # another worker applying a change of the same row
+        cursor = connection.cursor()
+        cursor.execute('SELECT pg_advisory_lock(%s, %s)',
+                       [lock_key(JournalBase._meta.db_table),
+                        lock_key(entry.pk)])
+        try:
+            thread = threading.Thread(target=apply_batch)
+            thread.start()
+            thread.join(0.2)
+            self.assertTrue(thread.is_alive())
+            self.assertEqual(JournalBase.objects.count(), 0)
+        finally:
+            cursor.execute('SELECT pg_advisory_unlock(%s, %s)',
+                           [lock_key(JournalBase._meta.db_table),
+                            lock_key(entry.pk)])
+        thread.join()
+        self.assertEqual(JournalBase.objects.get().text, 'an entry')
 
@@ -1,8 +1,9 @@
-from __future__ import absolute_import
+from __future__ import with_statement, absolute_import
 
 from datetime import datetime
 
-from django.core.paginator import Paginator, InvalidPage, EmptyPage
+from django.core.paginator import (Paginator, InvalidPage, EmptyPage,
+    KeysetPaginator)
 from django.test import TestCase
 
 from .models import Article
@@ -131,3 +132,94 @@ class PaginationTests(TestCase):
         self.assertEqual(42, paginator.count)
         self.assertEqual(5, paginator.num_pages)
         self.assertEqual([1, 2, 3, 4, 5], paginator.page_range)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        for x in range(1, 10):
+            Article.objects.create(headline='Article %s' % x,
+                                   pub_date=datetime(2005, 7, x))
+
+    def headlines(self, objects):
+        return [a.headline for a in objects]
+
+    def test_pages(self):
+        paginator = KeysetPaginator(Article.objects.all(), 4)
+        p = paginator.page()
+        self.assertEqual(u"<KeysetPage of 4 objects>", unicode(p))
+        self.assertEqual(self.headlines(p), ['Article %s' % x
+                                             for x in range(1, 5)])
+        self.assertTrue(p.has_next())
+        self.assertFalse(p.has_previous())
+        self.assertTrue(p.has_other_pages())
+
+        # the objects after the last object of the page
+        with self.assertNumQueries(1):
+            p = paginator.page(after=p.next_page_key())
+        self.assertEqual(self.headlines(p), ['Article %s' % x
+                                             for x in range(5, 9)])
+        self.assertTrue(p.has_next())
+        self.assertTrue(p.has_previous())
+
+        p = paginator.page(after=p.next_page_key())
+        self.assertEqual(self.headlines(p), ['Article 9'])
+        self.assertFalse(p.has_next())
+        self.assertTrue(p.has_previous())
+
+        # the objects before the first object of the page
+        p = paginator.page(before=p.previous_page_key())
+        self.assertEqual(self.headlines(p), ['Article %s' % x
+                                             for x in range(5, 9)])
+        self.assertTrue(p.has_next())
+        self.assertTrue(p.has_previous())
+        p = paginator.page(before=p.previous_page_key())
+        self.assertEqual(self.headlines(p), ['Article %s' % x
+                                             for x in range(1, 5)])
+        self.assertFalse(p.has_previous())
+
+    def test_descending_key(self):
+        paginator = KeysetPaginator(Article.objects.all(), 5,
+                                    key='-pub_date')
+        p = paginator.page()
+        self.assertEqual(self.headlines(p), ['Article %s' % x
+                                             for x in range(9, 4, -1)])
+        self.assertEqual(p.next_page_key(), datetime(2005, 7, 5))
+        p = paginator.page(after=unicode(p.next_page_key()))
+        self.assertEqual(self.headlines(p), ['Article %s' % x
+                                             for x in range(4, 0, -1)])
+        self.assertFalse(p.has_next())
+        p = paginator.page(before=p.previous_page_key())
+        self.assertEqual(self.headlines(p), ['Article %s' % x
+                                             for x in range(9, 4, -1)])
+
+    def test_invalid_page(self):
+        paginator = KeysetPaginator(Article.objects.all(), 5)
+        self.assertRaises(InvalidPage, paginator.page, after='spam')
+        last = Article.objects.order_by('-pk')[0].pk
+        self.assertRaises(EmptyPage, paginator.page, after=last)
+        Article.objects.all().delete()
+        self.assertEqual(len(paginator.page()), 0)
+        paginator = KeysetPaginator(Article.objects.all(), 5,
+                                    allow_empty_first_page=False)
+        self.assertRaises(EmptyPage, paginator.page)
+
+    def test_chunked(self):
+        with self.assertNumQueries(3):
+            chunks = list(Article.objects.chunked(4))
+        self.assertEqual([self.headlines(chunk) for chunk in chunks], [
+            ['Article %s' % x for x in range(1, 5)],
+            ['Article %s' % x for x in range(5, 9)],
+            ['Article 9']])
+        chunks = Article.objects.filter(headline__gt='Article 2').chunked(
+            3, key='-pub_date')
+        self.assertEqual([self.headlines(chunk) for chunk in chunks], [
+            ['Article %s' % x for x in range(9, 6, -1)],
+            ['Article %s' % x for x in range(6, 3, -1)],
+            ['Article 3']])
+        # the last chunk is full: one more query finds nothing
+        with self.assertNumQueries(4):
+            self.assertEqual(len(list(Article.objects.chunked(3))), 3)
+        self.assertRaises(TypeError, Article.objects.values('pk').chunked,
+                          3)
+        self.assertRaises(AssertionError, Article.objects.all()[:2].chunked,
+                          3)
@@ -1,6 +1,7 @@
 from __future__ import with_statement, absolute_import
 
 from django.contrib.contenttypes.models import ContentType
+from django.db.models import Prefetch
 from django.test import TestCase
 
 from .models import (Author, Book, Reader, Qualification, Teacher, Department,
@@ -188,6 +189,71 @@ class PrefetchRelatedTests(TestCase):
         self.assertTrue("name" in str(cm.exception))
 
 
+class PrefetchObjectTests(TestCase):
+
+    def setUp(self):
+        self.book1 = Book.objects.create(title="Poems")
+        self.book2 = Book.objects.create(title="Jane Eyre")
+        self.book3 = Book.objects.create(title="Wuthering Heights")
+        self.author1 = Author.objects.create(name="Charlotte",
+                                             first_book=self.book1)
+        self.author2 = Author.objects.create(name="Anne",
+                                             first_book=self.book1)
+        self.author3 = Author.objects.create(name="Emily",
+                                             first_book=self.book2)
+        self.book1.authors.add(self.author1, self.author2, self.author3)
+        self.book2.authors.add(self.author1)
+        self.book3.authors.add(self.author3)
+        self.reader = Reader.objects.create(name="Amy")
+        self.reader.books_read.add(self.book1, self.book3)
+
+    def test_queryset(self):
+        authors = Author.objects.exclude(name="Anne").order_by('-name')
+        with self.assertNumQueries(2):
+            lists = [[a.name for a in b.authors.all()] for b in
+                     Book.objects.prefetch_related(
+                         Prefetch('authors', queryset=authors.only('name')))]
+        self.assertEqual(lists, [[u"Emily", u"Charlotte"], [u"Charlotte"],
+                                 [u"Emily"]])
+
+    def test_queryset_foreignkey(self):
+        with self.assertNumQueries(2):
+            authors = list(Author.objects.prefetch_related(
+                Prefetch('first_book',
+                         queryset=Book.objects.filter(title="Poems"))))
+        with self.assertNumQueries(0):
+            books = [getattr(a, Author.first_book.cache_name, None)
+                     for a in authors]
+        self.assertEqual(books, [self.book1, self.book1, None])
+
+    def test_queryset_applies_to_last_relation(self):
+        authors = Author.objects.filter(name="Emily")
+        with self.assertNumQueries(3):
+            readers = list(Reader.objects.prefetch_related(
+                Prefetch('books_read__authors', queryset=authors)))
+            lists = [[a.name for a in b.authors.all()]
+                     for b in readers[0].books_read.all()]
+        self.assertEqual(lists, [[u"Emily"], [u"Emily"]])
+
+    def test_chunk_size(self):
+        with self.assertNumQueries(3):
+            lists = [[a.name for a in b.authors.all()] for b in
+                     Book.objects.prefetch_related('authors', chunk_size=2)]
+        self.assertEqual(lists, [[u"Charlotte", u"Anne", u"Emily"],
+                                 [u"Charlotte"], [u"Emily"]])
+        with self.assertNumQueries(4):
+            books = [a.first_book for a in Author.objects.prefetch_related(
+                Prefetch('first_book', chunk_size=1))]
+        self.assertEqual(books, [self.book1, self.book1, self.book2])
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, Prefetch, 'authors',
+                          queryset=Author.objects.values('name'))
+        self.assertRaises(ValueError, Prefetch, 'authors', chunk_size=0)
+        self.assertRaises(TypeError, Book.objects.prefetch_related, 'authors',
+                          chunksize=2)
+
+
 class DefaultManagerTests(TestCase):
 
     def setUp(self):
@@ -298,6 +364,13 @@ class GenericRelationTests(TestCase):
         self.assertEqual(result,
                          [t.created_by for t in TaggedItem.objects.all()])
 
+    def test_prefetch_GFK_queryset(self):
+        book = Book.objects.create(title="Poems")
+        TaggedItem.objects.create(tag="awesome", content_object=book)
+        qs = TaggedItem.objects.prefetch_related(
+            Prefetch('content_object', queryset=Book.objects.all()))
+        self.assertRaises(ValueError, list, qs)
+
     def test_generic_relation(self):
         b = Bookmark.objects.create(url='http://www.djangoproject.com/')
         t1 = TaggedItem.objects.create(content_object=b, tag='django')
@@ -34,3 +34,8 @@ class C(models.Model):
 
 class D(C):
     a = models.ForeignKey(A)
+
+class Price(models.Model):
+    amount = models.DecimalField(max_digits=8, decimal_places=2)
+    valid_from = models.DateField(null=True)
+    stock = models.PositiveIntegerField(default=0)
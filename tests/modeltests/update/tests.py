@@ -1,8 +1,12 @@
 from __future__ import absolute_import
 
-from django.test import TestCase
+import datetime
+from decimal import Decimal
 
-from .models import A, B, C, D, DataPoint, RelatedPoint
+from django.db import DatabaseError
+from django.test import TestCase, skipUnlessDBFeature
+
+from .models import A, B, C, D, DataPoint, RelatedPoint, Price
 
 
 class SimpleTest(TestCase):
@@ -116,3 +120,73 @@ class AdvancedTests(TestCase):
         method = DataPoint.objects.all()[:2].update
         self.assertRaises(AssertionError, method,
             another_value='another thing')
+
+
+class BulkUpdateTests(TestCase):
+    def setUp(self):
+        self.prices = [Price.objects.create(amount=Decimal(i)) for i in range(5)]
+
+    def test_bulk_update(self):
+        for i, price in enumerate(self.prices):
+            price.amount = Decimal('%d.50' % (i * 10))
+            price.stock = i
+            if i % 2:
+                price.valid_from = datetime.date(2012, 1, i)
+        with self.assertNumQueries(1):
+            self.assertEqual(Price.objects.bulk_update(
+                self.prices, ['amount', 'valid_from', 'stock']), 5)
+        self.assertEqual(
+            list(Price.objects.order_by('pk').values_list(
+                'amount', 'valid_from', 'stock')),
+            [(Decimal('0.50'), None, 0),
+             (Decimal('10.50'), datetime.date(2012, 1, 1), 1),
+             (Decimal('20.50'), None, 2),
+             (Decimal('30.50'), datetime.date(2012, 1, 3), 3),
+             (Decimal('40.50'), None, 4)])
+
+    def test_batch_size(self):
+        for price in self.prices:
+            price.stock = 7
+        with self.assertNumQueries(3):
+            Price.objects.bulk_update(self.prices, ['stock'], batch_size=2)
+        self.assertEqual(Price.objects.filter(stock=7).count(), 5)
+
+    def test_filtered_queryset(self):
+        """
+        Only the rows of the QuerySet are updated.
+        """
+        for price in self.prices:
+            price.stock = 7
+        self.assertEqual(
+            Price.objects.filter(amount__lt=2).bulk_update(self.prices,
+                                                           ['stock']), 2)
+        self.assertEqual(Price.objects.filter(stock=7).count(), 2)
+
+    def test_foreign_key(self):
+        a1, a2 = A.objects.create(), A.objects.create()
+        bs = [B.objects.create(a=a1, y=i) for i in range(3)]
+        bs[0].a = a2
+        bs[2].y = 30
+        self.assertEqual(B.objects.bulk_update(bs, ['a', 'y']), 3)
+        self.assertEqual(list(B.objects.order_by('pk').values_list('a', 'y')),
+                         [(a2.pk, 0), (a1.pk, 1), (a1.pk, 30)])
+
+    @skipUnlessDBFeature('supports_update_from_values')
+    def test_too_long_value(self):
+        """
+        The values are not truncated to the length of their column.
+        """
+        points = [DataPoint.objects.create(name='d%d' % i, value='v')
+                  for i in range(2)]
+        points[0].value = 'x' * 30
+        self.assertRaises(DatabaseError, DataPoint.objects.bulk_update,
+                          points, ['value'])
+
+    def test_invalid_fields(self):
+        a = A.objects.create()
+        d = D.objects.create(a=a)
+        self.assertRaises(ValueError, D.objects.bulk_update, [d], ['y'])
+        self.assertRaises(ValueError, D.objects.bulk_update, [d], ['c_ptr'])
+        self.assertRaises(ValueError, D.objects.bulk_update, [d], [])
+        self.assertRaises(ValueError, A.objects.bulk_update, [A()], ['x'])
+        self.assertEqual(A.objects.bulk_update([], ['x']), 0)
@@ -11,6 +11,7 @@ from django.core import mail
 from django.core.exceptions import SuspiciousOperation
 from django.core.files import temp as tempfile
 from django.core.urlresolvers import reverse
+from django.db import connection
 # Register auth models with the admin.
 from django.contrib import admin
 from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
@@ -1247,6 +1248,28 @@ class AdminViewDeletedObjectsTest(TestCase):
         self.assertContains(response, "your account doesn't have permission to delete the following types of objects")
         self.assertContains(response, "<li>plot details</li>")
 
+    @unittest.skipUnless(connection.features.supports_db_cascade,
+                         "Database doesn't support DB_CASCADE")
+    @override_settings(DB_CASCADE=True)
+    def test_db_cascade(self):
+        """
+        The objects the database would delete on its own are still listed,
+        and their delete permission checked.
+        """
+        response = self.client.get('/test_admin/admin/admin_views/plot/%s/delete/' % quote(1))
+        self.assertContains(response, """<li>Plot details: <a href="/test_admin/admin/admin_views/plotdetails/1/">almost finished</a>""")
+
+        self.client.logout()
+        delete_user = User.objects.get(username='deleteuser')
+        delete_user.user_permissions.add(get_perm(Plot,
+            Plot._meta.get_delete_permission()))
+
+        self.assertTrue(self.client.login(username='deleteuser',
+                                          password='secret'))
+
+        response = self.client.get('/test_admin/admin/admin_views/plot/%s/delete/' % quote(1))
+        self.assertContains(response, "<li>plot details</li>")
+
     def test_protected(self):
         q = Question.objects.create(question="Why?")
         a1 = Answer.objects.create(question=q, answer="Because.")
@@ -3,6 +3,7 @@
 from __future__ import with_statement, absolute_import
 
 import datetime
+from decimal import Decimal
 import threading
 
 from django.conf import settings
@@ -12,6 +13,7 @@ from django.db import (backend, connection, connections, DEFAULT_DB_ALIAS,
     IntegrityError, transaction)
 from django.db.backends.signals import connection_created
 from django.db.backends.postgresql_psycopg2 import version as pg_version
+from django.db.models.sql.cache import sql_cache
 from django.db.utils import ConnectionHandler, DatabaseError, load_backend
 from django.test import TestCase, skipUnlessDBFeature, TransactionTestCase
 from django.test.utils import override_settings
@@ -387,6 +389,388 @@ class BackendTestCase(TestCase):
 #   preference.
 # verify if its type is django.database.db.IntegrityError.
 
+class ServerSideCursorTests(TransactionTestCase):
+
+    def setUp(self):
+        models.Square.objects.bulk_create([
+            models.Square(root=i, square=i ** 2) for i in range(10)])
+
+    def open_cursors(self):
+        cursor = connection.cursor()
+        cursor.execute("SELECT name FROM pg_cursors "
+                       "WHERE name LIKE '_django_stream_%%'")
+        return [row[0] for row in cursor.fetchall()]
+
+    def test_stream(self):
+        qs = models.Square.objects.order_by('root')
+        self.assertEqual([s.root for s in qs.stream(chunk_size=3)], range(10))
+        self.assertEqual(list(qs.values_list('square', flat=True).stream()),
+                         [i ** 2 for i in range(10)])
+        self.assertEqual(list(qs.filter(root__gt=100).stream()), [])
+
+    @skipUnlessDBFeature('supports_server_side_cursors')
+    def test_named_cursor(self):
+        squares = models.Square.objects.order_by('root').stream(chunk_size=3)
+        squares.next()
+        self.assertEqual(len(self.open_cursors()), 1)
+        self.assertEqual(len(list(squares)), 9)
+        self.assertEqual(self.open_cursors(), [])
+
+    @skipUnlessDBFeature('supports_server_side_cursors')
+    def test_commit_while_streaming(self):
+        # saving an object commits, out of managed transactions
+        roots = []
+        for square in models.Square.objects.order_by('root').stream(
+                chunk_size=3):
+            roots.append(square.root)
+            models.Person.objects.create(first_name='p', last_name='%s' % square.root)
+        self.assertEqual(roots, range(10))
+        self.assertEqual(models.Person.objects.count(), 10)
+
+    @skipUnlessDBFeature('supports_server_side_cursors')
+    def test_managed_transaction(self):
+        with transaction.commit_on_success():
+            roots = [s.root for s in
+                     models.Square.objects.order_by('root').stream(
+                         chunk_size=4)]
+        self.assertEqual(roots, range(10))
+
+    @skipUnlessDBFeature('supports_server_side_cursors')
+    def test_rollback_while_streaming(self):
+        transaction.enter_transaction_management()
+        transaction.managed(True)
+        try:
+            squares = models.Square.objects.stream(chunk_size=3)
+            squares.next()
+            transaction.rollback()
+            # closing the cursor, gone with the transaction, does not fail
+            squares.close()
+        finally:
+            transaction.rollback()
+            transaction.leave_transaction_management()
+
+
+class PreparedStatementTests(TestCase):
+
+    def setUp(self):
+        settings_dict = connection.settings_dict.copy()
+        settings_dict['OPTIONS'] = dict(settings_dict['OPTIONS'],
+                                        prepare_threshold=2,
+                                        max_prepared_statements=2,
+                                        max_age=0)
+        self.connection = ConnectionHandler({
+            DEFAULT_DB_ALIAS: settings_dict})[DEFAULT_DB_ALIAS]
+
+    def tearDown(self):
+        self.connection.close()
+
+    def prepared(self):
+        # bypass the preparing cursor
+        cursor = self.connection.connection.cursor()
+        cursor.execute("SELECT statement FROM pg_prepared_statements "
+                       "ORDER BY prepare_time")
+        return [row[0] for row in cursor.fetchall()]
+
+    def execute(self, sql, params=None):
+        cursor = self.connection.cursor()
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+    @skipUnlessDBFeature('supports_prepared_statements')
+    def test_prepare_after_threshold(self):
+        self.assertEqual(self.execute("SELECT %s + 1, '%%'", [1]), [(2, '%')])
+        self.assertEqual(self.prepared(), [])
+        self.assertEqual(self.execute("SELECT %s + 1, '%%'", [2]), [(3, '%')])
+        self.assertEqual([s.split(' AS ')[1] for s in self.prepared()],
+                         ["SELECT $1 + 1, '%'"])
+        self.assertEqual(self.execute("SELECT %s + 1, '%%'", [3]), [(4, '%')])
+        self.assertEqual(len(self.prepared()), 1)
+        # statements without parameters are not interpolated
+        self.execute("SELECT '%%'")
+        self.assertEqual(self.execute("SELECT '%%'"), [('%%',)])
+        self.assertEqual(len(self.prepared()), 2)
+
+    @skipUnlessDBFeature('supports_prepared_statements')
+    def test_parameter_types(self):
+        # the parameters have the types of their interpolated values
+        for i in range(2):
+            self.assertEqual(self.execute("SELECT %s, %s, %s", [1, 'a', None]),
+                             [(1, 'a', None)])
+        self.assertEqual([s.split(' AS ')[0].split(' ', 2)[2]
+                          for s in self.prepared()],
+                         ["(integer, unknown, unknown)"])
+        # other types are prepared on their own
+        for i in range(2):
+            self.assertEqual(self.execute("SELECT %s, %s, %s",
+                                          [2 ** 40, [1.5], None]),
+                             [(2 ** 40, [Decimal('1.5')], None)])
+        self.assertEqual(len(self.prepared()), 2)
+
+    @skipUnlessDBFeature('supports_prepared_statements')
+    def test_least_recently_used_deallocated(self):
+        for sql in ("SELECT 1", "SELECT 2", "SELECT 1", "SELECT 2",
+                    "SELECT 3", "SELECT 3"):
+            self.execute(sql)
+        self.assertEqual([s.split(' AS ')[1] for s in self.prepared()],
+                         ["SELECT 2", "SELECT 3"])
+        self.assertEqual(self.execute("SELECT 1"), [(1,)])
+
+    @skipUnlessDBFeature('supports_prepared_statements')
+    def test_deallocate_on_ddl(self):
+        self.execute("SELECT 1")
+        self.execute("SELECT 1")
+        self.assertEqual(len(self.prepared()), 1)
+        self.connection.cursor().execute(
+            "CREATE TEMPORARY TABLE prepared_ddl (id integer)")
+        self.execute("SELECT 2")
+        self.assertEqual(self.prepared(), [])
+        self.assertEqual(len(self.connection.prepared_statements), 0)
+
+    @skipUnlessDBFeature('supports_prepared_statements')
+    def test_unpreparable(self):
+        # the type of the parameter can't be determined
+        for i in range(3):
+            self.assertEqual(self.execute("SELECT pg_typeof(%s)", ['a']),
+                             [('unknown',)])
+        self.assertEqual(self.prepared(), [])
+        # the failed PREPARE did not abort the transaction
+        self.assertEqual(self.execute("SELECT 1"), [(1,)])
+
+    @skipUnlessDBFeature('supports_prepared_statements')
+    def test_failed_execute_in_savepoint(self):
+        self.connection.enter_transaction_management()
+        self.connection.managed(True)
+        try:
+            self.execute("SELECT 1 / %s", [1])
+            self.execute("SELECT 1 / %s", [1])
+            sid = self.connection.savepoint()
+            self.assertRaises(DatabaseError, self.execute,
+                              "SELECT 1 / %s", [0])
+            self.connection.savepoint_rollback(sid)
+            self.assertEqual(self.execute("SELECT 1 / %s", [1]), [(1,)])
+            self.assertEqual(len(self.prepared()), 1)
+        finally:
+            self.connection.rollback()
+            self.connection.leave_transaction_management()
+
+    @skipUnlessDBFeature('supports_prepared_statements')
+    def test_invalidated_plan_in_savepoint(self):
+        # the table is changed behind the back of the preparing cursor
+        self.execute("SELECT 1")
+        cursor = self.connection.connection.cursor()
+        cursor.execute("CREATE TEMPORARY TABLE prepared_plan (a integer)")
+        self.connection.enter_transaction_management()
+        self.connection.managed(True)
+        try:
+            self.execute("SELECT * FROM prepared_plan")
+            self.execute("SELECT * FROM prepared_plan")
+            cursor.execute("ALTER TABLE prepared_plan ADD COLUMN b integer")
+            sid = self.connection.savepoint()
+            self.assertRaises(DatabaseError, self.execute,
+                              "SELECT * FROM prepared_plan")
+            self.connection.savepoint_rollback(sid)
+            self.assertTrue(self.connection.prepared_statements.stale)
+            # the statements are prepared again
+            self.assertEqual(self.execute("SELECT * FROM prepared_plan"), [])
+            self.assertEqual(self.prepared(), [])
+        finally:
+            self.connection.rollback()
+            self.connection.leave_transaction_management()
+
+    @skipUnlessDBFeature('supports_prepared_statements')
+    def test_reconnect(self):
+        self.execute("SELECT 1")
+        self.execute("SELECT 1")
+        self.connection.close()
+        self.assertEqual(self.execute("SELECT 1"), [(1,)])
+        self.assertEqual(len(self.connection.prepared_statements), 0)
+
+
+@unittest.skipUnless(connection.ops.in_array_threshold() is not None,
+                     "IN lists are not passed as arrays")
+class InArrayTests(TestCase):
+
+    def setUp(self):
+        self.threshold = connection.in_array_threshold
+        connection.in_array_threshold = 3
+        self.squares = [models.Square.objects.create(root=i, square=i * i)
+                        for i in range(4)]
+
+    def tearDown(self):
+        connection.in_array_threshold = self.threshold
+
+    def test_in_array(self):
+        pks = [s.pk for s in self.squares[:3]]
+        qs = models.Square.objects.filter(pk__in=pks).order_by('pk')
+        sql, params = qs.query.get_compiler(connection=connection).as_sql()
+        self.assertTrue('= ANY(%s::integer[])' in sql)
+        self.assertEqual(len(params), 1)
+        self.assertEqual(sorted(params[0]), pks)
+        self.assertEqual(list(qs), self.squares[:3])
+        # the columns with a CHECK constraint
+        self.assertEqual(
+            list(models.Square.objects.filter(square__in=[0, 1, 4, 9, 16])
+                 .order_by('pk')),
+            self.squares)
+        # shorter lists are left alone
+        qs = models.Square.objects.filter(pk__in=pks[:2])
+        sql, params = qs.query.get_compiler(connection=connection).as_sql()
+        self.assertTrue(' IN (%s, %s)' in sql)
+
+    def test_in_array_strings(self):
+        person = models.Person.objects.create(first_name='John',
+                                              last_name='Doe')
+        # the values longer than the column are not truncated
+        names = ['John', 'Jane', 'John' + 'n' * 20]
+        self.assertEqual(
+            list(models.Person.objects.filter(first_name__in=names)), [person])
+        self.assertEqual(
+            list(models.Person.objects.filter(first_name__in=names[1:])), [])
+
+    def test_in_array_types(self):
+        sql = connection.ops.in_array_sql
+        self.assertEqual(sql('"c"', 'varchar(10)'), '"c" = ANY(%s::varchar[])')
+        self.assertEqual(sql('"c"', 'numeric(5, 2)'),
+                         '"c" = ANY(%s::numeric[])')
+        # char and bit alone are char(1) and bit(1)
+        self.assertEqual(sql('"c"', 'char(3)'), '"c" = ANY(%s::bpchar[])')
+        self.assertEqual(sql('"c"', 'bit(8)'), '"c" = ANY(%s::varbit[])')
+        # the other types with modifiers are not cast
+        self.assertEqual(sql('"c"', 'timestamp(3) with time zone'),
+                         '"c" = ANY(%s)')
+        self.assertEqual(sql('"c"', 'interval(2)'), '"c" = ANY(%s)')
+        cursor = connection.cursor()
+        cursor.execute("CREATE TEMPORARY TABLE in_array_char (c char(3))")
+        cursor.execute("INSERT INTO in_array_char VALUES ('abc'), ('ab')")
+        cursor.execute("SELECT c FROM in_array_char WHERE %s ORDER BY c"
+                       % sql('c', 'char(3)'), [['abc', 'ab', 'a']])
+        self.assertEqual([row[0] for row in cursor.fetchall()],
+                         ['ab ', 'abc'])
+        cursor.execute("SELECT c FROM in_array_char WHERE %s"
+                       % sql('c', 'char(3)'), [['a', 'abcd']])
+        self.assertEqual(cursor.fetchall(), [])
+
+    def test_in_array_cached_sql(self):
+        sql_cache.clear()
+        # the same SQL serves the lists of other values and lengths
+        for roots, count in (([0, 1, 2, 3], 4), ([0, 1, 4], 2)):
+            qs = models.Square.objects.filter(
+                root__in=roots).order_by('pk').cached_sql()
+            self.assertEqual(list(qs), self.squares[:count])
+        self.assertEqual((sql_cache.hits, sql_cache.misses), (1, 1))
+
+
+class ConnectionPoolTests(TestCase):
+
+    def setUp(self):
+        self.settings_dict = connection.settings_dict.copy()
+        self.settings_dict['OPTIONS'] = dict(self.settings_dict['OPTIONS'],
+                                             max_age=60, pool_size=1)
+        self.connections = []
+
+    def tearDown(self):
+        for new_connection in self.connections:
+            new_connection.close()
+            pool = new_connection.get_pool()
+            if pool is not None:
+                pool.clear()
+
+    def new_connection(self):
+        new_connection = ConnectionHandler({
+            DEFAULT_DB_ALIAS: self.settings_dict})[DEFAULT_DB_ALIAS]
+        self.connections.append(new_connection)
+        return new_connection
+
+    def backend_pid(self, new_connection):
+        cursor = new_connection.cursor()
+        cursor.execute("SELECT pg_backend_pid()")
+        return cursor.fetchone()[0]
+
+    @skipUnlessDBFeature('supports_connection_pool')
+    def test_reuse(self):
+        new_connection = self.new_connection()
+        pid = self.backend_pid(new_connection)
+        new_connection.close()
+        self.assertEqual(len(new_connection.get_pool()), 1)
+        # the connection is reused, even by another thread
+        self.assertEqual(self.backend_pid(self.new_connection()), pid)
+        self.assertEqual(len(new_connection.get_pool()), 0)
+
+    @skipUnlessDBFeature('supports_connection_pool')
+    def test_reset_session(self):
+        new_connection = self.new_connection()
+        cursor = new_connection.cursor()
+        cursor.execute("SHOW TIMEZONE")
+        tz = cursor.fetchone()[0]
+        cursor.execute("SHOW work_mem")
+        work_mem = cursor.fetchone()[0]
+        cursor.execute("SET work_mem = '1234kB'")
+        cursor.execute("CREATE TEMPORARY TABLE pooled_temp (id integer)")
+        new_connection._commit()
+        new_connection.close()
+
+        cursor = new_connection.cursor()
+        cursor.execute("SHOW TIMEZONE")
+        self.assertEqual(cursor.fetchone()[0], tz)
+        cursor.execute("SHOW work_mem")
+        self.assertEqual(cursor.fetchone()[0], work_mem)
+        cursor.execute("SELECT COUNT(*) FROM pg_tables "
+                       "WHERE tablename = 'pooled_temp'")
+        self.assertEqual(cursor.fetchone()[0], 0)
+
+    @skipUnlessDBFeature('supports_connection_pool')
+    def test_rollback_on_release(self):
+        from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+        new_connection = self.new_connection()
+        new_connection.cursor().execute("SELECT 1")
+        raw_connection = new_connection.connection
+        self.assertNotEqual(raw_connection.get_transaction_status(),
+                            TRANSACTION_STATUS_IDLE)
+        new_connection.close()
+        self.assertEqual(raw_connection.get_transaction_status(),
+                         TRANSACTION_STATUS_IDLE)
+
+    @skipUnlessDBFeature('supports_connection_pool')
+    def test_pool_size(self):
+        first, second = self.new_connection(), self.new_connection()
+        first.cursor()
+        second.cursor()
+        raw_connection = second.connection
+        first.close()
+        second.close()
+        # the pool is full
+        self.assertEqual(len(first.get_pool()), 1)
+        self.assertTrue(raw_connection.closed)
+
+    @skipUnlessDBFeature('supports_connection_pool')
+    def test_max_age(self):
+        new_connection = self.new_connection()
+        new_connection.cursor()
+        raw_connection = new_connection.connection
+        new_connection.pooled.created -= 60
+        new_connection.close()
+        self.assertEqual(len(new_connection.get_pool()), 0)
+        self.assertTrue(raw_connection.closed)
+
+    @skipUnlessDBFeature('supports_connection_pool')
+    def test_dead_connection(self):
+        new_connection = self.new_connection()
+        pid = self.backend_pid(new_connection)
+        new_connection.close()
+        cursor = connection.cursor()
+        cursor.execute("SELECT pg_terminate_backend(%s)", [pid])
+        # the connection fails the health check and is replaced
+        self.assertNotEqual(self.backend_pid(new_connection), pid)
+
+    @skipUnlessDBFeature('supports_connection_pool')
+    def test_disabled(self):
+        self.settings_dict['OPTIONS']['max_age'] = 0
+        new_connection = self.new_connection()
+        self.assertEqual(new_connection.get_pool(), None)
+        new_connection.cursor()
+        self.assertEqual(new_connection.pooled, None)
+
+
 class FkConstraintsTests(TransactionTestCase):
 
     def setUp(self):
@@ -1,10 +1,11 @@
 from __future__ import with_statement, absolute_import
 
 from operator import attrgetter
+from StringIO import StringIO
 
-from django.test import TestCase, skipUnlessDBFeature
+from django.test import TestCase, skipIfDBFeature, skipUnlessDBFeature
 
-from .models import Country, Restaurant, Pizzeria, State
+from .models import Country, Restaurant, Pizzeria, State, Currency
 
 
 class BulkCreateTests(TestCase):
@@ -32,6 +33,37 @@ class BulkCreateTests(TestCase):
         with self.assertNumQueries(1):
             Country.objects.bulk_create(self.data)
 
+    @skipUnlessDBFeature("has_bulk_insert")
+    def test_batch_size(self):
+        with self.assertNumQueries(2):
+            Country.objects.bulk_create(self.data, batch_size=2)
+        self.assertEqual(Country.objects.count(), 4)
+
+    @skipUnlessDBFeature("can_return_ids_from_bulk_insert")
+    def test_returned_ids(self):
+        with self.assertNumQueries(1):
+            Country.objects.bulk_create(self.data)
+        self.assertEqual(
+            sorted([c.pk for c in self.data]),
+            sorted(Country.objects.values_list("pk", flat=True)))
+        self.assertEqual(Country.objects.get(pk=self.data[1].pk).name,
+                         "The Netherlands")
+
+    @skipUnlessDBFeature("can_return_ids_from_bulk_insert")
+    def test_inherited_model(self):
+        pizzerias = [Pizzeria(name="The Art of Pizza"),
+                     Pizzeria(name="Vito's")]
+        # a statement per table
+        with self.assertNumQueries(2):
+            Pizzeria.objects.bulk_create(pizzerias)
+        self.assertQuerysetEqual(Pizzeria.objects.order_by("name"), [
+            "The Art of Pizza", "Vito's",
+        ], attrgetter("name"))
+        for p in pizzerias:
+            self.assertEqual(p.pk, p.restaurant_ptr_id)
+            self.assertEqual(Restaurant.objects.get(pk=p.pk).name, p.name)
+
+    @skipIfDBFeature("can_return_ids_from_bulk_insert")
     def test_inheritance(self):
         Restaurant.objects.bulk_create([
             Restaurant(name="Nicholas's")
@@ -56,4 +88,112 @@ class BulkCreateTests(TestCase):
             ])
         self.assertQuerysetEqual(State.objects.order_by("two_letter_code"), [
             "CA", "IL", "ME", "NY",
-        ], attrgetter("two_letter_code"))
\ No newline at end of file
+        ], attrgetter("two_letter_code"))
+
+
+class CopyTests(TestCase):
+
+    @skipUnlessDBFeature("supports_copy")
+    def test_copy_from(self):
+        def countries():
+            yield Country(name="Germany", iso_two_letter="DE")
+            yield ("The Netherlands", "NL")
+            yield (u"Cura\xe7ao", "CW")
+            yield ("Tab\tand\\back\nslash", "XX")
+        with self.assertNumQueries(0):
+            # the COPY statement is not logged
+            self.assertEqual(Country.objects.copy_from(countries()), 4)
+        self.assertQuerysetEqual(Country.objects.order_by("iso_two_letter"), [
+            u"Cura\xe7ao", "Germany", "The Netherlands",
+            "Tab\tand\\back\nslash",
+        ], attrgetter("name"))
+
+    @skipUnlessDBFeature("supports_copy")
+    def test_copy_fields(self):
+        self.assertEqual(
+            State.objects.copy_from([("IL",), ("NY",)],
+                                    fields=["two_letter_code"]), 2)
+        self.assertEqual(State.objects.count(), 2)
+
+    @skipUnlessDBFeature("supports_copy")
+    def test_copy_to(self):
+        Country.objects.bulk_create([
+            Country(name="Germany", iso_two_letter="DE"),
+            Country(name="Tab\tand\\back\nslash", iso_two_letter=""),
+        ])
+        data = StringIO()
+        self.assertEqual(Country.objects.order_by("name").copy_to(
+            data, fields=["name", "iso_two_letter"]), 2)
+        self.assertEqual(Country.objects.none().copy_to(data), 0)
+
+        # read the rows back, and copy them again
+        from django.db.backends.pg_django.bulkcopy import read_copy_rows
+        data.seek(0)
+        rows = list(read_copy_rows(data, Country,
+                                   fields=["name", "iso_two_letter"]))
+        self.assertEqual(rows, [(u"Germany", u"DE"),
+                                (u"Tab\tand\\back\nslash", u"")])
+        data.seek(0)
+        Country.objects.all().delete()
+        self.assertEqual(Country.objects.copy_from(data), 2)
+        self.assertEqual(Country.objects.filter(iso_two_letter="").count(), 1)
+
+
+class UpsertTests(TestCase):
+
+    @skipUnlessDBFeature("supports_upsert")
+    def test_bulk_upsert(self):
+        eur = Currency.objects.create(code="EUR", name="Euro", rate=1)
+        with self.assertNumQueries(1):
+            results = Currency.objects.bulk_upsert([
+                Currency(code="USD", name="US Dollar", rate=1.3),
+                Currency(code="EUR", name="Euro", rate=0.9),
+            ], conflict_fields=["code"])
+        self.assertEqual([(c.code, created) for c, created in results],
+                         [("USD", True), ("EUR", False)])
+        self.assertEqual(results[1][0].pk, eur.pk)
+        self.assertTrue(results[0][0].pk)
+        self.assertEqual(Currency.objects.get(code="EUR").rate, 0.9)
+        self.assertEqual(Currency.objects.count(), 2)
+
+    @skipUnlessDBFeature("supports_upsert")
+    def test_update_fields(self):
+        Currency.objects.create(code="EUR", name="Euro", rate=1)
+        Currency.objects.bulk_upsert([
+            Currency(code="EUR", name="Renamed", rate=0.9),
+            Currency(code="GBP", name="Pound", rate=1.2),
+        ], conflict_fields=["code"], update_fields=["rate"])
+        self.assertQuerysetEqual(Currency.objects.order_by("code"), [
+            ("EUR", "Euro", 0.9), ("GBP", "Pound", 1.2),
+        ], attrgetter("code", "name", "rate"))
+
+    @skipUnlessDBFeature("supports_upsert")
+    def test_do_nothing(self):
+        State.objects.create(two_letter_code="IL")
+        results = State.objects.bulk_upsert(
+            [State(two_letter_code="IL"), State(two_letter_code="NY")],
+            update_fields=[], batch_size=1)
+        self.assertEqual([(s.pk, created) for s, created in results],
+                         [("IL", False), ("NY", True)])
+        self.assertEqual(State.objects.count(), 2)
+
+    @skipUnlessDBFeature("supports_upsert")
+    def test_update_or_create(self):
+        with self.assertNumQueries(1):
+            currency, created = Currency.objects.update_or_create(
+                code="EUR", defaults={"name": "Euro"})
+        self.assertTrue(created)
+        self.assertEqual(currency.rate, 1)
+        Currency.objects.filter(pk=currency.pk).update(rate=0.9)
+        with self.assertNumQueries(1):
+            updated, created = Currency.objects.update_or_create(
+                code="EUR", defaults={"name": "Euro zone"})
+        self.assertFalse(created)
+        self.assertEqual(updated.pk, currency.pk)
+        # the fields not updated are the stored ones
+        self.assertEqual((updated.name, updated.rate), ("Euro zone", 0.9))
+        self.assertEqual(Currency.objects.count(), 1)
+
+    def test_inherited_model(self):
+        self.assertRaises(ValueError, Pizzeria.objects.bulk_upsert,
+                          [Pizzeria(name="Vesuvio")])
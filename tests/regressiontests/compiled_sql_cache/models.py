@@ -0,0 +1,14 @@
+from django.db import models
+
+
+class Author(models.Model):
+    name = models.CharField(max_length=50)
+
+
+class Book(models.Model):
+    title = models.CharField(max_length=100)
+    author = models.ForeignKey(Author, null=True)
+    pages = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ('title',)
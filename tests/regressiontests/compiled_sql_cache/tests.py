@@ -0,0 +1,128 @@
+from __future__ import absolute_import
+
+from django.db.models import F
+from django.db.models.sql.cache import LRUCache, sql_cache
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from .models import Author, Book
+
+
+class LRUCacheTests(TestCase):
+    def test_eviction(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        # b is the least recently used item
+        cache.set('c', 3)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        cache.set('a', 4)
+        cache.set('d', 5)
+        self.assertEqual(cache.get('c'), None)
+        self.assertEqual(cache.get('a'), 4)
+        self.assertEqual(cache.info(), {'hits': 4, 'misses': 2,
+                                        'currsize': 2, 'maxsize': 2})
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.get('a'), None)
+
+
+class SQLCacheTests(TestCase):
+    def setUp(self):
+        self.tolkien = Author.objects.create(name='Tolkien')
+        self.herbert = Author.objects.create(name='Herbert')
+        self.hobbit = Book.objects.create(title='The Hobbit',
+                                          author=self.tolkien, pages=310)
+        self.lotr = Book.objects.create(title='The Lord of the Rings',
+                                        author=self.tolkien, pages=1216)
+        self.dune = Book.objects.create(title='Dune', author=self.herbert,
+                                        pages=412)
+        sql_cache.clear()
+
+    def assertCounts(self, hits, misses):
+        self.assertEqual((sql_cache.hits, sql_cache.misses), (hits, misses))
+
+    def test_hits(self):
+        self.assertEqual(Book.objects.cached_sql().get(pk=self.hobbit.pk),
+                         self.hobbit)
+        self.assertCounts(0, 1)
+        self.assertEqual(Book.objects.cached_sql().get(pk=self.dune.pk),
+                         self.dune)
+        self.assertCounts(1, 1)
+        self.assertEqual(Book.objects.get(pk=self.lotr.pk), self.lotr)
+        self.assertCounts(1, 1)
+
+    def test_shapes(self):
+        books = Book.objects.cached_sql()
+        self.assertEqual(list(books.filter(pages__gt=400)),
+                         [self.dune, self.lotr])
+        self.assertEqual(list(books.filter(pages__gt=1000)), [self.lotr])
+        self.assertEqual(list(books.filter(pages__lt=400)), [self.hobbit])
+        self.assertEqual(list(books.exclude(pages__gt=400)), [self.hobbit])
+        self.assertEqual(list(books.filter(pages__gt=400)[:1]), [self.dune])
+        self.assertEqual(list(books.filter(pages__gt=300)[:1]), [self.dune])
+        self.assertCounts(2, 4)
+
+    def test_in_lookups(self):
+        books = Book.objects.cached_sql()
+        self.assertEqual(list(books.filter(pk__in=[self.dune.pk])),
+                         [self.dune])
+        self.assertEqual(
+            list(books.filter(pk__in=[self.hobbit.pk, self.lotr.pk])),
+            [self.hobbit, self.lotr])
+        self.assertEqual(list(books.filter(pk__in=[self.lotr.pk])),
+                         [self.lotr])
+        # matches nothing, so it never gets any SQL
+        self.assertEqual(list(books.filter(pk__in=[])), [])
+        self.assertEqual(list(books.filter(pk__in=[])), [])
+        self.assertCounts(1, 4)
+
+    def test_null_lookups(self):
+        Book.objects.create(title='Anonymous')
+        books = Book.objects.cached_sql()
+        self.assertEqual(books.filter(author__isnull=True).count(), 1)
+        self.assertEqual([b.title for b in books.filter(author__isnull=True)],
+                         ['Anonymous'])
+        self.assertEqual(len(books.filter(author__isnull=False)), 3)
+        self.assertEqual([b.title for b in books.filter(author=None)],
+                         ['Anonymous'])
+
+    def test_related_lookups(self):
+        books = Book.objects.cached_sql().select_related('author')
+        for author in (self.tolkien, self.herbert, self.tolkien):
+            titles = [(b.title, b.author.name)
+                      for b in books.filter(author__name=author.name)]
+            self.assertEqual(titles, [(b.title, author.name)
+                                      for b in author.book_set.all()])
+        self.assertCounts(2, 1)
+
+    def test_ordering_aliases(self):
+        books = Book.objects.cached_sql().distinct().order_by('author__name')
+        for pages in (300, 400, 300):
+            self.assertEqual(
+                list(books.filter(pages__gt=pages).values_list('title',
+                                                               flat=True)),
+                list(Book.objects.distinct().order_by('author__name').filter(
+                    pages__gt=pages).values_list('title', flat=True)))
+        self.assertCounts(2, 1)
+
+    def test_uncached_queries(self):
+        books = Book.objects.cached_sql()
+        self.assertEqual(list(books.filter(pages__gt=F('pk'))), [self.dune,
+                         self.hobbit, self.lotr])
+        self.assertEqual(
+            list(books.filter(author__in=Author.objects.filter(
+                name='Herbert'))), [self.dune])
+        self.assertEqual(list(books.extra(where=['pages > 400'])),
+                         [self.dune, self.lotr])
+        self.assertCounts(0, 0)
+
+    @override_settings(SQL_CACHE_SIZE=0)
+    def test_disabled(self):
+        Book.objects.cached_sql().get(pk=self.hobbit.pk)
+        Book.objects.cached_sql().get(pk=self.dune.pk)
+        self.assertCounts(0, 0)
+        self.assertEqual(len(sql_cache), 0)
@@ -93,3 +93,19 @@ class FooPhoto(models.Model):
 class FooFileProxy(FooFile):
     class Meta:
         proxy = True
+
+# Models for the database cascades (settings.DB_CASCADE)
+
+class Library(models.Model):
+    name = models.CharField(max_length=20)
+
+class Shelf(models.Model):
+    library = models.ForeignKey(Library)
+    name = models.CharField(max_length=20)
+
+class Reader(models.Model):
+    name = models.CharField(max_length=20)
+
+class Volume(models.Model):
+    shelf = models.ForeignKey(Shelf)
+    readers = models.ManyToManyField(Reader)
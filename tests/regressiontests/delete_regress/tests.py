@@ -3,12 +3,16 @@ from __future__ import absolute_import
 import datetime
 
 from django.conf import settings
-from django.db import backend, transaction, DEFAULT_DB_ALIAS
+from django.db import backend, connection, transaction, DEFAULT_DB_ALIAS
+from django.db.models.signals import pre_delete
 from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import override_settings
+from django.utils import unittest
 
 from .models import (Book, Award, AwardNote, Person, Child, Toy, PlayedWith,
     PlayedWithNote, Email, Researcher, Food, Eaten, Policy, Version, Location,
-    Item, Image, File, Photo, FooFile, FooImage, FooPhoto, FooFileProxy)
+    Item, Image, File, Photo, FooFile, FooImage, FooPhoto, FooFileProxy,
+    Library, Shelf, Reader, Volume)
 
 
 # Can't run this test under SQLite, because you can't
@@ -258,3 +262,87 @@ class ProxyDeleteTest(TestCase):
         Image.objects.all().delete()
 
         self.assertEqual(len(FooFileProxy.objects.all()), 0)
+
+
+@unittest.skipUnless(connection.features.supports_db_cascade,
+                     "Database doesn't support DB_CASCADE")
+@override_settings(DB_CASCADE=True)
+class DBCascadeTests(TestCase):
+    def setUp(self):
+        # The test database is created without DB_CASCADE: recreate the
+        # foreign keys with ON DELETE CASCADE, which the transaction of the
+        # test rolls back.
+        qn = connection.ops.quote_name
+        cursor = connection.cursor()
+        for model in (Shelf, Volume, Volume.readers.through):
+            table = model._meta.db_table
+            cursor.execute("SELECT conname, pg_get_constraintdef(oid) "
+                           "FROM pg_constraint WHERE contype = 'f' "
+                           "AND conrelid = %s::regclass", [table])
+            for name, definition in cursor.fetchall():
+                cursor.execute('ALTER TABLE %s DROP CONSTRAINT %s' % (
+                    qn(table), qn(name)))
+                cursor.execute('ALTER TABLE %s ADD CONSTRAINT %s %s' % (
+                    qn(table), qn(name), definition.replace(
+                        ' DEFERRABLE', ' ON DELETE CASCADE DEFERRABLE')))
+        self.reader = Reader.objects.create(name='reader')
+        self.libraries = []
+        for name in ('first', 'second'):
+            library = Library.objects.create(name=name)
+            for i in range(3):
+                shelf = Shelf.objects.create(library=library, name=str(i))
+                for j in range(2):
+                    volume = Volume.objects.create(shelf=shelf)
+                    volume.readers.add(self.reader)
+            self.libraries.append(library)
+
+    def assertDeleted(self, library):
+        self.assertFalse(Library.objects.filter(pk=library.pk).exists())
+        self.assertFalse(Shelf.objects.filter(library=library).exists())
+        self.assertFalse(Volume.objects.filter(
+            shelf__library=library).exists())
+        self.assertEqual(Volume.readers.through.objects.count(), 6)
+        self.assertEqual(Volume.objects.count(), 6)
+
+    def test_queryset_delete(self):
+        library = self.libraries[0]
+        self.assertNumQueries(1,
+            Library.objects.filter(name='first').delete)
+        self.assertDeleted(library)
+
+    def test_queryset_delete_joins(self):
+        library = self.libraries[0]
+        self.assertNumQueries(1, Library.objects.filter(
+            shelf__volume__pk=Volume.objects.filter(
+                shelf__library=library)[0].pk).delete)
+        self.assertDeleted(library)
+
+    def test_instance_delete(self):
+        library = self.libraries[0]
+        self.assertNumQueries(1, library.delete)
+        self.assertEqual(library.pk, None)
+        self.assertDeleted(library)
+
+    def test_delete_receivers(self):
+        # the volumes are collected for the receivers, the shelves are
+        # collected to find them
+        deleted = []
+        def receiver(instance, **kwargs):
+            deleted.append(instance.pk)
+        volumes = list(Volume.objects.filter(
+            shelf__library=self.libraries[0]).values_list('pk', flat=True))
+        pre_delete.connect(receiver, sender=Volume)
+        try:
+            self.libraries[0].delete()
+        finally:
+            pre_delete.disconnect(receiver, sender=Volume)
+        self.assertEqual(sorted(deleted), sorted(volumes))
+        self.assertDeleted(self.libraries[0])
+        self.assertNumQueries(1, self.libraries[1].delete)
+
+    def test_disabled(self):
+        with self.settings(DB_CASCADE=False):
+            library = self.libraries[0]
+            with self.assertNumQueries(6):
+                library.delete()
+        self.assertDeleted(library)
@@ -33,6 +33,7 @@ class Callable(object):
         return val
 
 a_signal = Signal(providing_args=["val"])
+c_signal = Signal(providing_args=["val"], use_caching=True)
 
 class DispatcherTests(unittest.TestCase):
     """Test suite for dispatcher (barely started)"""
@@ -123,3 +124,49 @@ class DispatcherTests(unittest.TestCase):
         garbage_collect()
         a_signal.disconnect(receiver_3)
         self._testIsClean(a_signal)
+
+    def testHasListeners(self):
+        self.assertFalse(a_signal.has_listeners())
+        self.assertFalse(a_signal.has_listeners(sender=self))
+        a_signal.connect(receiver_1_arg, sender=self)
+        self.assertFalse(a_signal.has_listeners())
+        self.assertTrue(a_signal.has_listeners(sender=self))
+        a_signal.connect(receiver_1_arg)
+        self.assertTrue(a_signal.has_listeners())
+        a_signal.disconnect(receiver_1_arg, sender=self)
+        a_signal.disconnect(receiver_1_arg)
+        self.assertFalse(a_signal.has_listeners(sender=self))
+        self._testIsClean(a_signal)
+
+    def testCaching(self):
+        sender = Callable()
+        c_signal.connect(receiver_1_arg, sender=self)
+        self.assertEqual(c_signal.send(sender=sender, val="test"), [])
+        self.assertTrue(sender in c_signal.sender_receivers_cache)
+        # connecting or disconnecting a receiver invalidates the cache
+        c_signal.connect(receiver_1_arg, sender=sender)
+        self.assertEqual(c_signal.send(sender=sender, val="test"),
+                         [(receiver_1_arg, "test")])
+        self.assertTrue(c_signal.has_listeners(sender))
+        c_signal.disconnect(receiver_1_arg, sender=self)
+        self.assertFalse(c_signal.has_listeners(Callable()))
+        c_signal.disconnect(receiver_1_arg, sender=sender)
+        self.assertFalse(c_signal.has_listeners(sender))
+        # so does garbage collecting one
+        a = Callable()
+        c_signal.connect(a.a, sender=sender)
+        self.assertTrue(c_signal.has_listeners(sender))
+        del a
+        garbage_collect()
+        self.assertFalse(c_signal.has_listeners(sender))
+        # the None sender can't be cached
+        c_signal.connect(receiver_1_arg)
+        self.assertEqual(c_signal.send(sender=None, val="test"),
+                         [(receiver_1_arg, "test")])
+        c_signal.disconnect(receiver_1_arg)
+        self.assertFalse(c_signal.has_listeners())
+        # the cache doesn't keep the senders alive
+        del sender
+        garbage_collect()
+        self.assertEqual(len(c_signal.sender_receivers_cache), 0)
+        self._testIsClean(c_signal)
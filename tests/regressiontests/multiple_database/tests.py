@@ -2,15 +2,18 @@ from __future__ import absolute_import
 
 import datetime
 import pickle
+import threading
 from StringIO import StringIO
 
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
-from django.core import management
-from django.db import connections, router, DEFAULT_DB_ALIAS
+from django.core import management, signals as core_signals
+from django.db import connection, connections, router, DEFAULT_DB_ALIAS
+from django.db.backends.pg_django.router import ReplicaRouter
 from django.db.models import signals
 from django.test import TestCase
+from django.utils import unittest
 
 from .models import Book, Person, Pet, Review, UserProfile
 
@@ -1545,6 +1548,116 @@ class RouterTestCase(TestCase):
         # If you evaluate the query, it should work, running on 'other'
         self.assertEqual(list(qs.values_list('title', flat=True)), [u'Dive into Python'])
 
+@unittest.skipUnless(connection.features.supports_replication_lag,
+                     "Database doesn't report the replication lag")
+class ReplicaRouterTestCase(TestCase):
+    multi_db = True
+
+    def setUp(self):
+        # Make the 'other' database a replica of 'default'. Not being in
+        # recovery, it doesn't lag.
+        self.router = ReplicaRouter({'default': ['other']}, max_lag=10,
+                                    cache_timeout=60)
+        self.old_routers = router.routers
+        router.routers = [self.router]
+
+    def tearDown(self):
+        router.routers = self.old_routers
+        self.router.unpin()
+        ops = connections['other'].ops
+        if 'replication_lag_sql' in ops.__dict__:
+            del ops.replication_lag_sql
+
+    def set_lag_sql(self, sql):
+        connections['other'].ops.replication_lag_sql = lambda: sql
+
+    def test_read_from_replica(self):
+        self.assertEqual(self.router.replication_lag('other'), 0)
+        self.assertEqual(Book.objects.all().db, 'other')
+        self.assertEqual(router.db_for_write(Book), 'default')
+
+    def test_pinned_after_write(self):
+        Book.objects.create(title="Pro Django",
+                            published=datetime.date(2008, 12, 16))
+        self.assertEqual(Book.objects.using('default').count(), 1)
+        self.assertEqual(Book.objects.all().db, 'default')
+        self.assertEqual(Book.objects.count(), 1)
+
+        # the reads go to the replica again after the request
+        core_signals.request_started.send(sender=self.__class__)
+        self.assertEqual(Book.objects.all().db, 'other')
+
+    def test_pinned_per_thread(self):
+        # the thread uses the cached lag rather than a connection of its own
+        self.router.replication_lag('other')
+        self.router.pin()
+        dbs = []
+        thread = threading.Thread(
+            target=lambda: dbs.append(router.db_for_read(Book)))
+        thread.start()
+        thread.join()
+        self.assertEqual(dbs, ['other'])
+        self.assertEqual(router.db_for_read(Book), 'default')
+
+    def test_lagging_replica(self):
+        self.set_lag_sql('SELECT 60.0')
+        self.assertEqual(Book.objects.all().db, 'default')
+
+        # the lag is cached
+        self.set_lag_sql('SELECT 5.0')
+        self.assertEqual(Book.objects.all().db, 'default')
+        self.router.cache_timeout = 0
+        self.assertEqual(Book.objects.all().db, 'other')
+        self.assertEqual(self.router.replication_lag('other'), 5.0)
+
+    def test_unknown_lag(self):
+        self.set_lag_sql('SELECT NULL')
+        self.assertEqual(self.router.replication_lag('other'), None)
+        self.assertEqual(Book.objects.all().db, 'default')
+
+    def test_unreachable_replica(self):
+        self.set_lag_sql('SELECT * FROM multiple_database_no_such_table')
+        self.assertEqual(self.router.replication_lag('other'), None)
+        self.assertEqual(Book.objects.all().db, 'default')
+        # the replica connection is still usable
+        self.assertEqual(Book.objects.using('other').count(), 0)
+
+    def test_replica_down(self):
+        # nothing listens on the port of the replica
+        connections.databases['unreachable'] = dict(
+            connections['default'].settings_dict, HOST='127.0.0.1', PORT='1')
+        try:
+            replica_router = ReplicaRouter({'default': ['unreachable']},
+                                           max_lag=10, cache_timeout=0)
+            self.assertEqual(replica_router.replication_lag('unreachable'),
+                             None)
+            self.assertEqual(replica_router.db_for_read(Book), 'default')
+            self.assertEqual(connections['unreachable'].connection, None)
+        finally:
+            del connections.databases['unreachable']
+            del connections._connections.unreachable
+
+    def test_instance_hints(self):
+        # an object read from the replica is written to the primary
+        dive = Book.objects.using('other').create(title="Dive into Python",
+            published=datetime.date(2009, 5, 4))
+        self.assertEqual(router.db_for_write(Book, instance=dive), 'default')
+        self.assertEqual(self.router.db_for_read(Person, instance=dive),
+                         'default')
+        mark = Person.objects.using('default').create(name="Mark Pilgrim")
+        self.assertTrue(router.allow_relation(dive, mark))
+
+    def test_allow_syncdb(self):
+        self.assertFalse(router.allow_syncdb('other', Book))
+        self.assertTrue(router.allow_syncdb('default', Book))
+
+    def test_other_databases(self):
+        # the databases without replicas are left to the other routers
+        replica_router = ReplicaRouter({'other': []})
+        self.assertEqual(replica_router.db_for_read(Book), None)
+        self.assertEqual(replica_router.db_for_write(Book), None)
+
+
 class AuthTestCase(TestCase):
     multi_db = True
 
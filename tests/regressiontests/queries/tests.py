@@ -1610,6 +1610,32 @@ class CloneTests(TestCase):
         except:
             self.fail('Query should be clonable')
 
+    def test_shared_where(self):
+        # The clones of a query share its where tree, only its root is
+        # copied.
+        qs = Note.objects.filter(Q(note='n1') | Q(note='n2'))
+        clone = qs.query.clone()
+        self.assertFalse(clone.where is qs.query.where)
+        self.assertTrue(clone.where.children[0] is qs.query.where.children[0])
+
+        # Changing the clone doesn't change the original.
+        sql = str(qs.query)
+        clone.add_q(Q(misc='foo'))
+        clone.bump_prefix()
+        self.assertNotEqual(str(clone), sql)
+        self.assertEqual(str(qs.query), sql)
+        self.assertTrue('U0' in str(clone))
+
+    def test_shared_aggregates(self):
+        qs = Note.objects.annotate(Count('extrainfo')).filter(
+            extrainfo__count__gt=0)
+        clone = qs.query.clone()
+        sql = str(qs.query)
+        clone.bump_prefix()
+        self.assertEqual(str(qs.query), sql)
+        self.assertFalse('U1' in sql)
+        self.assertEqual(str(clone).count('COUNT(U1.'), 2)
+
 
 class EmptyQuerySetTests(TestCase):
     def test_emptyqueryset_values(self):
@@ -1639,6 +1665,16 @@ class ValuesQuerysetTests(BaseQuerysetTest):
             qs, [72]
         )
 
+    def test_boolean_columns(self):
+        tag = Tag.objects.create(name='t1')
+        ManagedModel.normal_manager.create(data='mm1', tag=tag, public=True)
+        ManagedModel.normal_manager.create(data='mm2', tag=tag, public=False)
+        qs = ManagedModel.normal_manager.order_by('data')
+        # the same values as values_list()
+        columns = qs.columns('public')
+        self.assertEqual(columns['public'], [True, False])
+        self.assertEqual(map(type, columns['public']), [bool, bool])
+
 
 class WeirdQuerysetSlicingTests(BaseQuerysetTest):
     def setUp(self):